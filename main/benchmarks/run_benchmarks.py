@@ -0,0 +1,329 @@
+import argparse
+import copy
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+import types
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flightsight import clients, offers, reference, storage, weather  # noqa: E402
+from flightsight.fill import fill_missing_flights, fill_missing_weather  # noqa: E402
+from flightsight.offers import fetch_flight_offers, flatten_offers  # noqa: E402
+from flightsight.scheduler import AmadeusScheduler  # noqa: E402
+from flightsight.schema import FLIGHT_COLUMNS, WEATHER_COLUMNS  # noqa: E402
+from flightsight.storage import save_datasets, s3_partition  # noqa: E402
+from flightsight.weather import build_weather_frame  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+
+ORIGIN, DESTINATION = "HYD", "CDG"
+START_DATE = date(2025, 6, 13)
+STAGES = ["fetch_offers", "flatten_offers", "fill_missing_flights", "weather", "fill_missing_weather", "save_data"]
+
+logger = logging.getLogger("benchmarks")
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    fixtures = {}
+    for name in ("flight_offers", "locations", "airlines", "forecast"):
+        with open(os.path.join(fixtures_dir, f"{name}.json")) as f:
+            fixtures[name] = json.load(f)
+    return fixtures
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+class ReplayAmadeus:
+    # Serves recorded reference data and scales the recorded offers to the scenario's shape
+
+    def __init__(self, fixtures, scenario, latency):
+        self.fixtures = fixtures
+        self.scenario = scenario
+        self.latency = latency
+        self.hubs = [code for code in fixtures["locations"] if code not in (ORIGIN, DESTINATION)]
+        self.reference_data = types.SimpleNamespace(
+            locations=types.SimpleNamespace(get=self.locations),
+            airlines=types.SimpleNamespace(get=self.airlines)
+        )
+        self.shopping = types.SimpleNamespace(flight_offers_search=types.SimpleNamespace(get=self.flight_offers))
+
+    def locations(self, keyword, subType, **kwargs):
+        time.sleep(self.latency)
+        location = self.fixtures["locations"].get(keyword)
+        return Response([location] if location else [])
+
+    def airlines(self, airlineCodes):
+        time.sleep(self.latency)
+        airline = self.fixtures["airlines"].get(airlineCodes)
+        return Response([airline] if airline else [])
+
+    def flight_offers(self, originLocationCode, destinationLocationCode, departureDate, adults, max):
+        time.sleep(self.latency)
+        templates = self.fixtures["flight_offers"]["data"]
+        stops = self.scenario["stops"]
+        data = []
+        for idx in range(self.scenario["offers"]):
+            offer = copy.deepcopy(templates[idx % len(templates)])
+            segment_template = offer["itineraries"][0]["segments"][0]
+            fare_template = offer["travelerPricings"][0]["fareDetailsBySegment"][0]
+            route = ([originLocationCode] + [self.hubs[(idx + hop) % len(self.hubs)] for hop in range(stops)]
+                     + [destinationLocationCode])
+            segments = []
+            for hop, (dep, arr) in enumerate(zip(route, route[1:])):
+                segment = copy.deepcopy(segment_template)
+                segment["id"] = str(hop + 1)
+                segment["number"] = str(100 + idx % 900)
+                segment["departure"] = {"iataCode": dep, "at": f"{departureDate}T{(2 + 4 * hop) % 24:02d}:00:00"}
+                segment["arrival"] = {"iataCode": arr, "at": f"{departureDate}T{(5 + 4 * hop) % 24:02d}:00:00"}
+                segments.append(segment)
+            offer["id"] = str(idx + 1)
+            offer["lastTicketingDate"] = departureDate
+            offer["itineraries"] = [{"duration": f"PT{4 * len(segments)}H", "segments": segments}]
+            offer["travelerPricings"][0]["fareDetailsBySegment"] = [
+                dict(fare_template, segmentId=segment["id"]) for segment in segments
+            ]
+            data.append(offer)
+        return Response(data)
+
+class ReplaySession:
+    # Replays the recorded forecast, shifted so its first day lines up with the scenario's start date
+
+    def __init__(self, fixtures, latency):
+        payload = fixtures["forecast"]
+        first_day = datetime.fromtimestamp(payload["list"][0]["dt"], tz=timezone.utc).date()
+        shift = int((START_DATE - first_day).total_seconds())
+        self.payload = copy.deepcopy(payload)
+        for entry in self.payload["list"]:
+            entry["dt"] += shift
+            entry["dt_txt"] = datetime.fromtimestamp(entry["dt"], tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        for field in ("sunrise", "sunset"):
+            self.payload["city"][field] += shift
+        self.latency = latency
+
+    def get(self, url, params, timeout):
+        time.sleep(self.latency)
+        payload = copy.deepcopy(self.payload)
+        payload["city"]["coord"] = {"lat": params["lat"], "lon": params["lon"]}
+        return types.SimpleNamespace(raise_for_status=lambda: None, json=lambda: payload)
+
+class LocalS3:
+    # Stands in for the S3 client; keeps uploaded objects in memory
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        time.sleep(self.latency)
+        self.objects[(bucket, key)] = fileobj.read()
+
+def install_stubs(fixtures, scenario, latency):
+    amadeus = ReplayAmadeus(fixtures, scenario, latency)
+    session = ReplaySession(fixtures, latency)
+    s3 = LocalS3(latency)
+    # Requests still go through a scheduler, but with no quota, so stub latency is the only wait
+    scheduler = AmadeusScheduler(rate=1e9, burst=10 ** 9, max_concurrency=10 ** 6)
+    reference.get_amadeus_client = offers.get_amadeus_client = lambda: amadeus
+    reference.get_amadeus_scheduler = offers.get_amadeus_scheduler = lambda: scheduler
+    weather.get_http_session = lambda: session
+    # The bundled reference index would answer the recorded airports before the replayed API is reached; the
+    # baselines time the API path, so the index is switched off here
+    reference.get_reference_index = lambda: None
+    storage.get_s3_client = lambda: s3
+    # Fresh caches per scenario; the untimed warm-up run fills them like a long-running process would
+    clients.get_reference_cache.cache_clear()
+    clients.get_weather_cache.cache_clear()
+    clients.get_distance_table.cache_clear()
+
+def run_once(scenario):
+    timings = {}
+
+    def timed(stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    days = scenario["days"]
+    day_results = timed("fetch_offers", fetch_flight_offers, ORIGIN, DESTINATION, START_DATE, days=days)
+    flights_df, flight_locations = timed("flatten_offers", flatten_offers,
+                                         [(current_date, flights) for current_date, flights, _ in day_results if flights])
+    flights_df = timed("fill_missing_flights", fill_missing_flights, flights_df, START_DATE, days=days)
+
+    locations = {(ORIGIN, None, None, "Origin"), (DESTINATION, None, None, "Destination")} | flight_locations
+    weather_df = timed("weather", build_weather_frame, locations, ORIGIN, DESTINATION, START_DATE, days=days)
+    weather_df = timed("fill_missing_weather", fill_missing_weather, weather_df, START_DATE,
+                       {loc[0] for loc in locations}, days=days)
+
+    datasets = [(flights_df[FLIGHT_COLUMNS], "flights.csv"), (weather_df[WEATHER_COLUMNS], "weather.csv")]
+    results = timed("save_data", save_datasets, datasets, partition=s3_partition(ORIGIN, DESTINATION, START_DATE))
+    errors = [result["error"] for result in results if result["error"]]
+    if errors:
+        raise RuntimeError(f"save_data failed: {errors}")
+    return timings, len(flights_df), len(weather_df)
+
+def scenario_name(scenario):
+    return f"offers={scenario['offers']},days={scenario['days']},stops={scenario['stops']}"
+
+def calibrate(repeat=5):
+    # A fixed pandas/JSON workload timed next to every scenario, so baselines can be scaled to how fast
+    # the machine is right now rather than how fast it was when they were taken
+    frame = pd.DataFrame({"key": np.arange(5000) % 50, "value": np.arange(5000, dtype=float)})
+    records = [{"id": idx, "name": f"row{idx}", "value": idx * 1.5} for idx in range(2000)]
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frame.groupby("key")["value"].mean()
+        frame.astype(str).to_csv(index=False)
+        json.loads(json.dumps(records))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_scenario(fixtures, scenario, latency, repeat):
+    install_stubs(fixtures, scenario, latency)
+    run_once(scenario)
+    samples = {stage: [] for stage in STAGES}
+    calibration = []
+    for _ in range(repeat):
+        calibration.append(calibrate(repeat=1))
+        timings, flight_rows, weather_rows = run_once(scenario)
+        for stage in STAGES:
+            samples[stage].append(timings[stage])
+    # Best-of-N, like timeit: the minimum is the least disturbed by whatever else the machine is doing
+    best = {stage: min(values) for stage, values in samples.items()}
+    best["total"] = sum(best.values())
+    return {"timings": best, "calibration": min(calibration), "flight_rows": flight_rows, "weather_rows": weather_rows}
+
+def find_regressions(results, baselines, tolerance, min_delta):
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        scale = result["calibration"] / baseline["calibration"] if baseline.get("calibration") else 1.0
+        for stage, seconds in baseline["timings"].items():
+            expected = seconds * scale
+            seconds = result["timings"].get(stage)
+            if seconds is not None and seconds > expected * (1 + tolerance) and seconds - expected > min_delta:
+                regressions.append(f"{name} {stage}: {seconds * 1000:.1f} ms vs baseline {expected * 1000:.1f} ms")
+    return regressions
+
+def record_fixtures(origin_iata, destination_iata, departure_date, fixtures_dir=FIXTURES_DIR):
+    # Capture fresh payloads from the live APIs (needs the usual credentials) to replay later
+    from flightsight.config import OPENWEATHER_API_KEY
+    from flightsight.weather import fetch_forecast_payload
+
+    amadeus = clients.get_amadeus_client()
+    response = amadeus.shopping.flight_offers_search.get(
+        originLocationCode=origin_iata, destinationLocationCode=destination_iata,
+        departureDate=departure_date.strftime("%Y-%m-%d"), adults=1, max=10
+    )
+    offer_data = response.data
+    airports = {segment[end]["iataCode"] for offer in offer_data for itinerary in offer["itineraries"]
+                for segment in itinerary["segments"] for end in ("departure", "arrival")}
+    carriers = {segment["carrierCode"] for offer in offer_data for itinerary in offer["itineraries"]
+                for segment in itinerary["segments"]}
+    locations = {}
+    for code in sorted(airports | {origin_iata, destination_iata}):
+        data = amadeus.reference_data.locations.get(keyword=code, subType="AIRPORT").data
+        if data:
+            locations[code] = data[0]
+    airlines = {}
+    for code in sorted(carriers):
+        data = amadeus.reference_data.airlines.get(airlineCodes=code).data
+        if data:
+            airlines[code] = data[0]
+    geo = locations[origin_iata]["geoCode"]
+    forecast = fetch_forecast_payload(geo["latitude"], geo["longitude"], OPENWEATHER_API_KEY)
+
+    os.makedirs(fixtures_dir, exist_ok=True)
+    for name, payload in (("flight_offers", {"data": offer_data}), ("locations", locations),
+                          ("airlines", airlines), ("forecast", forecast)):
+        with open(os.path.join(fixtures_dir, f"{name}.json"), "w") as f:
+            json.dump(payload, f, indent=1)
+    logger.info(f"Recorded {len(offer_data)} offers, {len(locations)} airports and {len(airlines)} airlines")
+
+def parse_ints(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded API payloads through the pipeline and time each stage.")
+    parser.add_argument("--offers", type=parse_ints, default=[10, 50], help="offers per day, comma separated")
+    parser.add_argument("--days", type=parse_ints, default=[5], help="days searched, comma separated")
+    parser.add_argument("--stops", type=parse_ints, default=[0, 1, 2], help="stopovers per offer, comma separated")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated round-trip per stubbed API call")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per scenario (after one warm-up run)")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="baseline timings file")
+    parser.add_argument("--update-baselines", action="store_true", help="store these timings as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown over baseline, as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--record", nargs=3, metavar=("ORIGIN", "DESTINATION", "YYYY-MM-DD"),
+                        help="re-record the fixtures from the live APIs instead of benchmarking")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # The pipeline's own per-run warnings (e.g. days beyond the forecast) would drown out the report
+    logging.getLogger("flightsight").setLevel(logging.ERROR)
+
+    if args.record:
+        origin_iata, destination_iata, departure = args.record
+        record_fixtures(origin_iata.upper(), destination_iata.upper(), datetime.strptime(departure, "%Y-%m-%d").date())
+        return 0
+
+    fixtures = load_fixtures()
+    latency = args.latency_ms / 1000
+    results = {}
+    for offer_count, days, stops in itertools.product(args.offers, args.days, args.stops):
+        scenario = {"offers": offer_count, "days": days, "stops": stops}
+        name = scenario_name(scenario)
+        results[name] = run_scenario(fixtures, scenario, latency, args.repeat)
+        timings = results[name]["timings"]
+        print(f"{name:<28} calibration={results[name]['calibration'] * 1000:.1f}ms rows={results[name]['flight_rows']:>6}/{results[name]['weather_rows']:<4} "
+              + " ".join(f"{stage}={timings[stage] * 1000:.1f}ms" for stage in STAGES + ["total"]), flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "results": results}, f, indent=2)
+
+    stored = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            stored = json.load(f)
+
+    if args.update_baselines:
+        scenarios = stored.get("scenarios", {}) if stored.get("latency_ms") == args.latency_ms else {}
+        scenarios.update({name: {"timings": result["timings"], "calibration": result["calibration"]}
+                          for name, result in results.items()})
+        with open(args.baselines, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "scenarios": scenarios}, f, indent=2, sort_keys=True)
+        logger.info(f"Baselines for {len(results)} scenarios written to {args.baselines}")
+        return 0
+
+    if not stored:
+        logger.warning(f"No baselines at {args.baselines}; run with --update-baselines to create them")
+        return 0
+    if stored.get("latency_ms") != args.latency_ms:
+        logger.warning(f"Baselines were taken with latency {stored.get('latency_ms')} ms, not comparing")
+        return 0
+
+    regressions = find_regressions(results, stored.get("scenarios", {}), args.tolerance, args.min_delta_ms / 1000)
+    for regression in regressions:
+        logger.error(f"Regression: {regression}")
+    if regressions:
+        return 1
+    logger.info("No regressions against baselines")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
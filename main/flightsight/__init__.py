@@ -0,0 +1,33 @@
+from .config import FORECAST_DAYS
+from .fill import fill_missing_flights, fill_missing_weather
+from .matrix import plan_matrix, run_matrix
+from .offers import fetch_flight_offers, flatten_offers
+from .pipeline import run_search
+from .reference import calculate_distance, get_airline_name, get_airport_info, search_locations
+from .schema import FLIGHT_COLUMNS, WEATHER_COLUMNS
+from .star import build_star
+from .storage import s3_partition, save_data, save_datasets
+from .weather import aggregate_forecasts, get_weather_forecast
+
+__all__ = [
+    "FORECAST_DAYS",
+    "FLIGHT_COLUMNS",
+    "WEATHER_COLUMNS",
+    "aggregate_forecasts",
+    "build_star",
+    "calculate_distance",
+    "fetch_flight_offers",
+    "fill_missing_flights",
+    "fill_missing_weather",
+    "flatten_offers",
+    "get_airline_name",
+    "get_airport_info",
+    "get_weather_forecast",
+    "plan_matrix",
+    "run_matrix",
+    "run_search",
+    "s3_partition",
+    "save_data",
+    "save_datasets",
+    "search_locations",
+]
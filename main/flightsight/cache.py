@@ -0,0 +1,149 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .config import (REFERENCE_CACHE_NEGATIVE_TTL, REFERENCE_CACHE_SIZE, REFERENCE_CACHE_TTL, SEARCH_CACHE_MAX_BYTES,
+                     SEARCH_CACHE_TTL)
+from .metrics import record_cache
+
+class ReferenceCache:
+    def __init__(self, maxsize=REFERENCE_CACHE_SIZE, ttl=REFERENCE_CACHE_TTL,
+                 negative_ttl=REFERENCE_CACHE_NEGATIVE_TTL, db_path=None, name="reference", clock=time.time):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Keys being loaded right now; concurrent misses on one key wait for its single load
+        self._inflight = {}
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS reference_cache "
+                "(key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._db.commit()
+
+    def _get(self, key):
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                return True, entry[1]
+            del self._entries[key]
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM reference_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[1] > now:
+                value = json.loads(row[0])
+                self._put(key, value, row[1])
+                return True, value
+        return False, None
+
+    def _put(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def set(self, key, value):
+        # None marks a code the API does not know about; keep it for a shorter time
+        expires_at = self._clock() + (self.negative_ttl if value is None else self.ttl)
+        with self._lock:
+            self._put(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO reference_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                self._db.commit()
+
+    def get_or_load(self, key, loader):
+        # A caller arriving while the same key is being loaded counts as a hit and shares that load's result
+        with self._lock:
+            found, value = self._get(key)
+            future = None if found else self._inflight.get(key)
+            owner = not found and future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        record_cache(self.name, hits=int(not owner), misses=int(owner))
+        if found:
+            return value
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+            self.set(key, value)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries)
+            }
+
+class ResultCache:
+    # In-memory LRU for whole search results, bounded by total size in bytes rather than entry count;
+    # callers pass each entry's size since only they know what it holds
+    def __init__(self, ttl=SEARCH_CACHE_TTL, max_bytes=SEARCH_CACHE_MAX_BYTES, name="search"):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                self._evict(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        record_cache(self.name, hits=int(entry is not None), misses=int(entry is None))
+        return None if entry is None else entry[1]
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.time() + self.ttl, value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        self.size -= self._entries.pop(key)[2]
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "bytes": self.size}
@@ -0,0 +1,276 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .clients import get_history_store, get_trend_store
+from .config import (API_ENV_VARS, DIMENSIONS_PATH, FORECAST_DAYS, HISTORY_PATH, MANIFEST_MAX_AGE, MANIFEST_PATH,
+                     MAX_CONCURRENT_SEARCHES, MAX_OFFERS, METRICS_FILE, OUTPUT_LAYOUT, S3_ENV_VARS, STREAM_CHUNK_ROWS,
+                     TRENDS_PATH, invalid_settings, missing_env_vars)
+from .history import append_history
+from .incremental import Manifest, refresh_route
+from .matrix import matrix_partition, run_matrix
+from .metrics import merge_run, profile_run, write_prometheus_snapshot
+from .pipeline import ingest_route, run_search
+from .scheduler import BATCH, request_priority
+from .star import flight_datasets, written_updates
+from .trends import record_trends
+from .storage import s3_partition, save_datasets
+
+logger = logging.getLogger(__name__)
+
+def read_routes(path):
+    routes = []
+    with open(path, newline="") as f:
+        rows = (line for line in f if line.strip() and not line.lstrip().startswith("#"))
+        for row in csv.DictReader(rows):
+            routes.append({
+                "origin": row["origin"].strip().upper(),
+                "destination": row["destination"].strip().upper(),
+                "departure_date": datetime.strptime(row["departure_date"].strip(), "%Y-%m-%d").date()
+            })
+    return routes
+
+def process_route(route, days=FORECAST_DAYS, output_dir=None, upload=True, manifest_entries=None,
+                  max_age=MANIFEST_MAX_AGE, stream=False, max_offers=MAX_OFFERS, chunk_rows=STREAM_CHUNK_ROWS,
+                  layout=OUTPUT_LAYOUT, dimension_entries=None, trends_path=TRENDS_PATH, history_path=HISTORY_PATH):
+    origin = {"iata": route["origin"], "latitude": None, "longitude": None}
+    destination = {"iata": route["destination"], "latitude": None, "longitude": None}
+    summary = {
+        "route": f"{route['origin']}-{route['destination']}",
+        "departure_date": route["departure_date"].strftime("%Y-%m-%d"),
+        "flights": 0,
+        "weather": 0,
+        "outputs": [],
+        "errors": []
+    }
+    with profile_run("batch_route", route=summary["route"], departure_date=summary["departure_date"]) as profile, \
+            request_priority(BATCH):
+        try:
+            trends = get_trend_store(trends_path)
+            history = get_history_store(history_path)
+            if manifest_entries is not None:
+                # Incremental: the worker only reads its slice of the manifest and hands updates back to the parent
+                results, updates, day_results = refresh_route(origin, destination, route["departure_date"],
+                                                              manifest_entries, days=days, max_age=max_age,
+                                                              output_dir=output_dir, trends=trends, history=history)
+                summary["refreshed"] = [key.rsplit("/", 1)[1] for key in sorted(updates)]
+                summary["flights"] = sum(len(result["frame"]) for result in results if result["table"] == "flights")
+                summary["weather"] = sum(len(result["frame"]) for result in results if result["table"] == "weather")
+                summary["outputs"] = [result["key"] for result in results if not result["error"]]
+                summary["errors"].extend(
+                    f"{current_date.strftime('%Y-%m-%d')}: {str(search_error)}"
+                    for current_date, _, search_error in day_results if search_error is not None
+                )
+                summary["errors"].extend(result["error"] for result in results if result["error"])
+                summary["manifest"] = updates
+            elif stream:
+                # Streamed straight to part files; rows are counted as they are written, never held together
+                partition = s3_partition(route["origin"], route["destination"], route["departure_date"])
+                results, day_results = ingest_route(origin, destination, route["departure_date"], days=days,
+                                                    partition=partition, output_dir=output_dir,
+                                                    max_offers=max_offers, chunk_rows=chunk_rows, trends=trends,
+                                                    history=history)
+                summary["flights"] = sum(result["rows"] for result in results if result["name"].startswith("flights/"))
+                summary["weather"] = sum(result["rows"] for result in results if result["name"].startswith("weather/"))
+                summary["outputs"] = [result["key"] for result in results if not result["error"]]
+                summary["errors"].extend(
+                    f"{current_date.strftime('%Y-%m-%d')}: {str(search_error)}"
+                    for current_date, _, search_error in day_results if search_error is not None
+                )
+                summary["errors"].extend(result["error"] for result in results if result["error"])
+            else:
+                flights_df, weather_df, day_results = run_search(origin, destination, route["departure_date"], days=days,
+                                                                 max_offers=max_offers)
+                record_trends(trends, flights_df)
+                append_history(history, flights_df)
+                summary["flights"] = len(flights_df)
+                summary["weather"] = len(weather_df)
+                summary["errors"].extend(
+                    f"{current_date.strftime('%Y-%m-%d')}: {str(search_error)}"
+                    for current_date, _, search_error in day_results if search_error is not None
+                )
+                if upload or output_dir:
+                    partition = s3_partition(route["origin"], route["destination"], route["departure_date"])
+                    # Like the manifest, the dimension registry is read-only here; written entries go back to the parent
+                    datasets, updates = flight_datasets(flights_df, layout, dimension_entries)
+                    results = save_datasets(datasets + [(weather_df, "weather.csv")],
+                                            partition=partition, output_dir=output_dir)
+                    summary["outputs"] = [result["key"] for result in results if not result["error"]]
+                    summary["errors"].extend(result["error"] for result in results if result["error"])
+                    summary["dimensions"] = written_updates(results, updates)
+        except Exception as e:
+            logger.error(f"Batch run failed for {summary['route']} on {summary['departure_date']}: {str(e)}")
+            summary["errors"].append(str(e))
+    summary["profile"] = profile.as_dict()
+    return summary
+
+def parse_codes(value):
+    return [code.strip().upper() for code in value.split(",") if code.strip()]
+
+def process_matrix(origins, destinations, departure_date, days=FORECAST_DAYS, output_dir=None, upload=True,
+                   workers=MAX_CONCURRENT_SEARCHES, max_offers=MAX_OFFERS, layout=OUTPUT_LAYOUT, dimensions=None,
+                   trends_path=TRENDS_PATH, history_path=HISTORY_PATH):
+    # Runs in this process on a thread pool, so every route shares one reference cache, weather cache and
+    # Amadeus scheduler; the output is one flights and one weather dataset for the whole matrix
+    summary = {
+        "matrix": f"{','.join(origins)} x {','.join(destinations)}",
+        "departure_date": departure_date.strftime("%Y-%m-%d"),
+        "flights": 0,
+        "weather": 0,
+        "outputs": [],
+        "errors": []
+    }
+    with profile_run("batch_matrix", matrix=summary["matrix"], departure_date=summary["departure_date"]), \
+            request_priority(BATCH):
+        try:
+            flights_df, weather_df, task_results = run_matrix(origins, destinations, departure_date, days=days,
+                                                              max_workers=workers, max_offers=max_offers)
+            record_trends(get_trend_store(trends_path), flights_df)
+            append_history(get_history_store(history_path), flights_df)
+            summary["searches"] = len(task_results)
+            summary["flights"] = len(flights_df)
+            summary["weather"] = len(weather_df)
+            summary["errors"].extend(
+                f"{origin}-{destination} {current_date.strftime('%Y-%m-%d')}: {str(search_error)}"
+                for origin, destination, current_date, search_error in task_results if search_error is not None
+            )
+            if upload or output_dir:
+                partition = matrix_partition(origins, destinations, departure_date,
+                                             time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()))
+                datasets, updates = flight_datasets(flights_df, layout, dimensions.entries if dimensions else None)
+                results = save_datasets(datasets + [(weather_df, "weather.csv")],
+                                        partition=partition, output_dir=output_dir)
+                summary["outputs"] = [result["key"] for result in results if not result["error"]]
+                summary["errors"].extend(result["error"] for result in results if result["error"])
+                if dimensions is not None:
+                    dimensions.update(written_updates(results, updates))
+                    dimensions.save()
+        except Exception as e:
+            logger.error(f"Matrix run failed for {summary['matrix']} on {summary['departure_date']}: {str(e)}")
+            summary["errors"].append(str(e))
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="flightsight",
+                                     description="Fetch flight offers and weather for a file of routes.")
+    parser.add_argument("routes", nargs="?", help="CSV file with origin,destination,departure_date columns")
+    parser.add_argument("--origins", type=parse_codes,
+                        help="route matrix mode: comma-separated origin IATA codes (with --destinations)")
+    parser.add_argument("--destinations", type=parse_codes, help="comma-separated destination IATA codes")
+    parser.add_argument("--departure-date", type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(),
+                        help="first departure date (YYYY-MM-DD) of a route matrix")
+    parser.add_argument("--days", type=int, default=FORECAST_DAYS, help="days to search from each departure date")
+    parser.add_argument("--workers", type=int,
+                        help="worker processes for a routes file (default: CPU count), or search threads for a "
+                             f"route matrix (default: {MAX_CONCURRENT_SEARCHES})")
+    parser.add_argument("--output-dir", help="write outputs under this directory instead of S3")
+    parser.add_argument("--no-upload", action="store_true", help="fetch and transform only")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch days that are stale in the manifest and only write changed data")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="manifest file or s3://bucket/key")
+    parser.add_argument("--max-age", type=int, default=MANIFEST_MAX_AGE,
+                        help="seconds before a fetched day is considered stale")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="write a Prometheus text-format snapshot here when the batch finishes")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream offers into fixed-size part files instead of building whole tables in memory")
+    parser.add_argument("--max-offers", type=int, default=MAX_OFFERS, help="offers to request per day (at most 250)")
+    parser.add_argument("--chunk-rows", type=int, default=STREAM_CHUNK_ROWS, help="rows per part file with --stream")
+    parser.add_argument("--trends", default=TRENDS_PATH,
+                        help="SQLite file of fare-trend aggregates to update with every run (empty to skip)")
+    parser.add_argument("--history", default=HISTORY_PATH,
+                        help="directory of the Parquet run history to append every run's flights to (empty to skip)")
+    parser.add_argument("--layout", choices=["wide", "star"], default=OUTPUT_LAYOUT,
+                        help="write flights as one wide table, or as fact tables plus airport/airline/aircraft "
+                             "dimensions")
+    parser.add_argument("--dimensions", default=DIMENSIONS_PATH,
+                        help="registry of dimension rows already written (file or s3://bucket/key), for --layout star")
+    args = parser.parse_args(argv)
+    matrix = bool(args.origins or args.destinations)
+    if matrix:
+        if not (args.origins and args.destinations and args.departure_date) or args.routes:
+            parser.error("a route matrix takes --origins, --destinations and --departure-date instead of a routes file")
+        if args.incremental or args.stream:
+            parser.error("--incremental and --stream apply to a routes file, not a route matrix")
+    elif not args.routes:
+        parser.error("pass a routes file, or --origins/--destinations/--departure-date for a route matrix")
+    if not 1 <= args.max_offers <= 250:
+        parser.error("--max-offers must be between 1 and 250")
+    if args.stream and (args.incremental or args.no_upload and not args.output_dir):
+        parser.error("--stream writes as it goes: it needs somewhere to write and cannot be combined with --incremental")
+    if args.incremental and args.no_upload and not args.output_dir:
+        parser.error("--incremental needs somewhere to write: drop --no-upload or pass --output-dir")
+    if args.layout == "star" and (args.stream or args.incremental):
+        parser.error("--layout star writes whole tables: it cannot be combined with --stream or --incremental")
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    upload = not args.no_upload
+    required = API_ENV_VARS + (S3_ENV_VARS if upload and not args.output_dir else [])
+    missing_vars = missing_env_vars(required)
+    if missing_vars:
+        logger.error(f"Missing environment variables: {', '.join(missing_vars)}")
+        return 2
+    settings_errors = invalid_settings()
+    if settings_errors:
+        logger.error(f"Invalid settings: {'; '.join(settings_errors)}")
+        return 2
+
+    # The dimension registry ("table/key" -> row hash) is stored the same way as the incremental manifest
+    dimensions = Manifest(args.dimensions) if args.layout == "star" and (upload or args.output_dir) else None
+    if matrix:
+        summary = process_matrix(args.origins, args.destinations, args.departure_date, days=args.days,
+                                 output_dir=args.output_dir, upload=upload,
+                                 workers=args.workers or MAX_CONCURRENT_SEARCHES, max_offers=args.max_offers,
+                                 layout=args.layout, dimensions=dimensions, trends_path=args.trends,
+                                 history_path=args.history)
+        print(json.dumps(summary), flush=True)
+        if args.metrics_file:
+            write_prometheus_snapshot(args.metrics_file)
+        return 1 if summary["errors"] else 0
+
+    routes = read_routes(args.routes)
+    if not routes:
+        logger.warning(f"No routes found in {args.routes}")
+        return 0
+
+    manifest = Manifest(args.manifest) if args.incremental else None
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers or os.cpu_count() or 1, len(routes)))) as executor:
+        futures = [
+            executor.submit(process_route, route, args.days, args.output_dir, upload,
+                            manifest.route_entries(route["origin"], route["destination"]) if manifest else None,
+                            args.max_age, args.stream, args.max_offers, args.chunk_rows, args.layout,
+                            dimensions.entries if dimensions else None, args.trends, args.history)
+            for route in routes
+        ]
+        try:
+            for future in futures:
+                summary = future.result()
+                failed += bool(summary["errors"])
+                # Workers log their own profile as JSON; the parent only keeps the totals for the snapshot
+                merge_run(summary.pop("profile"))
+                if manifest is not None:
+                    manifest.update(summary.pop("manifest", {}))
+                dimension_updates = summary.pop("dimensions", {})
+                if dimensions is not None:
+                    dimensions.update(dimension_updates)
+                print(json.dumps(summary), flush=True)
+        finally:
+            if manifest is not None:
+                manifest.save()
+            if dimensions is not None:
+                dimensions.save()
+            if args.metrics_file:
+                write_prometheus_snapshot(args.metrics_file)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
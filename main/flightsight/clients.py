@@ -0,0 +1,78 @@
+from functools import lru_cache
+
+from .cache import ReferenceCache, ResultCache
+from .distance import AirportPairTable
+from .history import HistoryStore
+from .refindex import ReferenceIndex
+from .scheduler import AmadeusScheduler
+from .trends import TrendStore
+from .config import (AMADEUS_CLIENT_ID, AMADEUS_CLIENT_SECRET, AMADEUS_HOST, AMADEUS_PORT, AMADEUS_SSL,
+                     AWS_ACCESS_KEY, AWS_SECRET_KEY, HISTORY_PATH, MAX_CONCURRENT_WEATHER, REFERENCE_CACHE_PATH,
+                     REFERENCE_INDEX_PATH, S3_ENDPOINT_URL, TRENDS_PATH, WEATHER_CACHE_SIZE, WEATHER_CACHE_TTL)
+
+# Clients are built on first use and then shared by every caller in the process
+# (all Streamlit sessions, or one batch worker), so importing the package stays cheap.
+
+@lru_cache(maxsize=None)
+def get_amadeus_client():
+    from amadeus import Client
+    options = {"host": AMADEUS_HOST, "port": AMADEUS_PORT, "ssl": AMADEUS_SSL} if AMADEUS_HOST else {}
+    return Client(
+        client_id=AMADEUS_CLIENT_ID,
+        client_secret=AMADEUS_CLIENT_SECRET,
+        **options
+    )
+
+@lru_cache(maxsize=None)
+def get_amadeus_scheduler():
+    # Every Amadeus call in the process shares this rate budget, whichever session or worker makes it
+    return AmadeusScheduler()
+
+@lru_cache(maxsize=None)
+def get_reference_cache():
+    return ReferenceCache(db_path=REFERENCE_CACHE_PATH)
+
+@lru_cache(maxsize=None)
+def get_reference_index():
+    # Opening the index only records its path; each table is memory-mapped on its first lookup
+    return ReferenceIndex(REFERENCE_INDEX_PATH) if REFERENCE_INDEX_PATH else None
+
+@lru_cache(maxsize=None)
+def get_weather_cache():
+    return ReferenceCache(maxsize=WEATHER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL, name="weather")
+
+@lru_cache(maxsize=None)
+def get_search_cache():
+    return ResultCache()
+
+@lru_cache(maxsize=None)
+def get_trend_store(path=TRENDS_PATH):
+    return TrendStore(path) if path else None
+
+@lru_cache(maxsize=None)
+def get_history_store(path=HISTORY_PATH):
+    return HistoryStore(path) if path else None
+
+@lru_cache(maxsize=None)
+def get_distance_table():
+    return AirportPairTable()
+
+@lru_cache(maxsize=None)
+def get_http_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_CONCURRENT_WEATHER,
+                          pool_maxsize=MAX_CONCURRENT_WEATHER)
+    session.mount("https://", adapter)
+    return session
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    import boto3
+    return boto3.client(
+        "s3",
+        aws_access_key_id=AWS_ACCESS_KEY,
+        aws_secret_access_key=AWS_SECRET_KEY,
+        endpoint_url=S3_ENDPOINT_URL
+    )
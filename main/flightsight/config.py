@@ -0,0 +1,108 @@
+import importlib.util
+import os
+
+# Load environment variables
+AMADEUS_CLIENT_ID = os.getenv("AMADEUS_CLIENT_ID")
+AMADEUS_CLIENT_SECRET = os.getenv("AMADEUS_CLIENT_SECRET")
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+S3_BUCKET = os.getenv("S3_BUCKET")
+AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+
+# Amadeus API: optional custom host (e.g. a local fake server), and the shared request budget --
+# token-bucket rate/burst sized to the account's quota, concurrent calls, and retry backoff on 429/5xx
+AMADEUS_HOST = os.getenv("AMADEUS_HOST")
+AMADEUS_PORT = int(os.getenv("AMADEUS_PORT", "443"))
+AMADEUS_SSL = os.getenv("AMADEUS_SSL", "true").lower() not in ("0", "false", "no")
+AMADEUS_RATE_LIMIT = float(os.getenv("AMADEUS_RATE_LIMIT", "10"))
+AMADEUS_BURST = int(os.getenv("AMADEUS_BURST", "10"))
+AMADEUS_MAX_CONCURRENCY = int(os.getenv("AMADEUS_MAX_CONCURRENCY", "10"))
+AMADEUS_MAX_RETRIES = int(os.getenv("AMADEUS_MAX_RETRIES", "4"))
+AMADEUS_BACKOFF_BASE = float(os.getenv("AMADEUS_BACKOFF_BASE", "0.5"))
+AMADEUS_BACKOFF_MAX = float(os.getenv("AMADEUS_BACKOFF_MAX", "8"))
+
+# Search horizon and how many per-day offer searches may be in flight at once
+FORECAST_DAYS = int(os.getenv("FORECAST_DAYS", "5"))
+MAX_CONCURRENT_SEARCHES = int(os.getenv("MAX_CONCURRENT_SEARCHES", "5"))
+
+# Offers requested per day (the Amadeus search caps max at 250) and rows per part file when streaming to the sink
+MAX_OFFERS = min(int(os.getenv("MAX_OFFERS", "10")), 250)
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "50000"))
+
+# Airport/airline reference data cache, optionally persisted to a local SQLite file
+REFERENCE_CACHE_PATH = os.getenv("REFERENCE_CACHE_PATH")
+REFERENCE_CACHE_TTL = int(os.getenv("REFERENCE_CACHE_TTL", str(7 * 24 * 3600)))
+REFERENCE_CACHE_NEGATIVE_TTL = int(os.getenv("REFERENCE_CACHE_NEGATIVE_TTL", str(24 * 3600)))
+REFERENCE_CACHE_SIZE = int(os.getenv("REFERENCE_CACHE_SIZE", "5000"))
+
+# OpenWeather /forecast data is refreshed every 3 hours, so cached payloads live as long
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", str(3 * 3600)))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1000"))
+WEATHER_CELL_PRECISION = int(os.getenv("WEATHER_CELL_PRECISION", "2"))
+MAX_CONCURRENT_WEATHER = int(os.getenv("MAX_CONCURRENT_WEATHER", "8"))
+
+# S3 output: optional custom endpoint (MinIO/moto), compression ("none", "gzip", "zstd") and multipart cut-over
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_COMPRESSION = os.getenv("S3_COMPRESSION", "none").lower()
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "csv").lower()
+
+# Flights output layout: "wide" (one denormalized row per segment) or "star" (fact tables plus airport/airline/
+# aircraft dimensions); the dimension registry (local path or s3://bucket/key) records which rows were written
+OUTPUT_LAYOUT = os.getenv("OUTPUT_LAYOUT", "wide").lower()
+DIMENSIONS_PATH = os.getenv("DIMENSIONS_PATH", "flightsight_dimensions.json")
+
+# Fare-trend aggregates (see flightsight.trends) kept across runs in a local SQLite file; set to "" to disable
+TRENDS_PATH = os.getenv("TRENDS_PATH", "flightsight_trends.sqlite")
+TRENDS_WINDOW_DAYS = int(os.getenv("TRENDS_WINDOW_DAYS", "30"))
+
+# Local history of every run's flights as Parquet partitioned by route and departure date (see flightsight.history),
+# queried by the dashboard's History view; set to "" to disable
+HISTORY_PATH = os.getenv("HISTORY_PATH", "flightsight_history")
+HISTORY_COMPACT_FILES = int(os.getenv("HISTORY_COMPACT_FILES", "24"))
+
+# Bundled offline airport/airline/aircraft index (see flightsight.refindex); set to "" to always ask the API
+REFERENCE_INDEX_PATH = os.getenv("REFERENCE_INDEX_PATH",
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "reference_index"))
+
+# Whole dashboard search results, kept in memory per (origin, destination, date) up to a total size in bytes
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", str(15 * 60)))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Segment distances: "ellipsoidal" (WGS-84, Vincenty) or "haversine" (spherical, faster), remembered per airport
+# pair for the life of the process up to a number of pairs
+DISTANCE_MODEL = os.getenv("DISTANCE_MODEL", "ellipsoidal").lower()
+DISTANCE_TABLE_SIZE = int(os.getenv("DISTANCE_TABLE_SIZE", "100000"))
+
+# Incremental refreshes: manifest location (local path or s3://bucket/key) and how long a fetched day stays fresh
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "flightsight_manifest.json")
+MANIFEST_MAX_AGE = int(os.getenv("MANIFEST_MAX_AGE", str(6 * 3600)))
+
+# Metrics: optional Prometheus scrape port and/or textfile-collector path for the process-wide totals
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("METRICS_FILE")
+
+API_ENV_VARS = ["AMADEUS_CLIENT_ID", "AMADEUS_CLIENT_SECRET", "OPENWEATHER_API_KEY"]
+S3_ENV_VARS = ["S3_BUCKET", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]
+REQUIRED_ENV_VARS = API_ENV_VARS + S3_ENV_VARS
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+OUTPUT_FORMATS = ("csv", "parquet")
+DISTANCE_MODEL_NAMES = ("ellipsoidal", "haversine")
+
+def missing_env_vars(names=REQUIRED_ENV_VARS):
+    return [name for name in names if not os.getenv(name)]
+
+def invalid_settings():
+    # Checked at startup, so a bad value stops the run up front instead of failing every upload
+    errors = []
+    if S3_COMPRESSION not in COMPRESSIONS:
+        errors.append(f"S3_COMPRESSION must be one of {', '.join(COMPRESSIONS)}, not {S3_COMPRESSION!r}")
+    elif S3_COMPRESSION == "zstd" and OUTPUT_FORMAT != "parquet":
+        if importlib.util.find_spec("zstandard") is None:
+            errors.append("S3_COMPRESSION=zstd needs the zstandard package (pip install -r requirements.txt)")
+    if OUTPUT_FORMAT not in OUTPUT_FORMATS:
+        errors.append(f"OUTPUT_FORMAT must be one of {', '.join(OUTPUT_FORMATS)}, not {OUTPUT_FORMAT!r}")
+    if DISTANCE_MODEL not in DISTANCE_MODEL_NAMES:
+        errors.append(f"DISTANCE_MODEL must be one of {', '.join(DISTANCE_MODEL_NAMES)}, not {DISTANCE_MODEL!r}")
+    return errors
@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import DISTANCE_MODEL, DISTANCE_TABLE_SIZE
+from .metrics import record_cache
+
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid, in metres
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def ellipsoidal_km(lat1, lon1, lat2, lon2, max_iterations=200, tolerance=1e-12):
+    # Vincenty's inverse formula, iterated for all pairs at once until every pair converges
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    f = WGS84_F
+    L = lon2 - lon1
+    U1 = np.arctan((1 - f) * np.tan(lat1))
+    U2 = np.arctan((1 - f) * np.tan(lat2))
+    sinU1, cosU1, sinU2, cosU2 = np.sin(U1), np.cos(U1), np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(max_iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.sqrt((cosU2 * sin_lam) ** 2 + (cosU1 * sinU2 - sinU1 * cosU2 * cos_lam) ** 2)
+            cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_next = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            converged = np.abs(lam_next - lam) < tolerance
+            lam = lam_next
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        ))
+        distance = WGS84_B * A * (sigma - delta_sigma) / 1000
+
+    # Nearly antipodal pairs may not converge; the spherical answer is within 0.5% there
+    return np.where(converged, distance, haversine_km(np.degrees(lat1), np.degrees(lon1),
+                                                      np.degrees(lat2), np.degrees(lon2)))
+
+# Keys match config.DISTANCE_MODEL_NAMES, which invalid_settings() checks DISTANCE_MODEL against
+DISTANCE_MODELS = {
+    "haversine": haversine_km,
+    "ellipsoidal": ellipsoidal_km
+}
+
+def distance_km(lat1, lon1, lat2, lon2, model=DISTANCE_MODEL):
+    return DISTANCE_MODELS[model](lat1, lon1, lat2, lon2)
+
+class AirportPairTable:
+    # Distances per (origin, destination) pair, least recently used pairs evicted beyond max_pairs
+    def __init__(self, model=DISTANCE_MODEL, max_pairs=DISTANCE_TABLE_SIZE):
+        self.model = model
+        self.max_pairs = max_pairs
+        self._distances = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._distances)
+
+    def lookup(self, origins, destinations, dep_lats, dep_lons, arr_lats, arr_lons):
+        dep_lats, dep_lons, arr_lats, arr_lons = (
+            np.asarray(v, dtype=float) for v in (dep_lats, dep_lons, arr_lats, arr_lons)
+        )
+        pairs = list(zip(origins, destinations))
+        # Only this batch's pairs are read from the shared table, so a lookup costs the same however many pairs
+        # the process has seen
+        known = {}
+        with self._lock:
+            for pair in set(pairs):
+                distance = self._distances.get(pair)
+                if distance is not None:
+                    self._distances.move_to_end(pair)
+                    known[pair] = distance
+
+        # Solve each airport pair the table hasn't seen once, in a single vectorized call
+        has_coords = ~(np.isnan(dep_lats) | np.isnan(dep_lons) | np.isnan(arr_lats) | np.isnan(arr_lons))
+        first_row = {}
+        for idx, pair in enumerate(pairs):
+            if pair not in known and has_coords[idx] and pair not in first_row:
+                first_row[pair] = idx
+        # Rows of a pair that has no distance and no coordinates to solve it are neither
+        unresolved = sum(1 for pair in pairs if pair not in known and pair not in first_row)
+        record_cache("distance_pairs", hits=len(pairs) - len(first_row) - unresolved, misses=len(first_row))
+        if first_row:
+            rows = np.fromiter(first_row.values(), dtype=int, count=len(first_row))
+            solved = distance_km(dep_lats[rows], dep_lons[rows], arr_lats[rows], arr_lons[rows], model=self.model)
+            new_distances = dict(zip(first_row, solved.tolist()))
+            known.update(new_distances)
+            with self._lock:
+                self._distances.update(new_distances)
+                while len(self._distances) > self.max_pairs:
+                    self._distances.popitem(last=False)
+
+        return np.array([known.get(pair, np.nan) for pair in pairs], dtype=float)
@@ -0,0 +1,84 @@
+import logging
+import os
+import uuid
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from .config import FORECAST_DAYS
+from .metrics import instrumented
+from .schema import SYNTHESIZED_COLUMN
+
+logger = logging.getLogger(__name__)
+
+def generate_ids(count):
+    random_bytes = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=random_bytes[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
+
+def fill_missing_dates(df, start_date, id_column, days=FORECAST_DAYS, key_column=None, keys=None,
+                       date_column="DEPARTURE_DATE", timestamp_columns=()):
+    target_dates = [(start_date + timedelta(days=day_offset)).strftime("%Y-%m-%d") for day_offset in range(days)]
+    columns = [col for col in df.columns if col != SYNTHESIZED_COLUMN]
+    fill_key = key_column or "_FILL_KEY"
+
+    in_range = df[df[date_column].isin(target_dates)]
+    if key_column is None:
+        in_range = in_range.assign(_FILL_KEY=0)
+        key_values = [0]
+    else:
+        key_values = list(keys) if keys is not None else list(in_range[key_column].unique())
+
+    # Every (key, date) cell points at the latest date on or before it that has real rows
+    grid = pd.MultiIndex.from_product([key_values, target_dates], names=[fill_key, date_column]).to_frame(index=False)
+    present = in_range[[fill_key, date_column]].drop_duplicates()
+    present["_SOURCE_DATE"] = present[date_column]
+    grid = grid.merge(present, on=[fill_key, date_column], how="left")
+    grid["_SOURCE_DATE"] = grid.groupby(fill_key, sort=False)["_SOURCE_DATE"].ffill()
+
+    for key, target_date in grid.loc[grid["_SOURCE_DATE"].isna(), [fill_key, date_column]].itertuples(index=False):
+        label = f"{key} on {target_date}" if key_column else target_date
+        logger.warning(f"No data available to fill {id_column} rows for {label}")
+
+    filled = grid.dropna(subset=["_SOURCE_DATE"]).merge(
+        in_range.rename(columns={date_column: "_SOURCE_DATE"}), on=[fill_key, "_SOURCE_DATE"], how="inner"
+    )
+    if filled.empty:
+        return df.assign(**{SYNTHESIZED_COLUMN: False})
+
+    synthesized = filled[date_column] != filled["_SOURCE_DATE"]
+    filled[SYNTHESIZED_COLUMN] = synthesized
+    if synthesized.any():
+        # Rows copied from the same source row group keep sharing one new ID per target date
+        codes, uniques = pd.factorize(
+            filled.loc[synthesized, date_column] + "|" + filled.loc[synthesized, id_column].astype(str)
+        )
+        filled.loc[synthesized, id_column] = np.array(generate_ids(len(uniques)), dtype=object)[codes]
+        for column in timestamp_columns:
+            filled.loc[synthesized, column] = filled.loc[synthesized, date_column] + "T00:00:00"
+        logger.info(f"Reused {int(synthesized.sum())} rows to fill missing dates for {id_column}")
+
+    return filled[columns + [SYNTHESIZED_COLUMN]].reset_index(drop=True)
+
+def copy_day(day_df, target_date, id_column="TRIP_ID", date_column="DEPARTURE_DATE"):
+    # Streaming counterpart of fill_missing_dates: one real day's rows re-dated onto a day that has none,
+    # each source ID group getting one new ID
+    filled = day_df.assign(**{date_column: target_date.strftime("%Y-%m-%d"), SYNTHESIZED_COLUMN: True})
+    codes, uniques = pd.factorize(filled[id_column])
+    filled[id_column] = np.array(generate_ids(len(uniques)), dtype=object)[codes]
+    return filled
+
+@instrumented
+def fill_missing_flights(flights_df, start_date, days=FORECAST_DAYS):
+    if flights_df.empty:
+        logger.warning("No flight data to fill.")
+        return flights_df.assign(**{SYNTHESIZED_COLUMN: False})
+    return fill_missing_dates(flights_df, start_date, "TRIP_ID", days=days)
+
+@instrumented
+def fill_missing_weather(weather_df, start_date, iata_codes, days=FORECAST_DAYS):
+    if weather_df.empty:
+        logger.warning("No weather data to fill.")
+        return weather_df.assign(**{SYNTHESIZED_COLUMN: False})
+    return fill_missing_dates(weather_df, start_date, "LOCATION_ID", days=days, key_column="IATA_CODE",
+                              keys=iata_codes, timestamp_columns=("EVENT_TIME",))
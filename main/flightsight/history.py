@@ -0,0 +1,226 @@
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+from .config import HISTORY_COMPACT_FILES, HISTORY_PATH
+from .metrics import instrumented
+from .schema import FLIGHT_COLUMNS, FLIGHT_SCHEMA, SYNTHESIZED_COLUMN, apply_schema, arrow_schema
+
+logger = logging.getLogger(__name__)
+
+# SEGMENT_NO lets offer-level queries read one row per offer (SEGMENT_NO = 1) without touching TRIP_ID
+HISTORY_SCHEMA = {**FLIGHT_SCHEMA, "SEGMENT_NO": "int", "SNAPSHOT_AT": "timestamp"}
+COMPACT_LOCK = ".compact.lock"
+COMPACT_LOCK_STALE_SECONDS = 600
+
+def history_file(first_at, last_at):
+    # Named after the snapshot times it holds, so a time-range query can skip files without opening them
+    return f"snapshots-{int(first_at * 1000):013d}-{int(last_at * 1000):013d}-{uuid.uuid4().hex[:8]}.parquet"
+
+def file_times(file_name):
+    parts = file_name.split("-")
+    try:
+        return int(parts[1]) / 1000, int(parts[2]) / 1000
+    except (IndexError, ValueError):
+        return None
+
+def single_snapshot_files(directory):
+    files = []
+    for entry in os.scandir(directory):
+        times = file_times(entry.name) if entry.name.endswith(".parquet") else None
+        if times is not None and times[0] == times[1]:
+            files.append(entry.path)
+    return sorted(files)
+
+def take_over_stale_lock(lock_path, seen):
+    # Removes the lock file, but only if it is still the stale one described by seen (an os.stat result). Every
+    # process that saw that lock links it to the same claim name, so only one of them gets the link; a process
+    # that saw it before it was replaced links the new lock instead, notices the different file and backs off.
+    claim_path = f"{lock_path}.{seen.st_ino}-{seen.st_mtime_ns}"
+    try:
+        os.link(lock_path, claim_path)
+    except FileExistsError:
+        return False
+    except FileNotFoundError:
+        # Already taken over and released; the exclusive create decides who goes next
+        return True
+    try:
+        claimed = os.stat(claim_path)
+        if (claimed.st_ino, claimed.st_mtime_ns) != (seen.st_ino, seen.st_mtime_ns):
+            return False
+        os.remove(lock_path)
+        return True
+    finally:
+        os.remove(claim_path)
+
+@contextmanager
+def compaction_lock(directory):
+    # One compaction per partition across processes: the lock file is created exclusively, and a process that
+    # finds it taken skips compaction instead of merging the same sources a second time. A lock left behind by a
+    # crashed process is taken over once it is older than COMPACT_LOCK_STALE_SECONDS.
+    lock_path = os.path.join(directory, COMPACT_LOCK)
+    try:
+        seen = os.stat(lock_path)
+    except FileNotFoundError:
+        seen = None
+    if seen is not None and time.time() - seen.st_mtime > COMPACT_LOCK_STALE_SECONDS:
+        if not take_over_stale_lock(lock_path, seen):
+            yield False
+            return
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+def write_atomic(table, file_path):
+    import pyarrow.parquet as pq
+    # Written beside its final name and moved in, so a reader never sees half a file
+    pq.write_table(table, f"{file_path}.tmp", compression="zstd", use_dictionary=True)
+    os.replace(f"{file_path}.tmp", file_path)
+
+class HistoryStore:
+    # Every run's flights, appended as Parquet under <path>/route=<O-D>/departure_date=<date>/. Each run adds one
+    # file per partition; once a partition holds HISTORY_COMPACT_FILES of them they are merged into one file
+    # sorted by snapshot time (earlier merged files are left alone, so a merge never rewrites old history).
+    # Queries only list the route's directory, skip departure dates and files outside the time range by path,
+    # and push the remaining filter and the column selection down to the Parquet reader, which skips row groups
+    # by their SNAPSHOT_AT statistics.
+
+    def __init__(self, path=HISTORY_PATH, compact_files=HISTORY_COMPACT_FILES):
+        self.path = path
+        self.compact_files = compact_files
+
+    def _route_dir(self, route):
+        return os.path.join(self.path, f"route={route}")
+
+    @instrumented
+    def append(self, flights_df, snapshot_at=None):
+        import pyarrow as pa
+        if flights_df.empty:
+            return 0
+        snapshot_at = time.time() if snapshot_at is None else snapshot_at
+        flights = flights_df[FLIGHT_COLUMNS].copy()
+        trips = flights.groupby("TRIP_ID", sort=False)
+        flights["SEGMENT_NO"] = trips.cumcount() + 1
+        flights["SNAPSHOT_AT"] = pd.Timestamp(int(snapshot_at * 1000), unit="ms").isoformat()
+        typed = apply_schema(flights, HISTORY_SCHEMA)
+        # An offer is filed under its own origin and final destination, which is the searched route
+        routes = (trips["ORIGIN"].transform("first").astype(str) + "-" +
+                  trips["DESTINATION"].transform("last").astype(str))
+        written = 0
+        for (route, departure_date), part in typed.groupby([routes, typed["DEPARTURE_DATE"].dt.strftime("%Y-%m-%d")],
+                                                           sort=False, observed=True):
+            directory = os.path.join(self._route_dir(route), f"departure_date={departure_date}")
+            os.makedirs(directory, exist_ok=True)
+            table = pa.Table.from_pandas(part, preserve_index=False).cast(arrow_schema(HISTORY_SCHEMA))
+            write_atomic(table, os.path.join(directory, history_file(snapshot_at, snapshot_at)))
+            written += len(part)
+            if self.compact_files and len(single_snapshot_files(directory)) >= self.compact_files:
+                self.compact(directory)
+        logger.info(f"Appended {written} rows to the run history in {self.path}")
+        return written
+
+    def compact(self, directory):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        with compaction_lock(directory) as locked:
+            if not locked:
+                logger.info(f"Skipped compacting {directory}: another process holds its lock")
+                return
+            # Listed under the lock, so every source is still there and no other process merges it
+            files = single_snapshot_files(directory)
+            if len(files) < 2:
+                return
+            table = pa.concat_tables([pq.read_table(file_path) for file_path in files]).sort_by("SNAPSHOT_AT")
+            times = [file_times(os.path.basename(file_path)) for file_path in files]
+            write_atomic(table, os.path.join(directory, history_file(min(t[0] for t in times),
+                                                                     max(t[1] for t in times))))
+            # A query racing the swap can see these rows twice until the sources are gone
+            for file_path in files:
+                os.remove(file_path)
+        logger.info(f"Compacted {len(files)} history files in {directory}")
+
+    def _files(self, route, since, until, departure_dates):
+        route_dir = self._route_dir(route)
+        if not os.path.isdir(route_dir):
+            return []
+        wanted = {f"departure_date={value}" for value in departure_dates} if departure_dates else None
+        files = []
+        for date_dir in os.scandir(route_dir):
+            if not date_dir.is_dir() or (wanted is not None and date_dir.name not in wanted):
+                continue
+            for entry in os.scandir(date_dir.path):
+                times = file_times(entry.name) if entry.name.endswith(".parquet") else None
+                if times is None or (since is not None and times[1] < since) or (until is not None and times[0] > until):
+                    continue
+                files.append(entry.path)
+        return files
+
+    @instrumented
+    def query(self, origin_iata, destination_iata, since=None, until=None, departure_dates=None, columns=None,
+              offers_only=False, include_synthesized=False):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        route = f"{origin_iata}-{destination_iata}"
+        departure_dates = [str(value)[:10] for value in departure_dates] if departure_dates else None
+        files = self._files(route, since, until, departure_dates)
+        columns = list(columns) if columns else list(HISTORY_SCHEMA)
+        if not files:
+            return pd.DataFrame(columns=columns)
+        conditions = []
+        if since is not None:
+            conditions.append(ds.field("SNAPSHOT_AT") >= pa.scalar(int(since * 1e6), type=pa.timestamp("us")))
+        if until is not None:
+            conditions.append(ds.field("SNAPSHOT_AT") <= pa.scalar(int(until * 1e6), type=pa.timestamp("us")))
+        if offers_only:
+            conditions.append(ds.field("SEGMENT_NO") == 1)
+        if not include_synthesized:
+            conditions.append(~ds.field(SYNTHESIZED_COLUMN))
+        condition = None
+        for part in conditions:
+            condition = part if condition is None else condition & part
+        # Read against the current schema, so columns added since older files were written come back as nulls
+        try:
+            table = ds.dataset(files, schema=arrow_schema(HISTORY_SCHEMA), format="parquet").to_table(
+                columns=columns, filter=condition)
+        except FileNotFoundError:
+            # A compaction replaced some of the listed files; the merged file now holds their rows
+            files = self._files(route, since, until, departure_dates)
+            if not files:
+                return pd.DataFrame(columns=columns)
+            table = ds.dataset(files, schema=arrow_schema(HISTORY_SCHEMA), format="parquet").to_table(
+                columns=columns, filter=condition)
+        # Decimals become float64 in Arrow, as apply_schema types them in pandas; Decimal objects are slow to build
+        table = table.cast(pa.schema([
+            field.with_type(pa.float64()) if pa.types.is_decimal(field.type) else field for field in table.schema
+        ]))
+        return table.to_pandas(date_as_object=False)
+
+    def offer_prices(self, origin_iata, destination_iata, since=None, departure_dates=None):
+        # One row per offer and snapshot: the fields the History view charts
+        return self.query(origin_iata, destination_iata, since=since, departure_dates=departure_dates,
+                          columns=["SNAPSHOT_AT", "DEPARTURE_DATE", "CARRIER", "CABIN", "STOPS", "TOTAL_PRICE",
+                                   "CURRENCY"],
+                          offers_only=True)
+
+def append_history(store, flights_df, snapshot_at=None):
+    # Like the fare trends, the history is a by-product of a run and never fails it
+    if store is None:
+        return 0
+    try:
+        return store.append(flights_df, snapshot_at)
+    except Exception as e:
+        logger.error(f"History append failed for {store.path}: {str(e)}")
+        return 0
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+
+import pandas as pd
+
+from .clients import get_s3_client
+from .config import FORECAST_DAYS, MANIFEST_MAX_AGE, MANIFEST_PATH, OUTPUT_FORMAT, S3_COMPRESSION
+from .history import append_history
+from .pipeline import run_search
+from .schema import SYNTHESIZED_COLUMN
+from .storage import prepare_dataset, s3_partition, store_datasets
+from .trends import record_trends
+
+logger = logging.getLogger(__name__)
+
+# Regenerated on every run, so they are left out of content hashes
+VOLATILE_COLUMNS = ("TRIP_ID", "LOCATION_ID", "FETCH_TIMESTAMP")
+
+def manifest_key(origin_iata, destination_iata, departure_date):
+    return f"{origin_iata}-{destination_iata}/{departure_date.strftime('%Y-%m-%d')}"
+
+def content_hash(df):
+    stable = df.drop(columns=[col for col in VOLATILE_COLUMNS if col in df.columns]).astype(str)
+    stable = stable.sort_values(list(stable.columns)).reset_index(drop=True)
+    return hashlib.sha256(pd.util.hash_pandas_object(stable, index=False).values.tobytes()).hexdigest()
+
+def is_stale(entry, max_age=MANIFEST_MAX_AGE, now=None):
+    now = time.time() if now is None else now
+    return entry is None or now - entry.get("fetched_at", 0) > max_age
+
+class Manifest:
+    # Maps manifest_key -> {"fetched_at": epoch seconds, "hashes": {table: content hash}},
+    # kept as one JSON document in a local file or an s3://bucket/key object
+
+    def __init__(self, location=MANIFEST_PATH):
+        self.location = location
+        self.entries = self._load()
+
+    def _s3_location(self):
+        bucket, _, key = self.location[len("s3://"):].partition("/")
+        return bucket, key
+
+    def _load(self):
+        try:
+            if self.location.startswith("s3://"):
+                bucket, key = self._s3_location()
+                s3 = get_s3_client()
+                try:
+                    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+                except s3.exceptions.NoSuchKey:
+                    return {}
+            else:
+                if not os.path.exists(self.location):
+                    return {}
+                with open(self.location, "rb") as f:
+                    body = f.read()
+            return json.loads(body)
+        except Exception as e:
+            logger.error(f"Manifest load error for {self.location}, starting empty: {str(e)}")
+            return {}
+
+    def route_entries(self, origin_iata, destination_iata):
+        prefix = f"{origin_iata}-{destination_iata}/"
+        return {key: entry for key, entry in self.entries.items() if key.startswith(prefix)}
+
+    def update(self, entries):
+        self.entries.update(entries)
+
+    def save(self):
+        body = json.dumps(self.entries, indent=2, sort_keys=True).encode("utf-8")
+        if self.location.startswith("s3://"):
+            bucket, key = self._s3_location()
+            get_s3_client().put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json")
+        else:
+            # Write beside the target and swap it in so a crash never leaves a truncated manifest
+            tmp_path = f"{self.location}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, self.location)
+
+def contiguous_runs(dates):
+    # Sorted dates split into runs of consecutive days
+    runs = []
+    for current_date in dates:
+        if runs and current_date - runs[-1][-1] == timedelta(days=1):
+            runs[-1].append(current_date)
+        else:
+            runs.append([current_date])
+    return runs
+
+def refresh_route(origin, destination, departure_date, entries, days=FORECAST_DAYS, max_age=MANIFEST_MAX_AGE,
+                  compression=S3_COMPRESSION, output_format=OUTPUT_FORMAT, output_dir=None, trends=None,
+                  history=None):
+    now = time.time()
+    dates = [departure_date + timedelta(days=day_offset) for day_offset in range(days)]
+    stale = [current_date for current_date in dates
+             if is_stale(entries.get(manifest_key(origin['iata'], destination['iata'], current_date)), max_age, now)]
+    if not stale:
+        logger.info(f"{origin['iata']}-{destination['iata']}: all {days} days are fresh, nothing to fetch")
+        return [], {}, []
+
+    # Each fresh day becomes its own partition; tables whose content hash is unchanged are not written again
+    run_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(now))
+    pending, day_hashes, day_results = [], {}, []
+    # Stale days are searched in runs of consecutive days, so the fresh days between them are neither searched
+    # nor have their weather aggregated and gaps filled
+    for run in contiguous_runs(stale):
+        flights_df, weather_df, run_results = run_search(origin, destination, run[0], days=len(run),
+                                                         output_format=output_format)
+        day_results.extend(run_results)
+        failed_dates = {current_date for current_date, _, search_error in run_results if search_error is not None}
+        # Every re-fetched day is a fare snapshot, even when its content turns out unchanged and isn't written again
+        record_trends(trends, flights_df, now)
+        append_history(history, flights_df, now)
+
+        for current_date in run:
+            if current_date in failed_dates:
+                continue
+            key = manifest_key(origin['iata'], destination['iata'], current_date)
+            previous = entries.get(key, {}).get("hashes", {})
+            date_str = current_date.strftime("%Y-%m-%d")
+            partition = s3_partition(origin['iata'], destination['iata'], current_date, run_id=run_id)
+            hashes, synthesized = {}, False
+            for df, filename in ((flights_df, "flights.csv"), (weather_df, "weather.csv")):
+                table = os.path.splitext(filename)[0]
+                day_df = df[df["DEPARTURE_DATE"].astype(str) == date_str]
+                if day_df.empty:
+                    continue
+                if table == "flights" and day_df[SYNTHESIZED_COLUMN].astype(bool).all():
+                    synthesized = True
+                hashes[table] = content_hash(day_df)
+                if hashes[table] == previous.get(table):
+                    logger.info(f"{key}: {table} unchanged, skipping upload")
+                    continue
+                result = prepare_dataset(day_df.reset_index(drop=True), filename, partition, compression,
+                                         output_format)
+                result["manifest_key"], result["table"] = key, table
+                pending.append(result)
+            # A day whose offers were all copied from an earlier day is still written, but stays stale so the
+            # next refresh searches it again
+            if synthesized:
+                logger.info(f"{key}: no offers of its own, keeping it stale")
+            else:
+                day_hashes[key] = hashes
+
+    results = store_datasets(pending, output_dir)
+
+    # Days with a failed write stay stale so the next refresh retries them
+    failed_keys = {result["manifest_key"] for result in results if result["error"]}
+    updates = {key: {"fetched_at": now, "hashes": hashes} for key, hashes in day_hashes.items() if key not in failed_keys}
+    return results, updates, day_results
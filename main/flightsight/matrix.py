@@ -0,0 +1,95 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import pandas as pd
+
+from .clients import get_amadeus_client
+from .config import FORECAST_DAYS, MAX_CONCURRENT_SEARCHES, MAX_OFFERS, OUTPUT_FORMAT
+from .fill import fill_missing_flights, fill_missing_weather
+from .metrics import instrumented, propagate
+from .offers import flatten_offers, search_flight_offers
+from .reference import get_airport_info
+from .schema import FLIGHT_COLUMNS, FLIGHT_SCHEMA, WEATHER_COLUMNS, WEATHER_SCHEMA, apply_schema
+from .weather import build_weather_frame
+
+logger = logging.getLogger(__name__)
+
+def plan_matrix(origins, destinations, departure_date, days=FORECAST_DAYS):
+    # Every (origin, destination, date) search the matrix needs, planned before anything is fetched
+    origins = list(dict.fromkeys(code.upper() for code in origins))
+    destinations = list(dict.fromkeys(code.upper() for code in destinations))
+    dates = [departure_date + timedelta(days=day_offset) for day_offset in range(days)]
+    return [(origin, destination, current_date)
+            for origin in origins for destination in destinations if origin != destination
+            for current_date in dates]
+
+def matrix_partition(origins, destinations, departure_date, run_id):
+    codes = ",".join(sorted(set(origins))) + "-" + ",".join(sorted(set(destinations)))
+    digest = hashlib.sha256(codes.encode("utf-8")).hexdigest()[:8]
+    return (f"matrix={len(set(origins))}x{len(set(destinations))}-{digest}/"
+            f"departure_date={departure_date.strftime('%Y-%m-%d')}/run={run_id}")
+
+def run_route_task(task, max_offers=MAX_OFFERS):
+    origin_iata, destination_iata, current_date = task
+    current_date, flights, search_error = search_flight_offers(origin_iata, destination_iata, current_date,
+                                                               max_offers=max_offers)
+    if not flights:
+        if search_error is None:
+            logger.warning(f"No flights found for {origin_iata}-{destination_iata} on {current_date.strftime('%Y-%m-%d')}")
+        return task, None, set(), search_error
+    flights_df, locations = flatten_offers([(current_date, flights)])
+    return task, flights_df, locations, None
+
+@instrumented
+def run_matrix(origins, destinations, departure_date, days=FORECAST_DAYS, max_workers=MAX_CONCURRENT_SEARCHES,
+               max_offers=MAX_OFFERS, output_format=OUTPUT_FORMAT):
+    # One consolidated search over origins x destinations x days. Hubs and stopovers shared between routes
+    # are looked up once for the whole matrix: endpoints are resolved up front, every task reads through the
+    # shared reference cache (identical in-flight calls are coalesced by the scheduler), and weather is built
+    # once over the union of all locations rather than per route.
+    tasks = plan_matrix(origins, destinations, departure_date, days)
+    origin_codes = {task[0] for task in tasks}
+    destination_codes = {task[1] for task in tasks}
+    logger.info(f"Route matrix: {len(origin_codes)} origins x {len(destination_codes)} destinations x {days} days "
+                f"= {len(tasks)} searches")
+
+    get_amadeus_client()
+    route_frames, locations, task_results = {}, set(), []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as executor:
+        endpoints = sorted(origin_codes | destination_codes)
+        airports = dict(zip(endpoints, executor.map(propagate(get_airport_info), endpoints)))
+        futures = [executor.submit(propagate(run_route_task), task, max_offers) for task in tasks]
+        for future in as_completed(futures):
+            task, flights_df, task_locations, search_error = future.result()
+            task_results.append((*task, search_error))
+            if flights_df is not None:
+                route_frames.setdefault(task[:2], []).append((task[2], flights_df))
+                locations.update(task_locations)
+
+    # Gaps are filled per route, as a single-route search would fill them
+    flight_frames = []
+    for route in sorted(route_frames):
+        route_df = pd.concat([df for _, df in sorted(route_frames[route], key=lambda item: item[0])],
+                             ignore_index=True)
+        flight_frames.append(fill_missing_flights(route_df, departure_date, days=days))
+    flights_df = (pd.concat(flight_frames, ignore_index=True) if flight_frames
+                  else fill_missing_flights(flatten_offers([])[0], departure_date, days=days))[FLIGHT_COLUMNS]
+
+    for code in endpoints:
+        geo = (airports.get(code) or {}).get('geoCode', {})
+        loc_type = "Origin" if code in origin_codes else "Destination"
+        locations.add((code, geo.get('latitude'), geo.get('longitude'), loc_type))
+    weather_df = build_weather_frame(locations, None, None, departure_date, days=days)
+    # A code can be a hub on one route and a destination on another; hubs win
+    weather_df["LOCATION_TYPE"] = weather_df["IATA_CODE"].map(
+        lambda code: "Origin" if code in origin_codes else "Destination" if code in destination_codes else "Stopover"
+    )
+    weather_df = fill_missing_weather(weather_df, departure_date, {loc[0] for loc in locations},
+                                      days=days)[WEATHER_COLUMNS]
+
+    if output_format == "parquet":
+        flights_df = apply_schema(flights_df, FLIGHT_SCHEMA)
+        weather_df = apply_schema(weather_df, WEATHER_SCHEMA)
+    return flights_df, weather_df, sorted(task_results, key=lambda result: result[:3])
@@ -0,0 +1,216 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# The profile of the run in progress. Worker threads see it through propagate(), so a Streamlit session
+# and the executors it fans out to all report into the same profile.
+_current_profile = contextvars.ContextVar("flightsight_profile", default=None)
+
+def _empty_stage():
+    return {"calls": 0, "errors": 0, "seconds": 0.0, "payload_bytes": 0}
+
+def _empty_cache():
+    return {"hits": 0, "misses": 0}
+
+class MetricsRecorder:
+    def __init__(self):
+        self.stages = {}
+        self.caches = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, stage, seconds, error=False):
+        with self._lock:
+            totals = self.stages.get(stage) or self.stages.setdefault(stage, _empty_stage())
+            totals["calls"] += 1
+            totals["errors"] += int(error)
+            totals["seconds"] += seconds
+
+    def record_payload(self, stage, payload_bytes):
+        with self._lock:
+            self.stages.setdefault(stage, _empty_stage())["payload_bytes"] += payload_bytes
+
+    def record_cache(self, cache, hits=0, misses=0):
+        with self._lock:
+            totals = self.caches.get(cache) or self.caches.setdefault(cache, _empty_cache())
+            totals["hits"] += hits
+            totals["misses"] += misses
+
+    def merge(self, snapshot):
+        with self._lock:
+            for stage, values in snapshot.get("stages", {}).items():
+                totals = self.stages.setdefault(stage, _empty_stage())
+                for field in totals:
+                    totals[field] += values.get(field, 0)
+            for cache, values in snapshot.get("caches", {}).items():
+                totals = self.caches.setdefault(cache, _empty_cache())
+                for field in totals:
+                    totals[field] += values.get(field, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {stage: dict(values) for stage, values in self.stages.items()},
+                "caches": {
+                    cache: dict(values, hit_rate=values["hits"] / (values["hits"] + values["misses"])
+                                if values["hits"] + values["misses"] else 0.0)
+                    for cache, values in self.caches.items()
+                }
+            }
+
+class RunProfile(MetricsRecorder):
+    def __init__(self, name, labels=None):
+        super().__init__()
+        self.name = name
+        self.labels = labels or {}
+        self.started_at = datetime.now(timezone.utc)
+        self.elapsed = None
+
+    def as_dict(self):
+        return {
+            "run": self.name,
+            "labels": self.labels,
+            "started_at": self.started_at.isoformat(),
+            "elapsed_seconds": self.elapsed,
+            **self.snapshot()
+        }
+
+# Process-wide totals since start-up, exported in Prometheus text format
+REGISTRY = MetricsRecorder()
+_runs = {"count": 0, "seconds": 0.0}
+_runs_lock = threading.Lock()
+
+def _recorders():
+    profile = _current_profile.get()
+    return (REGISTRY, profile) if profile is not None else (REGISTRY,)
+
+def record_call(stage, seconds, error=False):
+    for recorder in _recorders():
+        recorder.record_call(stage, seconds, error)
+
+def record_payload(stage, payload_bytes):
+    for recorder in _recorders():
+        recorder.record_payload(stage, payload_bytes)
+
+def record_cache(cache, hits=0, misses=0):
+    for recorder in _recorders():
+        recorder.record_cache(cache, hits, misses)
+
+def instrumented(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        error = True
+        try:
+            result = func(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            record_call(func.__name__, time.perf_counter() - start, error)
+    return wrapper
+
+def propagate(func):
+    # Executor threads don't inherit context variables; carry the caller's over so they report to its profile
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+@contextmanager
+def profile_run(name, **labels):
+    profile = RunProfile(name, labels)
+    token = _current_profile.set(profile)
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.elapsed = time.perf_counter() - start
+        _current_profile.reset(token)
+        with _runs_lock:
+            _runs["count"] += 1
+            _runs["seconds"] += profile.elapsed
+        log_profile(profile)
+
+def log_profile(profile):
+    logger.info(json.dumps(profile.as_dict() if isinstance(profile, RunProfile) else profile, sort_keys=True))
+
+def merge_run(profile_dict):
+    # Folds in a profile recorded in another process (e.g. a batch worker)
+    REGISTRY.merge(profile_dict)
+    with _runs_lock:
+        _runs["count"] += 1
+        _runs["seconds"] += profile_dict.get("elapsed_seconds") or 0.0
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def prometheus_snapshot():
+    snapshot = REGISTRY.snapshot()
+    with _runs_lock:
+        runs = dict(_runs)
+    lines = [
+        "# HELP flightsight_runs_total Pipeline runs completed.",
+        "# TYPE flightsight_runs_total counter",
+        f"flightsight_runs_total {runs['count']}",
+        "# HELP flightsight_run_seconds_total Wall time spent in pipeline runs.",
+        "# TYPE flightsight_run_seconds_total counter",
+        f"flightsight_run_seconds_total {runs['seconds']:.6f}"
+    ]
+    stage_metrics = (
+        ("calls", "flightsight_stage_calls_total", "Calls per instrumented function."),
+        ("errors", "flightsight_stage_errors_total", "Calls that raised, per instrumented function."),
+        ("seconds", "flightsight_stage_seconds_total", "Time spent per instrumented function, summed over threads."),
+        ("payload_bytes", "flightsight_stage_payload_bytes_total", "Bytes received or written per function.")
+    )
+    for field, metric, help_text in stage_metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for stage, values in sorted(snapshot["stages"].items()):
+            value = f"{values[field]:.6f}" if field == "seconds" else values[field]
+            lines.append(f'{metric}{{stage="{_escape_label(stage)}"}} {value}')
+    for field in ("hits", "misses"):
+        metric = f"flightsight_cache_{field}_total"
+        lines.append(f"# HELP {metric} Cache {field} per cache.")
+        lines.append(f"# TYPE {metric} counter")
+        for cache, values in sorted(snapshot["caches"].items()):
+            lines.append(f'{metric}{{cache="{_escape_label(cache)}"}} {values[field]}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus_snapshot(path):
+    # Written whole and swapped in, so a node_exporter textfile collector never reads a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prometheus_snapshot())
+    os.replace(tmp_path, path)
+
+def start_metrics_server(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_snapshot().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="flightsight-metrics", daemon=True).start()
+    logger.info(f"Serving Prometheus metrics on :{port}/metrics")
+    return server
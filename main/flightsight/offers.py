@@ -0,0 +1,195 @@
+import itertools
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import pandas as pd
+
+from .clients import get_amadeus_client, get_amadeus_scheduler, get_distance_table
+from .config import FORECAST_DAYS, MAX_CONCURRENT_SEARCHES, MAX_OFFERS
+from .fill import generate_ids
+from .metrics import instrumented, propagate, record_payload
+from .reference import get_aircraft_name, get_airline_name, get_airport_info
+from .schema import FLIGHT_COLUMNS, SYNTHESIZED_COLUMN
+
+logger = logging.getLogger(__name__)
+
+@instrumented
+def search_flight_offers(origin_iata, destination_iata, current_date, max_offers=MAX_OFFERS):
+    from amadeus import ResponseError
+    try:
+        departure_date = current_date.strftime("%Y-%m-%d")
+        response = get_amadeus_scheduler().call(
+            ("flight_offers", origin_iata, destination_iata, departure_date, max_offers),
+            lambda: get_amadeus_client().shopping.flight_offers_search.get(
+                originLocationCode=origin_iata,
+                destinationLocationCode=destination_iata,
+                departureDate=departure_date,
+                adults=1,
+                max=max_offers
+            )
+        )
+        record_payload("search_flight_offers", len(getattr(response, "body", None) or ""))
+        return current_date, response.data, None
+    except ResponseError as e:
+        logger.error(f"Flight search error for {current_date}: {str(e)}")
+        return current_date, None, e
+
+def iter_flight_offers(origin_iata, destination_iata, start_date, days=FORECAST_DAYS,
+                       max_workers=MAX_CONCURRENT_SEARCHES, dates=None, max_offers=MAX_OFFERS, ordered=False):
+    # Yields each day's (date, offers, error) as soon as its search returns, or in date order if ordered.
+    # Only max_workers days are searched or waiting to be consumed at any time, so a long horizon never
+    # holds more than that many days of offers in memory.
+    # Build the shared client before fanning out so the workers don't race on the first token request
+    get_amadeus_client()
+    if dates is None:
+        dates = [start_date + timedelta(days=day_offset) for day_offset in range(days)]
+    search = propagate(search_flight_offers)
+    window = max(1, min(max_workers, len(dates)))
+    remaining = iter(dates)
+    with ThreadPoolExecutor(max_workers=window) as executor:
+        pending = deque(executor.submit(search, origin_iata, destination_iata, current_date, max_offers)
+                        for current_date in itertools.islice(remaining, window))
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                future = next(iter(wait(pending, return_when=FIRST_COMPLETED)[0]))
+                pending.remove(future)
+            result = future.result()
+            next_date = next(remaining, None)
+            if next_date is not None:
+                pending.append(executor.submit(search, origin_iata, destination_iata, next_date, max_offers))
+            yield result
+
+def fetch_flight_offers(origin_iata, destination_iata, start_date, days=FORECAST_DAYS,
+                        max_workers=MAX_CONCURRENT_SEARCHES, dates=None, max_offers=MAX_OFFERS):
+    return list(iter_flight_offers(origin_iata, destination_iata, start_date, days=days, max_workers=max_workers,
+                                   dates=dates, max_offers=max_offers, ordered=True))
+
+@instrumented
+def flatten_offers(day_offers, airport_lookup=get_airport_info, airline_lookup=get_airline_name,
+                   distance_table=None):
+    columns = {col: [] for col in FLIGHT_COLUMNS}
+    segment_coords = {"dep_lat": [], "dep_lon": [], "arr_lat": [], "arr_lon": []}
+    locations = set()
+    last_cabin_info = {}
+    # Resolve each airport/airline/aircraft once per batch; the shared cache (and its metrics) only sees distinct codes
+    airports = {}
+    airline_names = {}
+    aircraft_names = {}
+
+    for current_date, offers in day_offers:
+        date_str = current_date.strftime("%Y-%m-%d")
+        trip_ids = generate_ids(len(offers))
+
+        for trip_id, offer in zip(trip_ids, offers):
+            last_ticketing_date = offer.get('lastTicketingDate', '')
+            bookable_seats = str(offer.get('numberOfBookableSeats', ''))
+            base_price = offer['price']['base']
+            total_price = offer['price']['grandTotal']
+            currency = offer['price'].get('currency', '')
+
+            # Index fare details once per offer instead of scanning them for every segment
+            fare_details = {}
+            for tp in offer.get('travelerPricings', []):
+                for fds in tp.get('fareDetailsBySegment', []):
+                    fare_details[fds.get('segmentId')] = fds
+
+            for itinerary in offer['itineraries']:
+                segments = itinerary['segments']
+                stops = str(len(segments) - 1)
+
+                for segment in segments:
+                    dep_airport = segment['departure']['iataCode']
+                    arr_airport = segment['arrival']['iataCode']
+                    dep_info = airports.get(dep_airport)
+                    if dep_info is None:
+                        dep_info = airports[dep_airport] = airport_lookup(dep_airport) or {}
+                    arr_info = airports.get(arr_airport)
+                    if arr_info is None:
+                        arr_info = airports[arr_airport] = airport_lookup(arr_airport) or {}
+                    dep_geo = dep_info.get('geoCode', {})
+                    arr_geo = arr_info.get('geoCode', {})
+
+                    segment_coords["dep_lat"].append(dep_geo.get('latitude'))
+                    segment_coords["dep_lon"].append(dep_geo.get('longitude'))
+                    segment_coords["arr_lat"].append(arr_geo.get('latitude'))
+                    segment_coords["arr_lon"].append(arr_geo.get('longitude'))
+
+                    cabin_key = f"{segment['carrierCode']}-{date_str}"
+                    fare_basis = ''
+                    fare_conditions = ''
+                    cabin = segment.get('co2Emissions', [{}])[0].get('cabin', '') or segment.get('cabin', '')
+                    booking_class = segment.get('class', '')
+
+                    fds = fare_details.get(segment['id'])
+                    if fds is not None:
+                        fare_basis = fds.get('fareBasis', '')
+                        fare_conditions = fds.get('cabin', cabin)
+                        cabin = fds.get('cabin', cabin)
+                        booking_class = fds.get('class', booking_class)
+
+                    if not cabin and cabin_key in last_cabin_info:
+                        cabin = last_cabin_info[cabin_key].get('cabin', '')
+                        booking_class = last_cabin_info[cabin_key].get('booking_class', '')
+                        fare_conditions = last_cabin_info[cabin_key].get('fare_conditions', '')
+
+                    if cabin:
+                        last_cabin_info[cabin_key] = {
+                            'cabin': cabin,
+                            'booking_class': booking_class,
+                            'fare_conditions': fare_conditions
+                        }
+
+                    operating_carrier = segment.get('operating', {}).get('carrierCode', segment['carrierCode'])
+                    if operating_carrier not in airline_names:
+                        airline_names[operating_carrier] = airline_lookup(operating_carrier)
+                    columns["TRIP_ID"].append(trip_id)
+                    columns["FLIGHT_TYPE"].append("One-way")
+                    columns["FLIGHT_NO"].append(f"{segment['carrierCode']}{segment['number']}")
+                    columns["CARRIER"].append(segment['carrierCode'])
+                    columns["OPERATING_AIRLINE"].append(operating_carrier)
+                    columns["OPERATING_AIRLINE_NAME"].append(airline_names[operating_carrier])
+                    columns["ORIGIN"].append(dep_airport)
+                    columns["DESTINATION"].append(arr_airport)
+                    columns["ORIGIN_CITY_NAME"].append(dep_info.get('address', {}).get('cityName') or dep_airport)
+                    columns["DESTINATION_CITY_NAME"].append(arr_info.get('address', {}).get('cityName') or arr_airport)
+                    columns["AIRPORT_NAME_ORIGIN"].append(dep_info.get('name', dep_airport))
+                    columns["AIRPORT_NAME_DESTINATION"].append(arr_info.get('name', arr_airport))
+                    columns["DEPARTURE"].append(segment['departure']['at'])
+                    columns["ARRIVAL"].append(segment['arrival']['at'])
+                    columns["DURATION"].append(segment['duration'])
+                    columns["STOPS"].append(stops)
+                    aircraft_code = segment['aircraft']['code']
+                    if aircraft_code not in aircraft_names:
+                        aircraft_names[aircraft_code] = get_aircraft_name(aircraft_code)
+                    columns["AIRCRAFT_CODE"].append(aircraft_code)
+                    columns["AIRCRAFT_NAME"].append(aircraft_names[aircraft_code])
+                    columns["CABIN"].append(cabin)
+                    columns["BOOKING_CLASS"].append(booking_class)
+                    columns["FARE_CONDITIONS"].append(fare_conditions)
+                    columns["CHECKED_BAGS"].append(bookable_seats)
+                    columns["BASE_PRICE"].append(base_price)
+                    columns["TOTAL_PRICE"].append(total_price)
+                    columns["CURRENCY"].append(currency)
+                    columns["LAST_TICKETING_DATE"].append(last_ticketing_date)
+                    columns["SEGMENT_CABIN_TYPE"].append(cabin)
+                    columns["SOURCE"].append("Amadeus API")
+                    columns["FARE_BASIS"].append(fare_basis)
+                    columns["DEPARTURE_DATE"].append(date_str)
+                    columns[SYNTHESIZED_COLUMN].append(False)
+
+                    locations.add((dep_airport, dep_geo.get('latitude', None), dep_geo.get('longitude', None), "Stopover"))
+                    locations.add((arr_airport, arr_geo.get('latitude', None), arr_geo.get('longitude', None), "Stopover"))
+
+    # Distances for every segment in one vectorized pass; the pair table solves each airport pair once per
+    # process and also covers segments whose airport lookup came back without coordinates
+    distance_table = distance_table or get_distance_table()
+    columns["FLIGHT_DISTANCE_KM"] = distance_table.lookup(
+        columns["ORIGIN"], columns["DESTINATION"],
+        segment_coords["dep_lat"], segment_coords["dep_lon"], segment_coords["arr_lat"], segment_coords["arr_lon"]
+    )
+
+    return pd.DataFrame(columns, columns=FLIGHT_COLUMNS), locations
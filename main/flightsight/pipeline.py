@@ -0,0 +1,124 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .config import FORECAST_DAYS, MAX_OFFERS, OUTPUT_FORMAT, S3_COMPRESSION, STREAM_CHUNK_ROWS
+from .fill import copy_day, fill_missing_flights, fill_missing_weather
+from .history import append_history
+from .metrics import instrumented, propagate
+from .offers import flatten_offers, iter_flight_offers
+from .schema import FLIGHT_COLUMNS, FLIGHT_SCHEMA, WEATHER_COLUMNS, WEATHER_SCHEMA, apply_schema
+from .storage import PartWriter
+from .trends import record_trends
+from .weather import build_weather_frame
+
+logger = logging.getLogger(__name__)
+
+def stream_search(origin, destination, departure_date, days=FORECAST_DAYS, output_format=OUTPUT_FORMAT, dates=None,
+                  max_offers=MAX_OFFERS):
+    # Yields ("day", (date, offers, error, day_df)) as each day's search lands, then ("flights", flights_df)
+    # once every day is in and gaps are filled, then ("weather", weather_df). Weather is built in the
+    # background from the moment the flights are known, so callers can show or upload flights meanwhile.
+    # dates limits the offer searches to some of the days; the rest of the range is filled as usual.
+    day_frames = {}
+    flight_locations = set()
+    for current_date, flights, search_error in iter_flight_offers(origin['iata'], destination['iata'], departure_date,
+                                                                  days=days, dates=dates, max_offers=max_offers):
+        if search_error is None and not flights:
+            logger.warning(f"No flights found for {current_date.strftime('%Y-%m-%d')}")
+        day_df = None
+        if flights:
+            day_df, day_locations = flatten_offers([(current_date, flights)])
+            day_frames[current_date] = day_df
+            flight_locations.update(day_locations)
+        yield "day", (current_date, flights, search_error, day_df)
+
+    if day_frames:
+        flights_df = pd.concat([day_frames[current_date] for current_date in sorted(day_frames)], ignore_index=True)
+    else:
+        flights_df = flatten_offers([])[0]
+    flights_df = fill_missing_flights(flights_df, departure_date, days=days)
+
+    unique_locations = {
+        (origin['iata'], origin.get('latitude'), origin.get('longitude'), "Origin"),
+        (destination['iata'], destination.get('latitude'), destination.get('longitude'), "Destination")
+    }
+    unique_locations.update(flight_locations)
+
+    def weather_frame():
+        weather_df = build_weather_frame(unique_locations, origin['iata'], destination['iata'], departure_date,
+                                         days=days)
+        weather_df = fill_missing_weather(weather_df, departure_date, {loc[0] for loc in unique_locations},
+                                          days=days)[WEATHER_COLUMNS]
+        return apply_schema(weather_df, WEATHER_SCHEMA) if output_format == "parquet" else weather_df
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        weather_future = executor.submit(propagate(weather_frame))
+        flights_df = flights_df[FLIGHT_COLUMNS]
+        yield "flights", apply_schema(flights_df, FLIGHT_SCHEMA) if output_format == "parquet" else flights_df
+        weather_df = weather_future.result()
+    yield "weather", weather_df
+
+@instrumented
+def run_search(origin, destination, departure_date, days=FORECAST_DAYS, output_format=OUTPUT_FORMAT, dates=None,
+               max_offers=MAX_OFFERS):
+    day_results = []
+    for kind, payload in stream_search(origin, destination, departure_date, days=days, output_format=output_format,
+                                       dates=dates, max_offers=max_offers):
+        if kind == "day":
+            day_results.append(payload[:3])
+        elif kind == "flights":
+            flights_df = payload
+        else:
+            weather_df = payload
+    return flights_df, weather_df, sorted(day_results, key=lambda result: result[0])
+
+@instrumented
+def ingest_route(origin, destination, departure_date, days=FORECAST_DAYS, partition=None, output_dir=None,
+                 max_offers=MAX_OFFERS, chunk_rows=STREAM_CHUNK_ROWS, compression=S3_COMPRESSION,
+                 output_format=OUTPUT_FORMAT, trends=None, history=None):
+    # Bounded-memory variant of run_search + save_datasets for large offer counts and long horizons: days are
+    # taken in date order, flattened one at a time and streamed into part files, so memory holds a few days of
+    # offers, the last real day (to fill the days after it) and one part per table, whatever the horizon.
+    # Returns the written parts (without their data) and each day's (date, offer count, error).
+    day_results = []
+    snapshot_at = time.time()
+    unique_locations = {
+        (origin['iata'], origin.get('latitude'), origin.get('longitude'), "Origin"),
+        (destination['iata'], destination.get('latitude'), destination.get('longitude'), "Destination")
+    }
+    last_day = None
+    with PartWriter("flights.csv", partition, chunk_rows, compression, output_format, output_dir) as flights_writer:
+        for current_date, flights, search_error in iter_flight_offers(origin['iata'], destination['iata'],
+                                                                      departure_date, days=days,
+                                                                      max_offers=max_offers, ordered=True):
+            day_results.append((current_date, len(flights or ()), search_error))
+            if search_error is None and not flights:
+                logger.warning(f"No flights found for {current_date.strftime('%Y-%m-%d')}")
+            if flights:
+                last_day, day_locations = flatten_offers([(current_date, flights)])
+                unique_locations.update(day_locations)
+                flights_writer.write(last_day)
+                # Fare trends and the run history take each day as it comes; neither needs the whole run at once
+                record_trends(trends, last_day, snapshot_at)
+                append_history(history, last_day, snapshot_at)
+            elif last_day is not None:
+                # Same forward fill as fill_missing_flights, one day at a time
+                flights_writer.write(copy_day(last_day, current_date))
+                logger.info(f"Reused {len(last_day)} rows to fill missing date {current_date.strftime('%Y-%m-%d')}")
+            else:
+                logger.warning(f"No data available to fill TRIP_ID rows for {current_date.strftime('%Y-%m-%d')}")
+
+    # Weather is one row per location and day, so it is small enough to build whole
+    weather_df = build_weather_frame(unique_locations, origin['iata'], destination['iata'], departure_date, days=days)
+    weather_df = fill_missing_weather(weather_df, departure_date, {loc[0] for loc in unique_locations},
+                                      days=days)[WEATHER_COLUMNS]
+    with PartWriter("weather.csv", partition, chunk_rows, compression, output_format, output_dir) as weather_writer:
+        weather_writer.write(weather_df)
+    return flights_writer.results + weather_writer.results, day_results
+
+def search_result_size(*frames):
+    # Deep memory footprint, used to keep the cache of whole search results under its byte budget
+    return int(sum(frame.memory_usage(index=True, deep=True).sum() for frame in frames))
@@ -0,0 +1,124 @@
+import logging
+import math
+
+from .clients import get_amadeus_client, get_amadeus_scheduler, get_reference_cache, get_reference_index
+from .distance import distance_km
+from .metrics import instrumented, record_cache
+
+logger = logging.getLogger(__name__)
+
+@instrumented
+def fetch_airport_info(iata_code):
+    response = get_amadeus_scheduler().call(
+        ("airport", iata_code),
+        lambda: get_amadeus_client().reference_data.locations.get(keyword=iata_code, subType="AIRPORT")
+    )
+    return response.data[0] if response.data else None
+
+def index_lookup(lookup, key):
+    # The bundled index answers first; a miss (or no index) falls through to the cache and the API
+    index = get_reference_index()
+    value = getattr(index, lookup)(key) if index is not None else None
+    record_cache("reference_index", hits=int(bool(value)), misses=int(not value))
+    return value
+
+def get_airport_info(iata_code):
+    airport = index_lookup("airport", iata_code)
+    if airport:
+        return airport
+    try:
+        return get_reference_cache().get_or_load(f"airport:{iata_code}", lambda: fetch_airport_info(iata_code))
+    except Exception as e:
+        logger.error(f"Airport info error for {iata_code}: {str(e)}")
+        return None
+
+@instrumented
+def fetch_airline_name(carrier_code):
+    response = get_amadeus_scheduler().call(
+        ("airline", carrier_code),
+        lambda: get_amadeus_client().reference_data.airlines.get(airlineCodes=carrier_code)
+    )
+    # Only a code the API doesn't know (no data) is negative-cached; a known airline without a business name is
+    # listed under its common name, or its code
+    if not response.data:
+        return None
+    airline = response.data[0]
+    return airline.get("businessName") or airline.get("commonName") or carrier_code
+
+def get_airline_name(carrier_code):
+    airline_name = index_lookup("airline_name", carrier_code)
+    if airline_name:
+        return airline_name
+    try:
+        airline_name = get_reference_cache().get_or_load(f"airline:{carrier_code}", lambda: fetch_airline_name(carrier_code))
+        return airline_name or carrier_code
+    except Exception as e:
+        logger.error(f"Airline name error for {carrier_code}: {str(e)}")
+        return carrier_code
+
+AIRCRAFT_NAMES = {
+    "320": "Airbus A320",
+    "73H": "Boeing 737-800",
+    "333": "Airbus A330-300",
+    "77W": "Boeing 777-300ER",
+    "388": "Airbus A380",
+    "739": "Boeing 737-900",
+    "321": "Airbus A321",
+    "788": "Boeing 787-8 Dreamliner",
+    "E75": "Embraer 175",
+    "CR9": "Bombardier CRJ-900"
+}
+
+def get_aircraft_name(aircraft_code):
+    return (index_lookup("aircraft_name", aircraft_code) or AIRCRAFT_NAMES.get(aircraft_code)
+            or f"Unknown Aircraft ({aircraft_code})")
+
+@instrumented
+def calculate_distance(origin, destination):
+    try:
+        distance = float(distance_km(origin['latitude'], origin['longitude'],
+                                     destination['latitude'], destination['longitude']))
+    except Exception as e:
+        logger.error(f"Distance calculation error: {str(e)}")
+        return None
+    return None if math.isnan(distance) else distance
+
+@instrumented
+def search_locations(query, limit=10, on_error=None):
+    from amadeus import ResponseError
+    # The index (airports and their cities) answers any prefix it knows without a network round-trip; the API is
+    # only asked on a miss, and close spellings from the index are guesses that follow its results
+    locations = index_lookup("search", query)
+    if locations:
+        return locations[:limit]
+    index = get_reference_index()
+    suggestions = index.suggest(query, limit) if index is not None else []
+    try:
+        response = get_amadeus_scheduler().call(
+            ("locations", query),
+            lambda: get_amadeus_client().reference_data.locations.get(
+                keyword=query,
+                subType="CITY,AIRPORT",
+                page={'limit': limit}
+            )
+        )
+        locations = [
+            {
+                "name": loc.get("name", ""),
+                "iata": loc.get("iataCode", ""),
+                "city": loc.get("address", {}).get("cityName", ""),
+                "country": loc.get("address", {}).get("countryName", ""),
+                "latitude": loc.get("geoCode", {}).get("latitude"),
+                "longitude": loc.get("geoCode", {}).get("longitude"),
+                "type": loc.get("subType", "")
+            }
+            for loc in response.data
+            if loc.get("iataCode")
+        ]
+    except ResponseError as e:
+        logger.error(f"Location search error: {str(e)}")
+        if on_error is not None:
+            on_error(f"Location search error: {str(e)}")
+        locations = []
+    found = {loc["iata"] for loc in locations}
+    return (locations + [loc for loc in suggestions if loc["iata"] not in found])[:limit]
@@ -0,0 +1,325 @@
+import argparse
+import csv
+import difflib
+import logging
+import os
+import threading
+import unicodedata
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Words too common in airport names to be worth a search key of their own
+NAME_STOP_WORDS = {"airport", "international", "intl", "regional", "airfield", "the", "and", "de", "del", "la"}
+
+# Key kinds, in the order matches are ranked: IATA code, then city, then airport name
+KEY_IATA, KEY_CITY, KEY_NAME = 0, 1, 2
+
+# Close-spelling suggestions only compare whole city and airport names at least this long: codes and short words
+# are a letter or two away from too many queries ("Malta" from MAA, "Bari" from the "Bai" of Noi Bai)
+SUGGEST_MIN_LENGTH = 4
+SUGGEST_CUTOFF = 0.75
+
+# Metropolitan-area codes for cities served by several airports, as Amadeus returns them for a CITY location.
+# A city missing here is listed under its first airport's code.
+METRO_CODES = {
+    ("bangkok", "Thailand"): "BKK", ("beijing", "China"): "BJS", ("dubai", "United Arab Emirates"): "DXB",
+    ("istanbul", "Turkey"): "IST", ("london", "United Kingdom"): "LON", ("milan", "Italy"): "MIL",
+    ("moscow", "Russia"): "MOW", ("new york", "United States"): "NYC", ("osaka", "Japan"): "OSA",
+    ("paris", "France"): "PAR", ("rome", "Italy"): "ROM", ("sao paulo", "Brazil"): "SAO",
+    ("seoul", "South Korea"): "SEL", ("shanghai", "China"): "SHA", ("stockholm", "Sweden"): "STO",
+    ("tokyo", "Japan"): "TYO", ("washington", "United States"): "WAS", ("chicago", "United States"): "CHI",
+    ("toronto", "Canada"): "YTO", ("montreal", "Canada"): "YMQ", ("buenos aires", "Argentina"): "BUE",
+    ("rio de janeiro", "Brazil"): "RIO", ("jakarta", "Indonesia"): "JKT", ("berlin", "Germany"): "BER"
+}
+
+def normalize(text):
+    # ASCII-folded, lower-case, alphanumerics and single spaces only, so "Zürich" and "zurich" share a key
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in text).split())
+
+def _text(value):
+    return value.decode("utf-8", "ignore")
+
+class ReferenceIndex:
+    # Airports, airlines and aircraft types as sorted fixed-width NumPy arrays, one .npy file each, memory-mapped
+    # on first use: opening the index costs nothing, and every lookup is a binary search over the mapped pages.
+    #   airports.npy      iata, name, city, country, latitude, longitude   (sorted by iata)
+    #   airport_keys.npy  key, row, kind                                   (sorted by key; row indexes airports)
+    #   airlines.npy      code, name                                       (sorted by code)
+    #   aircraft.npy      code, name                                       (sorted by code)
+    #   cities.npy        key, code, name, country, airports, latitude, longitude
+    #                     (sorted by key, "<city>\x1f<country>" as in airports.npy; multi-airport cities only)
+
+    def __init__(self, path):
+        self.path = path
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def _array(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            with self._lock:
+                array = self._arrays.get(name)
+                if array is None:
+                    file_path = os.path.join(self.path, f"{name}.npy")
+                    array = np.load(file_path, mmap_mode="r") if os.path.exists(file_path) else np.empty(0)
+                    self._arrays[name] = array
+        return array
+
+    def _find(self, name, field, code):
+        array = self._array(name)
+        if not len(array) or not code:
+            return None
+        column = array[field]
+        code = code.upper().encode("ascii", "ignore")
+        position = int(np.searchsorted(column, code))
+        return array[position] if position < len(array) and column[position] == code else None
+
+    def airport(self, iata_code):
+        # Same shape as an Amadeus reference_data/locations airport, so callers can't tell the two apart
+        row = self._find("airports", "iata", iata_code)
+        if row is None:
+            return None
+        return {
+            "type": "location",
+            "subType": "AIRPORT",
+            "iataCode": _text(row["iata"]),
+            "name": _text(row["name"]),
+            "address": {"cityName": _text(row["city"]), "countryName": _text(row["country"])},
+            "geoCode": {"latitude": float(row["latitude"]), "longitude": float(row["longitude"])}
+        }
+
+    def airline_name(self, carrier_code):
+        row = self._find("airlines", "code", carrier_code)
+        return None if row is None else _text(row["name"])
+
+    def aircraft_name(self, aircraft_code):
+        row = self._find("aircraft", "code", aircraft_code)
+        return None if row is None else _text(row["name"])
+
+    def _city(self, airport):
+        # The CITY record grouping this airport with the city's other airports, if it has any
+        cities = self._array("cities")
+        if not len(cities):
+            return None
+        key = airport["city"] + b"\x1f" + airport["country"]
+        position = int(np.searchsorted(cities["key"], key))
+        return cities[position] if position < len(cities) and cities["key"][position] == key else None
+
+    def _locations(self, matches, needle, limit):
+        # Exact keys first, then by kind (code, city, name), then shorter keys. A city match is listed as the
+        # city (when it has several airports) ahead of its airports, the way the Amadeus locations API does; a
+        # code already listed (a city named after its main airport, like SHA) is not listed again.
+        order = np.lexsort((np.char.str_len(matches["key"]), matches["kind"], matches["key"] != needle))
+        airports = self._array("airports")
+        results, seen, codes = [], set(), set()
+        for i in order:
+            row_index = int(matches["row"][i])
+            if row_index in seen:
+                continue
+            seen.add(row_index)
+            row = airports[row_index]
+            city = self._city(row) if matches["kind"][i] == KEY_CITY else None
+            if city is not None and city["code"] not in codes:
+                codes.add(city["code"])
+                results.append({
+                    "name": _text(city["name"]),
+                    "iata": _text(city["code"]),
+                    "city": _text(city["name"]),
+                    "country": _text(city["country"]),
+                    "latitude": float(city["latitude"]),
+                    "longitude": float(city["longitude"]),
+                    "type": "CITY"
+                })
+                if len(results) >= limit:
+                    break
+            if row["iata"] in codes:
+                continue
+            codes.add(row["iata"])
+            results.append({
+                "name": _text(row["name"]),
+                "iata": _text(row["iata"]),
+                "city": _text(row["city"]),
+                "country": _text(row["country"]),
+                "latitude": float(row["latitude"]),
+                "longitude": float(row["longitude"]),
+                "type": "AIRPORT"
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def search(self, query, limit=10):
+        # Prefix match on IATA code, city or any significant word of the airport name
+        query = normalize(query)
+        keys = self._array("airport_keys")
+        if not query or not len(keys):
+            return []
+        needle = query.encode("ascii")
+        lo = int(np.searchsorted(keys["key"], needle, side="left"))
+        hi = int(np.searchsorted(keys["key"], needle + b"\xff", side="left"))
+        return self._locations(keys[lo:hi], needle, limit)
+
+    def suggest(self, query, limit=10):
+        # Close spellings ("hyderbad") of a whole city or airport name sharing the query's first letter. These are
+        # guesses, not matches: search_locations only uses them alongside the API's answer.
+        query = normalize(query)
+        keys = self._array("airport_keys")
+        if len(query) < SUGGEST_MIN_LENGTH or not len(keys):
+            return []
+        needle = query.encode("ascii")
+        lo = int(np.searchsorted(keys["key"], needle[:1], side="left"))
+        hi = int(np.searchsorted(keys["key"], needle[:1] + b"\xff", side="left"))
+        candidates = keys[lo:hi]
+        # Length bucket: difflib's ratio is 2*M/(a+b) with M <= min(a, b), so a key whose length is too far from
+        # the query's can never reach the cutoff and is dropped here rather than compared in Python
+        lengths = np.char.str_len(candidates["key"])
+        candidates = candidates[(candidates["kind"] != KEY_IATA) & (lengths >= SUGGEST_MIN_LENGTH) &
+                                (2 * np.minimum(lengths, len(needle)) >= SUGGEST_CUTOFF * (lengths + len(needle)))]
+        if not len(candidates):
+            return []
+        airports = self._array("airports")
+        # Word keys are dropped: only a key that is its row's entire city or airport name is compared
+        whole = [normalize(_text(airports[int(row)]["city" if kind == KEY_CITY else "name"])) == _text(key)
+                 for key, row, kind in zip(candidates["key"], candidates["row"], candidates["kind"])]
+        candidates = candidates[np.array(whole, dtype=bool)]
+        close = difflib.get_close_matches(query, sorted({_text(key) for key in candidates["key"]}),
+                                          n=limit, cutoff=SUGGEST_CUTOFF)
+        matches = candidates[np.isin(candidates["key"], [key.encode("ascii") for key in close])]
+        return self._locations(matches, needle, limit) if len(matches) else []
+
+def _fixed_width(records, fields):
+    # Byte-string columns sized to their longest value, so nothing is truncated and nothing is wasted
+    dtype = []
+    for name, kind in fields:
+        if kind == "S":
+            width = max((len(record[name]) for record in records), default=1)
+            dtype.append((name, f"S{max(width, 1)}"))
+        else:
+            dtype.append((name, kind))
+    return np.array([tuple(record[name] for name, _ in fields) for record in records], dtype=dtype)
+
+def _openflights_rows(path):
+    # OpenFlights .dat files: headerless CSV with \N for missing values
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            yield [None if value == "\\N" else value for value in row]
+
+def write_airports(output_dir, records):
+    # airports.npy, its search keys and the multi-airport cities, from airport records sorted by IATA code
+    np.save(os.path.join(output_dir, "airports.npy"), _fixed_width(records, [
+        ("iata", "S"), ("name", "S"), ("city", "S"), ("country", "S"), ("latitude", "f8"), ("longitude", "f8")
+    ]))
+
+    keys, cities = set(), {}
+    for row_index, record in enumerate(records):
+        city = normalize(_text(record["city"]))
+        name = normalize(_text(record["name"]))
+        keys.add((record["iata"].lower(), row_index, KEY_IATA))
+        for key, kind in ((city, KEY_CITY), (name, KEY_NAME)):
+            if key:
+                keys.add((key.encode("ascii"), row_index, kind))
+        for word in set(city.split()) | set(name.split()):
+            if len(word) >= 3 and word not in NAME_STOP_WORDS:
+                keys.add((word.encode("ascii"), row_index, KEY_CITY if word in city.split() else KEY_NAME))
+        if city:
+            cities.setdefault((record["city"], record["country"]), []).append(row_index)
+
+    city_records = []
+    for (city, country), rows in sorted(cities.items()):
+        if len(rows) < 2:
+            continue
+        codes = [records[row]["iata"] for row in rows]
+        code = METRO_CODES.get((normalize(_text(city)), _text(country)))
+        code = code.encode("ascii") if code else codes[0]
+        if code not in codes:
+            # A metro code of its own (PAR, LON) is a search key too, pointing at the city's first airport
+            keys.add((code.lower(), rows[0], KEY_CITY))
+        city_records.append({
+            "key": city + b"\x1f" + country, "code": code, "name": city, "country": country,
+            "airports": b" ".join(codes),
+            "latitude": float(np.mean([records[row]["latitude"] for row in rows])),
+            "longitude": float(np.mean([records[row]["longitude"] for row in rows]))
+        })
+    np.save(os.path.join(output_dir, "cities.npy"), _fixed_width(city_records, [
+        ("key", "S"), ("code", "S"), ("name", "S"), ("country", "S"), ("airports", "S"), ("latitude", "f8"),
+        ("longitude", "f8")
+    ]))
+
+    key_records = [{"key": key, "row": row_index, "kind": kind} for key, row_index, kind in sorted(keys)]
+    np.save(os.path.join(output_dir, "airport_keys.npy"),
+            _fixed_width(key_records, [("key", "S"), ("row", "i4"), ("kind", "i1")]))
+    logger.info(f"Indexed {len(records)} airports in {len(city_records)} multi-airport cities under "
+                f"{len(key_records)} search keys")
+
+def build_index(output_dir, airports_csv=None, countries_csv=None, airlines_dat=None, aircraft_dat=None):
+    # Inputs are the public OurAirports (airports.csv, countries.csv) and OpenFlights (airlines.dat, planes.dat)
+    # dumps; any of them can be left out to keep that part of an existing index
+    os.makedirs(output_dir, exist_ok=True)
+
+    if airports_csv:
+        countries = {}
+        if countries_csv:
+            with open(countries_csv, newline="", encoding="utf-8") as f:
+                countries = {row["code"]: row["name"] for row in csv.DictReader(f)}
+        airports = {}
+        with open(airports_csv, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                iata = (row.get("iata_code") or "").strip().upper()
+                if len(iata) != 3 or iata in airports:
+                    continue
+                if row.get("scheduled_service") != "yes" and row.get("type") not in ("large_airport", "medium_airport"):
+                    continue
+                airports[iata] = {
+                    "iata": iata.encode("ascii"),
+                    "name": row["name"].encode("utf-8"),
+                    "city": (row.get("municipality") or "").encode("utf-8"),
+                    "country": countries.get(row.get("iso_country"), row.get("iso_country") or "").encode("utf-8"),
+                    "latitude": float(row["latitude_deg"]),
+                    "longitude": float(row["longitude_deg"])
+                }
+        write_airports(output_dir, [airports[iata] for iata in sorted(airports)])
+
+    if airlines_dat:
+        airlines = {}
+        for row in _openflights_rows(airlines_dat):
+            code, name, active = row[3], row[1], row[7] if len(row) > 7 else None
+            if not code or len(code) != 2 or not name:
+                continue
+            # IATA codes get reassigned; an active carrier wins over a defunct one holding the same code
+            if code not in airlines or (active == "Y" and not airlines[code][1]):
+                airlines[code] = (name, active == "Y")
+        records = [{"code": code.encode("ascii"), "name": airlines[code][0].encode("utf-8")} for code in sorted(airlines)]
+        np.save(os.path.join(output_dir, "airlines.npy"), _fixed_width(records, [("code", "S"), ("name", "S")]))
+        logger.info(f"Indexed {len(records)} airlines")
+
+    if aircraft_dat:
+        aircraft = {}
+        for row in _openflights_rows(aircraft_dat):
+            name, code = row[0], row[1] if len(row) > 1 else None
+            if code and name and code not in aircraft:
+                aircraft[code] = name
+        records = [{"code": code.encode("ascii"), "name": aircraft[code].encode("utf-8")} for code in sorted(aircraft)]
+        np.save(os.path.join(output_dir, "aircraft.npy"), _fixed_width(records, [("code", "S"), ("name", "S")]))
+        logger.info(f"Indexed {len(records)} aircraft types")
+
+def main(argv=None):
+    from .config import REFERENCE_INDEX_PATH
+    parser = argparse.ArgumentParser(prog="python -m flightsight.refindex",
+                                     description="Build the offline airport/airline/aircraft reference index.")
+    parser.add_argument("--airports", help="OurAirports airports.csv")
+    parser.add_argument("--countries", help="OurAirports countries.csv, for country names")
+    parser.add_argument("--airlines", help="OpenFlights airlines.dat")
+    parser.add_argument("--aircraft", help="OpenFlights planes.dat")
+    parser.add_argument("--output-dir", default=REFERENCE_INDEX_PATH, help="index directory to write")
+    args = parser.parse_args(argv)
+    if not args.output_dir:
+        parser.error("--output-dir is required when REFERENCE_INDEX_PATH is disabled")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    build_index(args.output_dir, args.airports, args.countries, args.airlines, args.aircraft)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
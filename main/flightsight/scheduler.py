@@ -0,0 +1,175 @@
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from .config import (AMADEUS_BACKOFF_BASE, AMADEUS_BACKOFF_MAX, AMADEUS_BURST, AMADEUS_MAX_CONCURRENCY,
+                     AMADEUS_MAX_RETRIES, AMADEUS_RATE_LIMIT)
+from .metrics import record_cache, record_call
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BATCH = 1
+
+# Refills are float arithmetic: a bucket short of a whole token by rounding error alone holds one, otherwise a
+# clock that only moves when slept on could be asked to sleep for less than it can represent
+TOKEN_ROUNDING = 1e-9
+
+# Priority of the Amadeus calls made by the current run; executor threads inherit it via metrics.propagate()
+_request_priority = contextvars.ContextVar("flightsight_request_priority", default=INTERACTIVE)
+
+@contextmanager
+def request_priority(priority):
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+def status_code(error):
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+def is_retryable(error):
+    # Throttling, upstream failures and network errors (no status at all) are worth another try
+    code = status_code(error)
+    return hasattr(error, "response") and (code is None or code == 429 or code >= 500)
+
+def retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, value in headers.items():
+        if name.lower() == "retry-after":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+class AmadeusScheduler:
+    def __init__(self, rate=AMADEUS_RATE_LIMIT, burst=AMADEUS_BURST, max_concurrency=AMADEUS_MAX_CONCURRENCY,
+                 max_retries=AMADEUS_MAX_RETRIES, backoff_base=AMADEUS_BACKOFF_BASE, backoff_max=AMADEUS_BACKOFF_MAX,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Every wait on the rate limit or a backoff goes through clock/sleep, so tests can swap in a fake clock
+        self._clock = clock
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait(self, timeout):
+        # A token refill or a pause has a known end, so sleep it out with the lock released; the loop in
+        # _acquire re-checks everything afterwards
+        self._cond.release()
+        try:
+            self._sleep(timeout)
+        finally:
+            self._cond.acquire()
+
+    def _acquire(self, priority):
+        # Waiters queue by (priority, arrival); only the head may take a token, so a steady stream of
+        # batch calls can never starve an interactive search
+        ticket = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = self._clock()
+                    self._refill(now)
+                    if self._waiting[0] != ticket or self._active >= self.max_concurrency:
+                        self._cond.wait()
+                    elif now < self._paused_until:
+                        self._wait(self._paused_until - now)
+                    elif self._tokens < 1 - TOKEN_ROUNDING:
+                        self._wait((1 - self._tokens) / self.rate)
+                    else:
+                        self._tokens -= 1
+                        self._active += 1
+                        heapq.heappop(self._waiting)
+                        self._cond.notify_all()
+                        return
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _backoff(self, attempt, error):
+        # Full jitter, unless the server told us how long to wait; either way the whole scheduler pauses
+        delay = retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        with self._cond:
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+            if status_code(error) == 429:
+                self._tokens = 0.0
+            self._cond.notify_all()
+        return delay
+
+    def _call_with_retries(self, func, priority):
+        attempt = 0
+        while True:
+            self._acquire(priority)
+            try:
+                return func()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                error = e
+            finally:
+                self._release()
+            delay = self._backoff(attempt, error)
+            record_call("amadeus_backoff", delay)
+            logger.warning(f"Amadeus call failed with status {status_code(error)}, retrying in {delay:.2f}s "
+                           f"(attempt {attempt + 1} of {self.max_retries})")
+            self._sleep(delay)
+            attempt += 1
+
+    def call(self, key, func, priority=None):
+        # Identical calls already in flight share one upstream request and its result (or error)
+        priority = _request_priority.get() if priority is None else priority
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        record_cache("amadeus_coalescing", hits=int(not owner), misses=int(owner))
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._call_with_retries(func, priority)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
@@ -0,0 +1,200 @@
+import pandas as pd
+
+SYNTHESIZED_COLUMN = "IS_SYNTHESIZED"
+
+FLIGHT_COLUMNS = [
+    "TRIP_ID", "FLIGHT_TYPE", "FLIGHT_NO", "CARRIER", "OPERATING_AIRLINE", "OPERATING_AIRLINE_NAME",
+    "ORIGIN", "DESTINATION", "ORIGIN_CITY_NAME", "DESTINATION_CITY_NAME", "AIRPORT_NAME_ORIGIN",
+    "AIRPORT_NAME_DESTINATION", "DEPARTURE", "ARRIVAL", "DURATION", "STOPS", "AIRCRAFT_CODE",
+    "AIRCRAFT_NAME", "CABIN", "BOOKING_CLASS", "FARE_CONDITIONS", "CHECKED_BAGS", "BASE_PRICE",
+    "TOTAL_PRICE", "CURRENCY", "FLIGHT_DISTANCE_KM", "LAST_TICKETING_DATE", "SEGMENT_CABIN_TYPE", "SOURCE",
+    "FARE_BASIS", "DEPARTURE_DATE", SYNTHESIZED_COLUMN
+]
+
+WEATHER_COLUMNS = [
+    "LOCATION_ID", "IATA_CODE", "LOCATION_TYPE", "LATITUDE", "LONGITUDE", "FETCH_TIMESTAMP",
+    "VISIBILITY", "WIND_SPEED", "WIND_GUST", "WIND_DIRECTION", "RAIN", "SNOW", "WEATHER_DESCRIPTION",
+    "TEMPERATURE", "PRESSURE", "HUMIDITY", "CLOUDINESS", "SUNRISE", "SUNSET", "EVENT_TIME", "DEPARTURE_DATE",
+    SYNTHESIZED_COLUMN
+]
+
+# Logical column types for typed output; snowflake.sql declares the matching *_TYPED tables
+FLIGHT_SCHEMA = {
+    "TRIP_ID": "string",
+    "FLIGHT_TYPE": "category",
+    "FLIGHT_NO": "category",
+    "CARRIER": "category",
+    "OPERATING_AIRLINE": "category",
+    "OPERATING_AIRLINE_NAME": "category",
+    "ORIGIN": "category",
+    "DESTINATION": "category",
+    "ORIGIN_CITY_NAME": "category",
+    "DESTINATION_CITY_NAME": "category",
+    "AIRPORT_NAME_ORIGIN": "category",
+    "AIRPORT_NAME_DESTINATION": "category",
+    "DEPARTURE": "timestamp",
+    "ARRIVAL": "timestamp",
+    "DURATION": "category",
+    "STOPS": "int",
+    "AIRCRAFT_CODE": "category",
+    "AIRCRAFT_NAME": "category",
+    "CABIN": "category",
+    "BOOKING_CLASS": "category",
+    "FARE_CONDITIONS": "category",
+    "CHECKED_BAGS": "int",
+    "BASE_PRICE": "decimal",
+    "TOTAL_PRICE": "decimal",
+    "CURRENCY": "category",
+    "FLIGHT_DISTANCE_KM": "float",
+    "LAST_TICKETING_DATE": "date",
+    "SEGMENT_CABIN_TYPE": "category",
+    "SOURCE": "category",
+    "FARE_BASIS": "category",
+    "DEPARTURE_DATE": "date",
+    SYNTHESIZED_COLUMN: "bool"
+}
+
+WEATHER_SCHEMA = {
+    "LOCATION_ID": "string",
+    "IATA_CODE": "category",
+    "LOCATION_TYPE": "category",
+    "LATITUDE": "float",
+    "LONGITUDE": "float",
+    "FETCH_TIMESTAMP": "timestamp",
+    "VISIBILITY": "float",
+    "WIND_SPEED": "float",
+    "WIND_GUST": "float",
+    "WIND_DIRECTION": "float",
+    "RAIN": "string",
+    "SNOW": "string",
+    "WEATHER_DESCRIPTION": "category",
+    "TEMPERATURE": "float",
+    "PRESSURE": "float",
+    "HUMIDITY": "float",
+    "CLOUDINESS": "float",
+    "SUNRISE": "timestamp",
+    "SUNSET": "timestamp",
+    "EVENT_TIME": "timestamp",
+    "DEPARTURE_DATE": "date",
+    SYNTHESIZED_COLUMN: "bool"
+}
+
+# Star layout (OUTPUT_LAYOUT=star): segment, pricing and itinerary facts joined on OFFER_KEY, a BIGINT derived
+# from the offer's OFFER_ID (the wide TRIP_ID, kept once on the itinerary), and airport/airline/aircraft
+# dimensions joined through stable INT surrogate keys; departure date and the synthesized flag are offer-level
+SEGMENT_SCHEMA = {
+    "OFFER_KEY": "bigint",
+    "SEGMENT_NO": "int",
+    "FLIGHT_NO": "category",
+    "CARRIER_KEY": "int",
+    "OPERATING_AIRLINE_KEY": "int",
+    "ORIGIN_AIRPORT_KEY": "int",
+    "DESTINATION_AIRPORT_KEY": "int",
+    "AIRCRAFT_KEY": "int",
+    "DEPARTURE": "timestamp",
+    "ARRIVAL": "timestamp",
+    "DURATION": "category",
+    "CABIN": "category",
+    "BOOKING_CLASS": "category",
+    "FARE_CONDITIONS": "category",
+    "FARE_BASIS": "category",
+    "FLIGHT_DISTANCE_KM": "float"
+}
+
+PRICING_SCHEMA = {
+    "OFFER_KEY": "bigint",
+    "BASE_FARE": "decimal",
+    "TOTAL_FARE": "decimal",
+    "TAXES": "decimal",
+    "CURRENCY": "category",
+    "BOOKABLE_SEATS": "int",
+    "LAST_TICKETING_DATE": "date",
+    "SOURCE": "category"
+}
+
+ITINERARY_SCHEMA = {
+    "OFFER_KEY": "bigint",
+    "OFFER_ID": "string",
+    "ITINERARY_TYPE": "category",
+    "TOTAL_DURATION": "string",
+    "NUMBER_OF_STOPS": "int",
+    "DEPARTURE_AIRPORT_KEY": "int",
+    "ARRIVAL_AIRPORT_KEY": "int",
+    "DEPARTURE": "timestamp",
+    "ARRIVAL": "timestamp",
+    "TOTAL_PRICE": "decimal",
+    "DEPARTURE_DATE": "date",
+    SYNTHESIZED_COLUMN: "bool"
+}
+
+AIRPORT_SCHEMA = {
+    "AIRPORT_KEY": "int",
+    "AIRPORT_CODE": "string",
+    "AIRPORT_NAME": "string",
+    "CITY": "string",
+    "COUNTRY": "string",
+    "LATITUDE": "float",
+    "LONGITUDE": "float"
+}
+
+AIRLINE_SCHEMA = {
+    "AIRLINE_KEY": "int",
+    "CARRIER_CODE": "string",
+    "AIRLINE_NAME": "string"
+}
+
+AIRCRAFT_SCHEMA = {
+    "AIRCRAFT_KEY": "int",
+    "AIRCRAFT_CODE": "string",
+    "AIRCRAFT_TYPE": "string"
+}
+
+TABLE_SCHEMAS = {
+    "flights": FLIGHT_SCHEMA,
+    "weather": WEATHER_SCHEMA,
+    "segments": SEGMENT_SCHEMA,
+    "pricing": PRICING_SCHEMA,
+    "itineraries": ITINERARY_SCHEMA,
+    "airports": AIRPORT_SCHEMA,
+    "airlines": AIRLINE_SCHEMA,
+    "aircraft": AIRCRAFT_SCHEMA
+}
+
+def apply_schema(df, schema):
+    typed = {}
+    for column in df.columns:
+        kind = schema.get(column)
+        values = df[column]
+        if kind in ("float", "decimal"):
+            typed[column] = pd.to_numeric(values, errors="coerce").astype("float64")
+        elif kind == "int":
+            typed[column] = pd.to_numeric(values, errors="coerce").astype("Int32")
+        elif kind == "bigint":
+            typed[column] = pd.to_numeric(values, errors="coerce").astype("Int64")
+        elif kind == "timestamp":
+            # Offsets are dropped: Amadeus times are airport-local and weather times are already shifted
+            typed[column] = pd.to_datetime(values, errors="coerce", utc=True, format="ISO8601").dt.tz_localize(None)
+        elif kind == "date":
+            typed[column] = pd.to_datetime(values, errors="coerce", format="ISO8601").dt.normalize()
+        elif kind == "bool":
+            typed[column] = values.map({True: True, False: False, "True": True, "False": False}).astype("boolean")
+        elif kind == "category":
+            typed[column] = values.astype("category")
+        else:
+            typed[column] = values
+    return pd.DataFrame(typed, index=df.index)
+
+def arrow_schema(schema):
+    import pyarrow as pa
+    arrow_types = {
+        "string": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "decimal": pa.decimal128(12, 2),
+        "float": pa.float64(),
+        "int": pa.int32(),
+        "bigint": pa.int64(),
+        "timestamp": pa.timestamp("us"),
+        "date": pa.date32(),
+        "bool": pa.bool_()
+    }
+    return pa.schema([(column, arrow_types[kind]) for column, kind in schema.items()])
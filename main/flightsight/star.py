@@ -0,0 +1,182 @@
+import hashlib
+import logging
+
+import pandas as pd
+
+from .config import OUTPUT_LAYOUT
+from .metrics import instrumented
+from .reference import get_airline_name, get_airport_info
+from .schema import (AIRCRAFT_SCHEMA, AIRLINE_SCHEMA, AIRPORT_SCHEMA, ITINERARY_SCHEMA, PRICING_SCHEMA,
+                     SEGMENT_SCHEMA, SYNTHESIZED_COLUMN)
+
+logger = logging.getLogger(__name__)
+
+FACT_TABLES = ("segments", "pricing", "itineraries")
+# Dimension table -> its surrogate key column
+DIMENSION_KEYS = {"airports": "AIRPORT_KEY", "airlines": "AIRLINE_KEY", "aircraft": "AIRCRAFT_KEY"}
+
+# Natural key width per dimension: IATA airport and aircraft codes are 3 characters, airline codes 2
+KEY_WIDTHS = {"airport": 3, "airline": 2, "aircraft": 3}
+KEY_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+def surrogate_key(kind, natural_key):
+    # A conforming IATA code is read as a base-36 number (plus one, so 0 stays "no code"): every run and every
+    # worker assigns the same small positive key to the same code, with no registry lookup and no collisions.
+    # Anything else gets its own negative key from a 31-bit digest, like offer_keys, so malformed codes never
+    # share a dimension row with each other or with a real code
+    code = str(natural_key or "").strip().upper()
+    if not code:
+        return 0
+    if len(code) == KEY_WIDTHS[kind] and all(ch in KEY_ALPHABET for ch in code):
+        return int(code, 36) + 1
+    digest = int.from_bytes(hashlib.blake2b(code.encode("utf-8"), digest_size=4).digest(), "big")
+    return -(digest & 0x7FFFFFFF) - 1
+
+def surrogate_keys(kind, codes):
+    keys = {code: surrogate_key(kind, code) for code in codes.unique()}
+    malformed = sorted(str(code) for code, key in keys.items() if key < 0)
+    if malformed:
+        logger.warning(f"Non-IATA {kind} codes given hashed surrogate keys: {', '.join(malformed)}")
+    return codes.map(keys).astype("int32")
+
+def offer_keys(offer_ids):
+    # OFFER_ID is a 36-character UUID; the facts join on a 64-bit digest of it instead of repeating it three times
+    keys = {offer_id: int.from_bytes(hashlib.blake2b(str(offer_id).encode("utf-8"), digest_size=8).digest(),
+                                     "big", signed=True)
+            for offer_id in pd.unique(offer_ids)}
+    return pd.Series(offer_ids).map(keys).astype("int64").values
+
+def iso_duration(delta):
+    if pd.isna(delta):
+        return ""
+    minutes = int(delta.total_seconds() // 60)
+    return f"PT{minutes // 60}H{minutes % 60}M"
+
+@instrumented
+def build_star(flights_df):
+    # Splits the wide one-row-per-segment frame into facts and dimensions. Offer-level values (prices, seats,
+    # ticketing date) and names repeated on every segment are stored once, in pricing and the dimensions.
+    flights = flights_df.reset_index(drop=True)
+    first = flights.drop_duplicates("TRIP_ID", keep="first").set_index("TRIP_ID")
+    last = flights.drop_duplicates("TRIP_ID", keep="last").set_index("TRIP_ID").reindex(first.index)
+
+    segments = pd.DataFrame({
+        "OFFER_KEY": offer_keys(flights["TRIP_ID"]),
+        "SEGMENT_NO": flights.groupby("TRIP_ID", sort=False).cumcount() + 1,
+        "FLIGHT_NO": flights["FLIGHT_NO"],
+        "CARRIER_KEY": surrogate_keys("airline", flights["CARRIER"]),
+        "OPERATING_AIRLINE_KEY": surrogate_keys("airline", flights["OPERATING_AIRLINE"]),
+        "ORIGIN_AIRPORT_KEY": surrogate_keys("airport", flights["ORIGIN"]),
+        "DESTINATION_AIRPORT_KEY": surrogate_keys("airport", flights["DESTINATION"]),
+        "AIRCRAFT_KEY": surrogate_keys("aircraft", flights["AIRCRAFT_CODE"]),
+        "DEPARTURE": flights["DEPARTURE"],
+        "ARRIVAL": flights["ARRIVAL"],
+        "DURATION": flights["DURATION"],
+        "CABIN": flights["CABIN"],
+        "BOOKING_CLASS": flights["BOOKING_CLASS"],
+        "FARE_CONDITIONS": flights["FARE_CONDITIONS"],
+        "FARE_BASIS": flights["FARE_BASIS"],
+        "FLIGHT_DISTANCE_KM": flights["FLIGHT_DISTANCE_KM"]
+    }, columns=list(SEGMENT_SCHEMA))
+
+    base_fare = pd.to_numeric(first["BASE_PRICE"], errors="coerce")
+    total_fare = pd.to_numeric(first["TOTAL_PRICE"], errors="coerce")
+    keys = offer_keys(first.index)
+    pricing = pd.DataFrame({
+        "OFFER_KEY": keys,
+        "BASE_FARE": base_fare.values,
+        "TOTAL_FARE": total_fare.values,
+        "TAXES": (total_fare - base_fare).round(2).values,
+        "CURRENCY": first["CURRENCY"].values,
+        "BOOKABLE_SEATS": first["CHECKED_BAGS"].values,
+        "LAST_TICKETING_DATE": first["LAST_TICKETING_DATE"].values,
+        "SOURCE": first["SOURCE"].values
+    }, columns=list(PRICING_SCHEMA))
+
+    # Flying time only: segment times are airport-local, so connection times can't be derived from them
+    flying_time = pd.to_timedelta(flights["DURATION"].astype(str), errors="coerce").groupby(flights["TRIP_ID"], sort=False).sum()
+    itineraries = pd.DataFrame({
+        "OFFER_KEY": keys,
+        "OFFER_ID": first.index,
+        "ITINERARY_TYPE": first["FLIGHT_TYPE"].values,
+        "TOTAL_DURATION": flying_time.reindex(first.index).map(iso_duration).values,
+        "NUMBER_OF_STOPS": first["STOPS"].values,
+        "DEPARTURE_AIRPORT_KEY": surrogate_keys("airport", first["ORIGIN"]).values,
+        "ARRIVAL_AIRPORT_KEY": surrogate_keys("airport", last["DESTINATION"]).values,
+        "DEPARTURE": first["DEPARTURE"].values,
+        "ARRIVAL": last["ARRIVAL"].values,
+        "TOTAL_PRICE": total_fare.values,
+        "DEPARTURE_DATE": first["DEPARTURE_DATE"].values,
+        SYNTHESIZED_COLUMN: first[SYNTHESIZED_COLUMN].values
+    }, columns=list(ITINERARY_SCHEMA))
+
+    airport_names = pd.concat([
+        flights[["ORIGIN", "AIRPORT_NAME_ORIGIN", "ORIGIN_CITY_NAME"]].set_axis(["CODE", "NAME", "CITY"], axis=1),
+        flights[["DESTINATION", "AIRPORT_NAME_DESTINATION", "DESTINATION_CITY_NAME"]].set_axis(["CODE", "NAME", "CITY"],
+                                                                                             axis=1)
+    ]).drop_duplicates("CODE")
+    airport_rows = []
+    for code, name, city in airport_names.itertuples(index=False):
+        # Resolved once per run from the reference index/cache, which the flatten step has already warmed
+        info = get_airport_info(code) or {}
+        geo = info.get("geoCode", {})
+        airport_rows.append({
+            "AIRPORT_KEY": surrogate_key("airport", code),
+            "AIRPORT_CODE": code,
+            "AIRPORT_NAME": name,
+            "CITY": city,
+            "COUNTRY": info.get("address", {}).get("countryName", ""),
+            "LATITUDE": geo.get("latitude"),
+            "LONGITUDE": geo.get("longitude")
+        })
+    airports = pd.DataFrame(airport_rows, columns=list(AIRPORT_SCHEMA))
+
+    airline_names = dict(zip(flights["OPERATING_AIRLINE"], flights["OPERATING_AIRLINE_NAME"]))
+    airline_codes = pd.unique(pd.concat([flights["CARRIER"], flights["OPERATING_AIRLINE"]]))
+    airlines = pd.DataFrame([
+        {"AIRLINE_KEY": surrogate_key("airline", code), "CARRIER_CODE": code,
+         "AIRLINE_NAME": airline_names.get(code) or get_airline_name(code)}
+        for code in airline_codes
+    ], columns=list(AIRLINE_SCHEMA))
+
+    aircraft_types = flights[["AIRCRAFT_CODE", "AIRCRAFT_NAME"]].drop_duplicates("AIRCRAFT_CODE")
+    aircraft = pd.DataFrame({
+        "AIRCRAFT_KEY": surrogate_keys("aircraft", aircraft_types["AIRCRAFT_CODE"]).values,
+        "AIRCRAFT_CODE": aircraft_types["AIRCRAFT_CODE"].values,
+        "AIRCRAFT_TYPE": aircraft_types["AIRCRAFT_NAME"].values
+    }, columns=list(AIRCRAFT_SCHEMA))
+
+    return {"segments": segments, "pricing": pricing, "itineraries": itineraries,
+            "airports": airports, "airlines": airlines, "aircraft": aircraft}
+
+def row_hash(row):
+    return hashlib.sha256("\x1f".join("" if pd.isna(value) else str(value) for value in row).encode("utf-8")).hexdigest()
+
+def changed_rows(dim_df, table, key_column, known):
+    # Only rows whose key is new, or whose attributes changed since they were last written, are emitted
+    hashes = [row_hash(row) for row in dim_df.itertuples(index=False)]
+    entries = [f"{table}/{key}" for key in dim_df[key_column]]
+    changed = [known.get(entry) != digest for entry, digest in zip(entries, hashes)]
+    updates = {entry: digest for entry, digest, is_changed in zip(entries, hashes, changed) if is_changed}
+    return dim_df[changed].reset_index(drop=True), updates
+
+def flight_datasets(flights_df, layout=OUTPUT_LAYOUT, known=None):
+    # Datasets to write for a flights frame, plus the dimension registry entries to record once they are written
+    if layout != "star" or flights_df.empty:
+        return [(flights_df, "flights.csv")], {}
+    tables = build_star(flights_df)
+    datasets = [(tables[table], f"{table}.csv") for table in FACT_TABLES]
+    updates = {}
+    for table, key_column in DIMENSION_KEYS.items():
+        dim_df, dim_updates = changed_rows(tables[table], table, key_column, known or {})
+        if dim_df.empty:
+            logger.info(f"No new {table} rows")
+            continue
+        datasets.append((dim_df, f"{table}.csv"))
+        updates.update(dim_updates)
+    return datasets, updates
+
+def written_updates(results, updates):
+    # Registry entries whose dimension file was actually written; the rest are retried next run
+    failed = {result["name"].split(".")[0] for result in results if result["error"]}
+    return {entry: digest for entry, digest in updates.items() if entry.split("/")[0] not in failed}
@@ -0,0 +1,210 @@
+import gzip
+import io
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from .clients import get_s3_client
+from .config import OUTPUT_FORMAT, S3_BUCKET, S3_COMPRESSION, S3_MULTIPART_THRESHOLD, STREAM_CHUNK_ROWS
+from .metrics import instrumented, propagate, record_payload
+from .schema import TABLE_SCHEMAS, apply_schema, arrow_schema
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_FORMATS = {
+    "none": ("", "text/csv"),
+    "gzip": (".gz", "application/gzip"),
+    "zstd": (".zst", "application/zstd")
+}
+
+def serialize_frame(df, compression=S3_COMPRESSION):
+    buffer = io.BytesIO()
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=buffer, mode="wb")
+    elif compression == "zstd":
+        import zstandard
+        stream = zstandard.ZstdCompressor().stream_writer(buffer, closefd=False)
+    else:
+        stream = buffer
+
+    # Write the CSV straight through the (compressing) byte stream so it is encoded exactly once
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    df.to_csv(text_stream, index=False)
+    text_stream.flush()
+    text_stream.detach()
+    if stream is not buffer:
+        stream.close()
+    return buffer.getvalue()
+
+def serialize_parquet(df, schema, compression=S3_COMPRESSION):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    typed = apply_schema(df, schema)
+    table = pa.Table.from_pandas(typed, preserve_index=False).cast(arrow_schema(schema))
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression=compression if compression in ("gzip", "zstd") else "snappy",
+                   use_dictionary=True)
+    return buffer.getvalue()
+
+def s3_partition(origin_iata, destination_iata, departure_date, run_id=None):
+    run_id = run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return f"route={origin_iata}-{destination_iata}/departure_date={departure_date.strftime('%Y-%m-%d')}/run={run_id}"
+
+@instrumented
+def upload_object(body, s3_key, content_type):
+    from boto3.s3.transfer import TransferConfig
+    record_payload("upload_object", len(body))
+    get_s3_client().upload_fileobj(
+        io.BytesIO(body),
+        S3_BUCKET,
+        s3_key,
+        ExtraArgs={"ContentType": content_type},
+        Config=TransferConfig(multipart_threshold=S3_MULTIPART_THRESHOLD)
+    )
+
+@instrumented
+def write_local_object(body, s3_key, output_dir):
+    record_payload("write_local_object", len(body))
+    path = os.path.join(output_dir, s3_key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(body)
+
+@instrumented
+def prepare_dataset(df, filename, partition=None, compression=S3_COMPRESSION, output_format=OUTPUT_FORMAT,
+                    part=None):
+    suffix, content_type = COMPRESSION_FORMATS.get(compression, COMPRESSION_FORMATS["none"])
+    df.columns = [col.replace("-", "_").upper() for col in df.columns]
+    table_name = os.path.splitext(filename)[0]
+    if output_format == "parquet" and table_name in TABLE_SCHEMAS:
+        # Parquet compresses its column chunks internally, so the object itself keeps a plain name
+        body = serialize_parquet(df, TABLE_SCHEMAS[table_name], compression)
+        object_name, object_type = f"{table_name}.parquet", "application/vnd.apache.parquet"
+    else:
+        # Blank out missing values (e.g. distances with no coordinates) rather than writing "nan"
+        df = df.astype(object).where(df.notna(), "").astype(str)
+        body = serialize_frame(df, compression)
+        object_name, object_type = filename + suffix, content_type
+    if part is not None:
+        # Streamed tables are written as numbered parts under a directory named after the table
+        object_name = f"{table_name}/part-{part:05d}{object_name[len(table_name):]}"
+    return {
+        "frame": df,
+        "name": object_name,
+        "key": f"flight_data/{partition}/{object_name}" if partition else f"flight_data/{object_name}",
+        "body": body,
+        "content_type": object_type,
+        "error": None
+    }
+
+@instrumented
+def save_datasets(datasets, partition=None, compression=S3_COMPRESSION, output_format=OUTPUT_FORMAT,
+                  output_dir=None):
+    results = []
+    for df, filename in datasets:
+        if df.empty:
+            logger.warning(f"No data to save for {filename}")
+            continue
+        results.append(prepare_dataset(df, filename, partition, compression, output_format))
+    return store_datasets(results, output_dir)
+
+def store_datasets(results, output_dir=None):
+    if not results:
+        return results
+
+    with ThreadPoolExecutor(max_workers=len(results)) as executor:
+        if output_dir:
+            futures = [executor.submit(propagate(write_local_object), result["body"], result["key"], output_dir)
+                       for result in results]
+        else:
+            futures = [executor.submit(propagate(upload_object), result["body"], result["key"], result["content_type"])
+                       for result in results]
+
+    for result, future in zip(results, futures):
+        try:
+            future.result()
+        except Exception as e:
+            result["error"] = str(e)
+            logger.error(f"Save error for {result['name']}: {str(e)}")
+    return results
+
+@instrumented
+def save_data(df, filename, partition=None, output_dir=None):
+    results = save_datasets([(df, filename)], partition=partition, output_dir=output_dir)
+    return results[0] if results else None
+
+class PartWriter:
+    # Streams one table to the sink as fixed-size part files: rows are buffered until a part fills up, which is
+    # then written while the caller carries on. Only one part and max_pending writes are held in memory at a time.
+    def __init__(self, filename, partition=None, chunk_rows=STREAM_CHUNK_ROWS, compression=S3_COMPRESSION,
+                 output_format=OUTPUT_FORMAT, output_dir=None, max_pending=2):
+        self.filename = filename
+        self.partition = partition
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.output_format = output_format
+        self.output_dir = output_dir
+        self.max_pending = max_pending
+        self.rows = 0
+        self.results = []
+        self._buffer = []
+        self._buffered = 0
+        self._parts = 0
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(max_workers=max_pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, df):
+        if df.empty:
+            return
+        self._buffer.append(df)
+        self._buffered += len(df)
+        while self._buffered >= self.chunk_rows:
+            self._flush(self.chunk_rows)
+
+    def _flush(self, rows):
+        frame = pd.concat(self._buffer, ignore_index=True) if len(self._buffer) > 1 else self._buffer[0]
+        rest = frame.iloc[rows:]
+        self._buffer = [rest] if len(rest) else []
+        self._buffered = len(rest)
+        result = prepare_dataset(frame.iloc[:rows].reset_index(drop=True), self.filename, self.partition,
+                                 self.compression, self.output_format, part=self._parts)
+        self._parts += 1
+        while len(self._pending) >= self.max_pending:
+            self._collect(*self._pending.popleft())
+        if self.output_dir:
+            future = self._executor.submit(propagate(write_local_object), result["body"], result["key"],
+                                           self.output_dir)
+        else:
+            future = self._executor.submit(propagate(upload_object), result["body"], result["key"],
+                                           result["content_type"])
+        self._pending.append((result, future))
+
+    def _collect(self, result, future):
+        try:
+            future.result()
+        except Exception as e:
+            result["error"] = str(e)
+            logger.error(f"Save error for {result['key']}: {str(e)}")
+        # Keep the outcome, not the data
+        result["rows"] = len(result.pop("frame"))
+        del result["body"]
+        self.rows += result["rows"]
+        self.results.append(result)
+
+    def close(self):
+        if self._buffered:
+            self._flush(self._buffered)
+        while self._pending:
+            self._collect(*self._pending.popleft())
+        self._executor.shutdown()
+        return self.results
@@ -0,0 +1,231 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .config import TRENDS_PATH
+from .metrics import instrumented
+from .schema import SYNTHESIZED_COLUMN
+
+logger = logging.getLogger(__name__)
+
+# Fare sketches are histograms over fixed log-spaced bins, so two sketches merge by adding their counts and a
+# quantile read from one is within half a bin (about 1%) of the exact value; min and max are kept exactly.
+# The bins reach 1e9 so fares in any currency (JPY, KRW, VND...) fall inside them; the top bin is open-ended,
+# and a quantile that lands in it reads as the exact max rather than a capped midpoint.
+SKETCH_BINS = 1024
+SKETCH_EDGES = np.geomspace(1.0, 1e9, SKETCH_BINS + 1)
+SKETCH_MIDPOINTS = np.sqrt(SKETCH_EDGES[:-1] * SKETCH_EDGES[1:])
+OVERFLOW_BIN = SKETCH_BINS - 1
+
+# Fares are only comparable within one currency, so it is part of every key
+TREND_KEY = ("ROUTE", "CURRENCY", "CARRIER", "CABIN", "DEPARTURE_DATE")
+DISTRIBUTION_QUANTILES = (0.1, 0.5, 0.9)
+# Bumped when the table layout or the sketch bins change; older tables are set aside, not mixed in
+TRENDS_SCHEMA_VERSION = 2
+
+def sketch_bins(prices):
+    bins = np.searchsorted(SKETCH_EDGES, np.asarray(prices, dtype="float64"), side="right") - 1
+    return np.clip(bins, 0, SKETCH_BINS - 1)
+
+def encode_sketch(counts):
+    # Stored sparse: a day's offers only touch a few dozen of the bins
+    nonzero = np.flatnonzero(counts)
+    return nonzero.astype("<u2").tobytes() + counts[nonzero].astype("<u4").tobytes()
+
+def decode_sketch(blob):
+    counts = np.zeros(SKETCH_BINS, dtype="int64")
+    if blob:
+        size = len(blob) // 6
+        counts[np.frombuffer(blob[:2 * size], dtype="<u2")] = np.frombuffer(blob[2 * size:], dtype="<u4")
+    return counts
+
+def sketch_quantiles(counts, quantiles=DISTRIBUTION_QUANTILES, low=None, high=None):
+    total = counts.sum()
+    if not total:
+        return [None] * len(quantiles)
+    ranks = np.clip(np.ceil(np.asarray(quantiles) * total), 1, total)
+    bins = np.searchsorted(np.cumsum(counts), ranks)
+    values = SKETCH_MIDPOINTS[bins]
+    if low is not None and high is not None:
+        values = np.clip(np.where(bins == OVERFLOW_BIN, high, values), low, high)
+    return [round(float(value), 2) for value in values]
+
+def offer_fares(flights_df):
+    # One row per real offer: synthesized rows are copies of another day, not observations
+    if flights_df.empty:
+        return pd.DataFrame(columns=[*TREND_KEY, "TOTAL_PRICE"])
+    real = flights_df[~flights_df[SYNTHESIZED_COLUMN].fillna(False).astype(bool)]
+    first = real.drop_duplicates("TRIP_ID", keep="first").set_index("TRIP_ID")
+    last = real.drop_duplicates("TRIP_ID", keep="last").set_index("TRIP_ID").reindex(first.index)
+    fares = pd.DataFrame({
+        "ROUTE": first["ORIGIN"].astype(str) + "-" + last["DESTINATION"].astype(str),
+        "CURRENCY": first["CURRENCY"].astype(str),
+        "CARRIER": first["CARRIER"].astype(str),
+        "CABIN": first["CABIN"].astype(str),
+        "DEPARTURE_DATE": first["DEPARTURE_DATE"].astype(str).str[:10],
+        "TOTAL_PRICE": pd.to_numeric(first["TOTAL_PRICE"], errors="coerce")
+    })
+    return fares.dropna(subset=["TOTAL_PRICE"]).reset_index(drop=True)
+
+class TrendStore:
+    # Fare aggregates per route/currency/carrier/cabin/departure date, kept in SQLite across runs:
+    #   fare_snapshots  one sketch per key per snapshot, with its change against the key's previous snapshot
+    #   fare_totals     every snapshot of a key merged into one sketch
+    # Recording a snapshot touches only the keys in it, so it costs O(new rows), never a rescan of history.
+
+    def __init__(self, db_path=TRENDS_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Batch workers in other processes write to the same file; SQLite serializes them
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            tables = {row[0] for row in self._db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if version < TRENDS_SCHEMA_VERSION:
+                # Sketches from before had other bins and no currency: kept under a versioned name, never read
+                for table in ("fare_snapshots", "fare_totals"):
+                    if table in tables:
+                        self._db.execute(f"ALTER TABLE {table} RENAME TO {table}_v{version or 1}")
+                        logger.warning(f"Set aside {table} from an older trends layout in {db_path}")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS fare_snapshots (route TEXT, currency TEXT, carrier TEXT, cabin TEXT, "
+                "departure_date TEXT, snapshot_at REAL, offers INTEGER, min_fare REAL, max_fare REAL, sum_fare REAL, "
+                "median_fare REAL, min_change REAL, median_change REAL, sketch BLOB, "
+                "PRIMARY KEY (route, departure_date, currency, carrier, cabin, snapshot_at))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS fare_totals (route TEXT, currency TEXT, carrier TEXT, cabin TEXT, "
+                "departure_date TEXT, snapshots INTEGER, offers INTEGER, min_fare REAL, max_fare REAL, "
+                "sum_fare REAL, sketch BLOB, updated_at REAL, PRIMARY KEY (route, departure_date, currency, carrier, "
+                "cabin))"
+            )
+            self._db.execute(f"PRAGMA user_version = {TRENDS_SCHEMA_VERSION}")
+
+    @instrumented
+    def record(self, flights_df, snapshot_at=None):
+        snapshot_at = time.time() if snapshot_at is None else snapshot_at
+        fares = offer_fares(flights_df)
+        if fares.empty:
+            return 0
+        fares["BIN"] = sketch_bins(fares["TOTAL_PRICE"])
+        groups = fares.groupby(list(TREND_KEY), sort=False)
+        with self._lock:
+            for key, group in groups:
+                self._record_key(key, group, snapshot_at)
+            self._db.commit()
+        logger.info(f"Recorded {len(fares)} fares under {groups.ngroups} trend keys")
+        return groups.ngroups
+
+    def _record_key(self, key, group, snapshot_at):
+        route, currency, carrier, cabin, departure_date = key
+        counts = np.bincount(group["BIN"], minlength=SKETCH_BINS)
+        prices = group["TOTAL_PRICE"]
+        offers, min_fare, max_fare, sum_fare = len(group), float(prices.min()), float(prices.max()), float(prices.sum())
+        median_fare = sketch_quantiles(counts, (0.5,), min_fare, max_fare)[0]
+
+        previous = self._db.execute(
+            "SELECT min_fare, median_fare FROM fare_snapshots WHERE route = ? AND departure_date = ? AND currency = ? "
+            "AND carrier = ? AND cabin = ? AND snapshot_at < ? ORDER BY snapshot_at DESC LIMIT 1",
+            (route, departure_date, currency, carrier, cabin, snapshot_at)
+        ).fetchone()
+        min_change = round(min_fare - previous[0], 2) if previous else None
+        median_change = round(median_fare - previous[1], 2) if previous else None
+        self._db.execute(
+            "INSERT OR REPLACE INTO fare_snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (route, currency, carrier, cabin, departure_date, snapshot_at, offers, min_fare, max_fare, sum_fare, median_fare,
+             min_change, median_change, encode_sketch(counts))
+        )
+
+        total = self._db.execute(
+            "SELECT snapshots, offers, min_fare, max_fare, sum_fare, sketch FROM fare_totals "
+            "WHERE route = ? AND departure_date = ? AND currency = ? AND carrier = ? AND cabin = ?",
+            (route, departure_date, currency, carrier, cabin)
+        ).fetchone()
+        if total:
+            counts = counts + decode_sketch(total[5])
+            snapshots, offers = total[0] + 1, total[1] + offers
+            min_fare, max_fare, sum_fare = min(min_fare, total[2]), max(max_fare, total[3]), sum_fare + total[4]
+        else:
+            snapshots = 1
+        self._db.execute(
+            "INSERT OR REPLACE INTO fare_totals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (route, currency, carrier, cabin, departure_date, snapshots, offers, min_fare, max_fare, sum_fare,
+             encode_sketch(counts), snapshot_at)
+        )
+
+    def _rows(self, table, origin_iata, destination_iata, columns, since=None):
+        query = f"SELECT {', '.join(columns)} FROM {table} WHERE route = ?"
+        params = [f"{origin_iata}-{destination_iata}"]
+        if since is not None:
+            query += " AND snapshot_at >= ?"
+            params.append(since)
+        with self._lock:
+            return pd.read_sql_query(query, self._db, params=params)
+
+    def route_snapshots(self, origin_iata, destination_iata, since=None):
+        # One row per departure date, currency and snapshot (taken at or after since, in epoch seconds), with
+        # carriers and cabins merged through their sketches
+        rows = self._rows("fare_snapshots", origin_iata, destination_iata,
+                          ["departure_date", "currency", "snapshot_at", "offers", "min_fare", "max_fare", "sketch"],
+                          since)
+        return summarize(rows, ["departure_date", "currency", "snapshot_at"])
+
+    def route_distribution(self, origin_iata, destination_iata):
+        # Every fare seen for each departure date and currency, across all snapshots
+        rows = self._rows("fare_totals", origin_iata, destination_iata,
+                          ["departure_date", "currency", "snapshots", "offers", "min_fare", "max_fare", "sketch"])
+        return summarize(rows, ["departure_date", "currency"])
+
+def summarize(rows, keys):
+    if rows.empty:
+        return pd.DataFrame(columns=[*keys, "offers", "min_fare", "p10_fare", "median_fare", "p90_fare", "max_fare"])
+    # Sketches of the same group are merged by summing their bins, all groups at once
+    group_ids = rows.groupby(keys, sort=True).ngroup().to_numpy()
+    trend = rows.groupby(keys, sort=True).agg(offers=("offers", "sum"), min_fare=("min_fare", "min"),
+                                              max_fare=("max_fare", "max")).reset_index()
+    if "snapshots" in rows:
+        trend.insert(len(keys), "snapshots", rows.groupby(keys, sort=True)["snapshots"].max().values)
+    # Decoded in one pass over the concatenated blobs: entry j of a sketch with n entries has its bin at byte
+    # 2j and its count at byte 2n + 4j of that sketch
+    blobs = rows["sketch"].tolist()
+    sizes = np.array([len(blob) // 6 for blob in blobs], dtype="int64")
+    data = np.frombuffer(b"".join(blobs), dtype="uint8")
+    starts = np.concatenate(([0], np.cumsum(6 * sizes)[:-1]))
+    entry = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    bin_at = np.repeat(starts, sizes) + 2 * entry
+    count_at = np.repeat(starts + 2 * sizes, sizes) + 4 * entry
+    bins = data[bin_at].astype("int64") | data[bin_at + 1].astype("int64") << 8
+    weights = sum(data[count_at + byte].astype("int64") << 8 * byte for byte in range(4))
+    counts = np.bincount(np.repeat(group_ids, sizes) * SKETCH_BINS + bins, weights=weights,
+                         minlength=len(trend) * SKETCH_BINS).reshape(len(trend), SKETCH_BINS)
+    # Shifting each row's running counts above the previous row's makes the whole matrix one sorted array,
+    # so every group's quantile bin comes out of a single searchsorted
+    cumulative = counts.cumsum(axis=1)
+    shift = np.arange(len(trend)) * (cumulative[:, -1].max() + 1)
+    flat = (cumulative + shift[:, None]).ravel()
+    for quantile, column in zip(DISTRIBUTION_QUANTILES, ("p10_fare", "median_fare", "p90_fare")):
+        ranks = np.clip(np.ceil(quantile * cumulative[:, -1]), 1, None)
+        positions = np.searchsorted(flat, ranks + shift) - np.arange(len(trend)) * SKETCH_BINS
+        values = np.where(positions == OVERFLOW_BIN, trend["max_fare"], SKETCH_MIDPOINTS[positions])
+        trend[column] = np.clip(values, trend["min_fare"], trend["max_fare"]).round(2)
+    trend = trend[[*trend.columns[:-5], "min_fare", "p10_fare", "median_fare", "p90_fare", "max_fare"]]
+    if "snapshot_at" in trend:
+        trend["snapshot_at"] = pd.to_datetime(trend["snapshot_at"], unit="s")
+        # Change against the route's previous snapshot of the same departure date and currency
+        trend["median_change"] = trend.groupby(["departure_date", "currency"])["median_fare"].diff().round(2)
+    return trend
+
+def record_trends(store, flights_df, snapshot_at=None):
+    # Trends are a by-product of a run: a failure here is logged, never allowed to fail the run itself
+    if store is None:
+        return 0
+    try:
+        return store.record(flights_df, snapshot_at)
+    except Exception as e:
+        logger.error(f"Fare trend update failed for {store.db_path}: {str(e)}")
+        return 0
@@ -0,0 +1,200 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from .clients import get_http_session, get_weather_cache
+from .config import FORECAST_DAYS, MAX_CONCURRENT_WEATHER, OPENWEATHER_API_KEY, WEATHER_CELL_PRECISION
+from .fill import generate_ids
+from .metrics import instrumented, propagate, record_payload
+from .reference import get_airport_info
+from .schema import WEATHER_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+def weather_cell(lat, lon):
+    return (round(float(lat), WEATHER_CELL_PRECISION), round(float(lon), WEATHER_CELL_PRECISION))
+
+@instrumented
+def fetch_forecast_payload(lat, lon, api_key):
+    base_url = "https://api.openweathermap.org/data/2.5/forecast"
+    params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': api_key,
+        'units': 'metric'
+    }
+    response = get_http_session().get(base_url, params=params, timeout=30)
+    response.raise_for_status()
+    record_payload("fetch_forecast_payload", len(getattr(response, "content", None) or b""))
+    return response.json()
+
+WEATHER_MEAN_COLUMNS = {
+    "VISIBILITY": "visibility",
+    "WIND_SPEED": "wind.speed",
+    "WIND_GUST": "wind.gust",
+    "WIND_DIRECTION": "wind.deg",
+    "TEMPERATURE": "main.temp",
+    "PRESSURE": "main.pressure",
+    "HUMIDITY": "main.humidity",
+    "CLOUDINESS": "clouds.all"
+}
+
+def format_city_time(city, field):
+    tz_offset = city.get('timezone', 0)
+    return (datetime.fromtimestamp(city.get(field, 0), tz=timezone.utc) +
+            timedelta(seconds=tz_offset)).isoformat() if city.get(field) else ''
+
+@instrumented
+def aggregate_forecasts(payloads, departure_date, days=FORECAST_DAYS):
+    keys = list(payloads)
+    start_date = datetime.strptime(departure_date, "%Y-%m-%d")
+    target_dates = [(start_date + timedelta(days=day_offset)).strftime("%Y-%m-%d") for day_offset in range(days)]
+
+    entries = [payloads[key].get('list', []) for key in keys]
+    frame = pd.json_normalize([forecast for key_entries in entries for forecast in key_entries])
+    if not frame.empty:
+        frame['KEY'] = np.repeat(np.arange(len(keys)), [len(key_entries) for key_entries in entries])
+        frame['DATE'] = pd.to_datetime(frame['dt'], unit='s', utc=True).dt.strftime("%Y-%m-%d")
+        frame = frame[frame['DATE'].isin(target_dates)]
+
+    daily_means = {}
+    modal_descriptions = {}
+    daily_snow = {}
+    if not frame.empty:
+        means = pd.DataFrame({
+            column: pd.to_numeric(frame[source], errors='coerce') if source in frame.columns else np.nan
+            for column, source in WEATHER_MEAN_COLUMNS.items()
+        }, index=frame.index)
+        means[['KEY', 'DATE']] = frame[['KEY', 'DATE']]
+        daily_means = means.groupby(['KEY', 'DATE']).mean().to_dict('index')
+
+        descriptions = frame['weather'].str[0].str.get('description') if 'weather' in frame.columns else None
+        if descriptions is not None:
+            desc_counts = (frame.assign(DESC=descriptions).dropna(subset=['DESC'])
+                           .groupby(['KEY', 'DATE', 'DESC']).size().reset_index(name='COUNT'))
+            modal_descriptions = (desc_counts.sort_values('COUNT', ascending=False, kind='stable')
+                                  .drop_duplicates(['KEY', 'DATE'])
+                                  .set_index(['KEY', 'DATE'])['DESC'].to_dict())
+
+        if 'snow.3h' in frame.columns:
+            snow_frame = frame[['KEY', 'DATE', 'dt', 'snow.3h']]
+            snowy = snow_frame.groupby(['KEY', 'DATE'])['snow.3h'].transform('count') > 0
+            for group_key, group in snow_frame[snowy].groupby(['KEY', 'DATE']):
+                daily_snow[group_key] = json.dumps({
+                    int(dt): '' if pd.isna(amount) else amount
+                    for dt, amount in zip(group['dt'], group['snow.3h'])
+                })
+
+    results = {}
+    for key_idx, key in enumerate(keys):
+        city = payloads[key].get('city', {})
+        sunrise = format_city_time(city, 'sunrise')
+        sunset = format_city_time(city, 'sunset')
+        weather_records = []
+        for day_offset, target_date in enumerate(target_dates):
+            day_means = daily_means.get((key_idx, target_date))
+            if day_means is None:
+                logger.warning(f"No forecast data for {target_date} at {key}")
+                continue
+
+            weather_data = {"FETCH_TIMESTAMP": datetime.utcnow().isoformat()}
+            for column in ("VISIBILITY", "WIND_SPEED", "WIND_GUST", "WIND_DIRECTION"):
+                weather_data[column] = '' if pd.isna(day_means[column]) else str(day_means[column])
+            weather_data["RAIN"] = ''
+            weather_data["SNOW"] = daily_snow.get((key_idx, target_date), '')
+            weather_data["WEATHER_DESCRIPTION"] = modal_descriptions.get((key_idx, target_date), '')
+            for column in ("TEMPERATURE", "PRESSURE", "HUMIDITY", "CLOUDINESS"):
+                weather_data[column] = '' if pd.isna(day_means[column]) else str(day_means[column])
+            weather_data["SUNRISE"] = sunrise
+            weather_data["SUNSET"] = sunset
+            weather_data["EVENT_TIME"] = (start_date + timedelta(days=day_offset)).isoformat()
+            weather_data["DEPARTURE_DATE"] = target_date
+            weather_records.append(weather_data)
+        results[key] = weather_records
+    return results
+
+def get_forecast_payload(lat, lon, api_key):
+    cell_lat, cell_lon = weather_cell(lat, lon)
+    return get_weather_cache().get_or_load(
+        f"forecast:{cell_lat}:{cell_lon}",
+        lambda: fetch_forecast_payload(lat, lon, api_key)
+    )
+
+@instrumented
+def get_weather_forecast(lat, lon, api_key, departure_date, days=FORECAST_DAYS):
+    try:
+        forecast_data = get_forecast_payload(lat, lon, api_key)
+        return aggregate_forecasts({(lat, lon): forecast_data}, departure_date, days=days)[(lat, lon)]
+    except Exception as e:
+        logger.error(f"Weather forecast API error for lat={lat}, lon={lon}: {str(e)}")
+        return []
+
+def resolve_weather_locations(locations):
+    coords = {}
+    # Origin/Destination carry the search coordinates, so prefer them over stopover entries
+    for iata, lat, lon, loc_type in sorted(locations, key=lambda loc: loc[3] == "Stopover"):
+        if coords.get(iata) is None:
+            coords[iata] = (lat, lon) if lat is not None and lon is not None else None
+
+    for iata, latlon in coords.items():
+        if latlon is None:
+            airport = get_airport_info(iata)
+            if airport:
+                coords[iata] = (airport['geoCode']['latitude'], airport['geoCode']['longitude'])
+
+    return {iata: latlon for iata, latlon in coords.items() if latlon and latlon[0] and latlon[1]}
+
+def fetch_weather_for_locations(locations, api_key, departure_date, days=FORECAST_DAYS,
+                                max_workers=MAX_CONCURRENT_WEATHER):
+    cells = {}
+    for iata, (lat, lon) in locations.items():
+        cells.setdefault(weather_cell(lat, lon), []).append((iata, lat, lon))
+    if not cells:
+        return []
+
+    def fetch_cell(cell):
+        _, lat, lon = cells[cell][0]
+        try:
+            return cell, get_forecast_payload(lat, lon, api_key)
+        except Exception as e:
+            logger.error(f"Weather forecast API error for lat={lat}, lon={lon}: {str(e)}")
+            return cell, None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(cells)))) as executor:
+        payloads = {cell: payload for cell, payload in executor.map(propagate(fetch_cell), cells) if payload is not None}
+
+    try:
+        cell_records = aggregate_forecasts(payloads, departure_date, days=days)
+    except Exception as e:
+        logger.error(f"Weather forecast aggregation error: {str(e)}")
+        cell_records = {}
+
+    return [
+        (iata, lat, lon, [dict(record) for record in cell_records.get(cell, [])])
+        for cell, members in cells.items()
+        for iata, lat, lon in members
+    ]
+
+@instrumented
+def build_weather_frame(locations, origin_iata, destination_iata, departure_date, days=FORECAST_DAYS,
+                        api_key=OPENWEATHER_API_KEY):
+    weather_locations = resolve_weather_locations(locations)
+    weather_results = fetch_weather_for_locations(
+        weather_locations, api_key, departure_date.strftime("%Y-%m-%d"), days=days
+    )
+    weather_data = []
+    for iata, lat, lon, weather_records in weather_results:
+        location_ids = generate_ids(len(weather_records))
+        for location_id, record in zip(location_ids, weather_records):
+            record["LOCATION_ID"] = location_id
+            record["IATA_CODE"] = iata
+            record["LOCATION_TYPE"] = "Origin" if iata == origin_iata else "Destination" if iata == destination_iata else "Stopover"
+            record["LATITUDE"] = str(lat)
+            record["LONGITUDE"] = str(lon)
+            weather_data.append(record)
+
+    return pd.DataFrame(weather_data).reindex(columns=WEATHER_COLUMNS, fill_value='')
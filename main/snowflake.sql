@@ -26,11 +26,14 @@ CREATE or replace TABLE FLIGHT_INSIGHTS.PUBLIC.FLIGHTS (
     CHECKED_BAGS VARCHAR,
     BASE_PRICE VARCHAR,
     TOTAL_PRICE VARCHAR,
+    CURRENCY VARCHAR,
     FLIGHT_DISTANCE_KM VARCHAR,
     LAST_TICKETING_DATE VARCHAR,
     SEGMENT_CABIN_TYPE VARCHAR,
     SOURCE VARCHAR,
-    FARE_BASIS VARCHAR
+    FARE_BASIS VARCHAR,
+    DEPARTURE_DATE VARCHAR,
+    IS_SYNTHESIZED VARCHAR
 );
 
 CREATE or replace TABLE FLIGHT_INSIGHTS.PUBLIC.WEATHER (
@@ -54,44 +57,188 @@ CREATE or replace TABLE FLIGHT_INSIGHTS.PUBLIC.WEATHER (
     SUNRISE VARCHAR,
     SUNSET VARCHAR,
     EVENT_TIME VARCHAR,
-    DEPARTURE_DATE VARCHAR
+    DEPARTURE_DATE VARCHAR,
+    IS_SYNTHESIZED VARCHAR
+);
+
+-- Typed targets for OUTPUT_FORMAT=parquet runs; columns match FLIGHT_SCHEMA / WEATHER_SCHEMA in flightsight/schema.py
+CREATE OR REPLACE FILE FORMAT FLIGHT_INSIGHTS.PUBLIC.PARQUET_FORMAT
+    TYPE = PARQUET;
+
+CREATE or replace TABLE FLIGHT_INSIGHTS.PUBLIC.FLIGHTS_TYPED (
+    TRIP_ID VARCHAR,
+    FLIGHT_TYPE VARCHAR,
+    FLIGHT_NO VARCHAR,
+    CARRIER VARCHAR,
+    OPERATING_AIRLINE VARCHAR,
+    OPERATING_AIRLINE_NAME VARCHAR,
+    ORIGIN VARCHAR,
+    DESTINATION VARCHAR,
+    ORIGIN_CITY_NAME VARCHAR,
+    DESTINATION_CITY_NAME VARCHAR,
+    AIRPORT_NAME_ORIGIN VARCHAR,
+    AIRPORT_NAME_DESTINATION VARCHAR,
+    DEPARTURE TIMESTAMP_NTZ,
+    ARRIVAL TIMESTAMP_NTZ,
+    DURATION VARCHAR,
+    STOPS INTEGER,
+    AIRCRAFT_CODE VARCHAR,
+    AIRCRAFT_NAME VARCHAR,
+    CABIN VARCHAR,
+    BOOKING_CLASS VARCHAR,
+    FARE_CONDITIONS VARCHAR,
+    CHECKED_BAGS INTEGER,
+    BASE_PRICE NUMBER(12, 2),
+    TOTAL_PRICE NUMBER(12, 2),
+    CURRENCY VARCHAR,
+    FLIGHT_DISTANCE_KM FLOAT,
+    LAST_TICKETING_DATE DATE,
+    SEGMENT_CABIN_TYPE VARCHAR,
+    SOURCE VARCHAR,
+    FARE_BASIS VARCHAR,
+    DEPARTURE_DATE DATE,
+    IS_SYNTHESIZED BOOLEAN
+);
+
+CREATE or replace TABLE FLIGHT_INSIGHTS.PUBLIC.WEATHER_TYPED (
+    LOCATION_ID VARCHAR,
+    IATA_CODE VARCHAR,
+    LOCATION_TYPE VARCHAR,
+    LATITUDE FLOAT,
+    LONGITUDE FLOAT,
+    FETCH_TIMESTAMP TIMESTAMP_NTZ,
+    VISIBILITY FLOAT,
+    WIND_SPEED FLOAT,
+    WIND_GUST FLOAT,
+    WIND_DIRECTION FLOAT,
+    RAIN VARCHAR,
+    SNOW VARCHAR,
+    WEATHER_DESCRIPTION VARCHAR,
+    TEMPERATURE FLOAT,
+    PRESSURE FLOAT,
+    HUMIDITY FLOAT,
+    CLOUDINESS FLOAT,
+    SUNRISE TIMESTAMP_NTZ,
+    SUNSET TIMESTAMP_NTZ,
+    EVENT_TIME TIMESTAMP_NTZ,
+    DEPARTURE_DATE DATE,
+    IS_SYNTHESIZED BOOLEAN
+);
+
+-- Parquet columns load by name straight into the typed columns, no casting step
+-- COPY INTO FLIGHT_INSIGHTS.PUBLIC.FLIGHTS_TYPED FROM @<stage>/flight_data/
+--     PATTERN = '.*flights[.]parquet'
+--     FILE_FORMAT = (FORMAT_NAME = 'FLIGHT_INSIGHTS.PUBLIC.PARQUET_FORMAT')
+--     MATCH_BY_COLUMN_NAME = CASE_SENSITIVE;
+
+-- Star layout (--layout star / OUTPUT_LAYOUT=star); columns match the star schemas in flightsight/schema.py.
+-- Facts join on OFFER_KEY; dimension keys are the IATA code read as base 36 (plus one, 0 = no code), so the same
+-- code always gets the same key and AIRPORT_KEY etc. never need a lookup when loading. Codes that aren't IATA
+-- codes get negative keys hashed from the code.
+CREATE TABLE IF NOT EXISTS FLIGHT_INSIGHTS.PUBLIC.SEGMENTS (
+    OFFER_KEY BIGINT,
+    SEGMENT_NO INTEGER,
+    FLIGHT_NO VARCHAR,
+    CARRIER_KEY INTEGER,
+    OPERATING_AIRLINE_KEY INTEGER,
+    ORIGIN_AIRPORT_KEY INTEGER,
+    DESTINATION_AIRPORT_KEY INTEGER,
+    AIRCRAFT_KEY INTEGER,
+    DEPARTURE TIMESTAMP_NTZ,
+    ARRIVAL TIMESTAMP_NTZ,
+    DURATION VARCHAR,
+    CABIN VARCHAR,
+    BOOKING_CLASS VARCHAR,
+    FARE_CONDITIONS VARCHAR,
+    FARE_BASIS VARCHAR,
+    FLIGHT_DISTANCE_KM FLOAT
 );
 
 CREATE TABLE IF NOT EXISTS FLIGHT_INSIGHTS.PUBLIC.PRICING (
-    OFFER_ID VARCHAR,
-    BASE_FARE FLOAT,
-    TOTAL_FARE FLOAT,
+    OFFER_KEY BIGINT,
+    BASE_FARE NUMBER(12, 2),
+    TOTAL_FARE NUMBER(12, 2),
+    TAXES NUMBER(12, 2),
     CURRENCY VARCHAR,
-    TAXES VARCHAR,
-    FEES VARCHAR 
+    BOOKABLE_SEATS INTEGER,
+    LAST_TICKETING_DATE DATE,
+    SOURCE VARCHAR
 );
 
+-- TOTAL_DURATION is flying time (sum of segment durations), not elapsed time including connections
 CREATE TABLE IF NOT EXISTS FLIGHT_INSIGHTS.PUBLIC.ITINERARIES (
+    OFFER_KEY BIGINT,
     OFFER_ID VARCHAR,
     ITINERARY_TYPE VARCHAR,
     TOTAL_DURATION VARCHAR,
     NUMBER_OF_STOPS INTEGER,
-    DEPARTURE_AIRPORT VARCHAR,
-    ARRIVAL_AIRPORT VARCHAR,
-    TOTAL_PRICE FLOAT,
-    CURRENCY VARCHAR
+    DEPARTURE_AIRPORT_KEY INTEGER,
+    ARRIVAL_AIRPORT_KEY INTEGER,
+    DEPARTURE TIMESTAMP_NTZ,
+    ARRIVAL TIMESTAMP_NTZ,
+    TOTAL_PRICE NUMBER(12, 2),
+    DEPARTURE_DATE DATE,
+    IS_SYNTHESIZED BOOLEAN
 );
 
 CREATE TABLE IF NOT EXISTS FLIGHT_INSIGHTS.PUBLIC.AIRCRAFT (
+    AIRCRAFT_KEY INTEGER PRIMARY KEY,
     AIRCRAFT_CODE VARCHAR,
     AIRCRAFT_TYPE VARCHAR
 );
 
+CREATE TABLE IF NOT EXISTS FLIGHT_INSIGHTS.PUBLIC.AIRLINES (
+    AIRLINE_KEY INTEGER PRIMARY KEY,
+    CARRIER_CODE VARCHAR,
+    AIRLINE_NAME VARCHAR
+);
+
 CREATE TABLE IF NOT EXISTS FLIGHT_INSIGHTS.PUBLIC.AIRPORTS (
+    AIRPORT_KEY INTEGER PRIMARY KEY,
     AIRPORT_CODE VARCHAR,
     AIRPORT_NAME VARCHAR,
     CITY VARCHAR,
     COUNTRY VARCHAR,
     LATITUDE FLOAT,
-    LONGITUDE FLOAT,
-    LOCATION_TYPE VARCHAR
+    LONGITUDE FLOAT
 );
 
+-- Migrations for warehouses that already have the earlier PRICING, ITINERARIES, AIRCRAFT and AIRPORTS tables, which
+-- the CREATE ... IF NOT EXISTS statements above leave alone. Columns of the old layout (e.g. PRICING.OFFER_ID and
+-- FEES, ITINERARIES.CURRENCY, AIRPORTS.LOCATION_TYPE) are kept and stay NULL for star loads, so load these tables with
+-- MATCH_BY_COLUMN_NAME rather than by position.
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.PRICING ADD COLUMN IF NOT EXISTS OFFER_KEY BIGINT;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.PRICING ADD COLUMN IF NOT EXISTS BOOKABLE_SEATS INTEGER;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.PRICING ADD COLUMN IF NOT EXISTS LAST_TICKETING_DATE DATE;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.PRICING ADD COLUMN IF NOT EXISTS SOURCE VARCHAR;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.ITINERARIES ADD COLUMN IF NOT EXISTS OFFER_KEY BIGINT;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.ITINERARIES ADD COLUMN IF NOT EXISTS DEPARTURE_AIRPORT_KEY INTEGER;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.ITINERARIES ADD COLUMN IF NOT EXISTS ARRIVAL_AIRPORT_KEY INTEGER;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.ITINERARIES ADD COLUMN IF NOT EXISTS DEPARTURE TIMESTAMP_NTZ;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.ITINERARIES ADD COLUMN IF NOT EXISTS ARRIVAL TIMESTAMP_NTZ;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.ITINERARIES ADD COLUMN IF NOT EXISTS DEPARTURE_DATE DATE;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.ITINERARIES ADD COLUMN IF NOT EXISTS IS_SYNTHESIZED BOOLEAN;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.AIRCRAFT ADD COLUMN IF NOT EXISTS AIRCRAFT_KEY INTEGER;
+ALTER TABLE FLIGHT_INSIGHTS.PUBLIC.AIRPORTS ADD COLUMN IF NOT EXISTS AIRPORT_KEY INTEGER;
+-- Existing column types are not changed: on an old PRICING table BASE_FARE/TOTAL_FARE stay FLOAT and TAXES stays
+-- VARCHAR (the loaded values are plain decimals, so TAXES::NUMBER(12, 2) reads them back)
+
+-- Dimension files only carry rows that are new or changed since the last run (see --dimensions), and two
+-- routes running in parallel can both emit the same new row, so dimensions are upserted rather than appended
+-- MERGE INTO FLIGHT_INSIGHTS.PUBLIC.AIRPORTS T
+-- USING (SELECT $1:AIRPORT_KEY::INTEGER AIRPORT_KEY, $1:AIRPORT_CODE::VARCHAR AIRPORT_CODE,
+--               $1:AIRPORT_NAME::VARCHAR AIRPORT_NAME, $1:CITY::VARCHAR CITY, $1:COUNTRY::VARCHAR COUNTRY,
+--               $1:LATITUDE::FLOAT LATITUDE, $1:LONGITUDE::FLOAT LONGITUDE
+--        FROM @<stage>/flight_data/ (FILE_FORMAT => 'FLIGHT_INSIGHTS.PUBLIC.PARQUET_FORMAT',
+--                                    PATTERN => '.*airports[.]parquet')
+--        QUALIFY ROW_NUMBER() OVER (PARTITION BY AIRPORT_KEY ORDER BY METADATA$FILENAME DESC) = 1) S
+-- ON T.AIRPORT_KEY = S.AIRPORT_KEY
+-- WHEN MATCHED THEN UPDATE SET AIRPORT_NAME = S.AIRPORT_NAME, CITY = S.CITY, COUNTRY = S.COUNTRY,
+--                              LATITUDE = S.LATITUDE, LONGITUDE = S.LONGITUDE
+-- WHEN NOT MATCHED THEN INSERT (AIRPORT_KEY, AIRPORT_CODE, AIRPORT_NAME, CITY, COUNTRY, LATITUDE, LONGITUDE)
+--                      VALUES (S.AIRPORT_KEY, S.AIRPORT_CODE, S.AIRPORT_NAME, S.CITY, S.COUNTRY, S.LATITUDE,
+--                              S.LONGITUDE);
+
 SHOW SCHEMAS IN DATABASE flight_insights;
 
 SHOW GRANTS TO USER MASTER;
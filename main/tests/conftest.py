@@ -0,0 +1,35 @@
+import os
+import sys
+
+# Same as the benchmarks: the package is imported from the source tree, not an installed copy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import pytest
+
+from flightsight.schema import FLIGHT_COLUMNS, SYNTHESIZED_COLUMN
+
+def build_flights(prices=(100, 101, 102), days=("2025-06-13",), segments=1, origin="HYD", destination="CDG",
+                  carrier="AF", cabin="ECONOMY", currency="EUR", destination_city="Paris"):
+    # Every FLIGHT_COLUMNS column, one offer per price on each day; offers are lettered A, B, ... and their
+    # segments numbered from 1, so TRIP_ID is "<currency>-<letter>-<day>" and FLIGHT_NO "<letter><segment>"
+    rows = []
+    for day in days:
+        for i, price in enumerate(prices):
+            offer = chr(ord("A") + i) if i < 26 else f"O{i}"
+            for segment in range(1, segments + 1):
+                row = dict.fromkeys(FLIGHT_COLUMNS, "")
+                row.update({
+                    "TRIP_ID": f"{currency}-{offer}-{day}", "FLIGHT_NO": f"{offer}{segment}", "CARRIER": carrier,
+                    "ORIGIN": origin, "DESTINATION": destination, "DESTINATION_CITY_NAME": destination_city,
+                    "CABIN": cabin, "CURRENCY": currency, "STOPS": segments - 1, "DEPARTURE_DATE": day,
+                    "DEPARTURE": f"{day}T09:00:00", "ARRIVAL": f"{day}T15:00:00", "TOTAL_PRICE": f"{price:.2f}",
+                    SYNTHESIZED_COLUMN: False
+                })
+                rows.append(row)
+    return pd.DataFrame(rows, columns=FLIGHT_COLUMNS)
+
+@pytest.fixture
+def make_flights():
+    # Flight frames for the stage tests; call with keyword overrides of build_flights' defaults
+    return build_flights
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from flightsight.cache import ReferenceCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+def loader(value, calls):
+    def load():
+        calls.append(value)
+        return value
+    return load
+
+def test_entries_expire_after_their_ttl(clock):
+    cache, calls = ReferenceCache(maxsize=10, ttl=100, negative_ttl=10, clock=clock), []
+    cache.get_or_load("airport:HYD", loader({"iataCode": "HYD"}, calls))
+    cache.get_or_load("airport:XXX", loader(None, calls))
+    clock.now += 50
+    # The unknown code has passed its shorter negative TTL; the real airport has not
+    cache.get_or_load("airport:HYD", loader({"iataCode": "HYD"}, calls))
+    cache.get_or_load("airport:XXX", loader(None, calls))
+    assert calls == [{"iataCode": "HYD"}, None, None]
+    clock.now += 51
+    cache.get_or_load("airport:HYD", loader({"iataCode": "HYD"}, calls))
+    assert len(calls) == 4
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache, calls = ReferenceCache(maxsize=2, ttl=100, clock=clock), []
+    for code in ("A", "B", "A", "C"):
+        cache.get_or_load(code, loader(code, calls))
+    assert calls == ["A", "B", "C"]
+    # B was the least recently used when C arrived
+    cache.get_or_load("A", loader("A", calls))
+    cache.get_or_load("B", loader("B", calls))
+    assert calls == ["A", "B", "C", "B"]
+
+def test_counters(clock):
+    cache = ReferenceCache(maxsize=10, ttl=100, clock=clock)
+    for code in ("A", "A", "B", "A"):
+        cache.get_or_load(code, lambda: code)
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "size": 2}
+
+def test_entries_survive_a_reopen(tmp_path, clock):
+    db_path = str(tmp_path / "reference.sqlite")
+    ReferenceCache(ttl=100, db_path=db_path, clock=clock).get_or_load("airline:EK", lambda: "Emirates")
+    calls = []
+    reopened = ReferenceCache(ttl=100, db_path=db_path, clock=clock)
+    assert reopened.get_or_load("airline:EK", loader("other", calls)) == "Emirates"
+    assert calls == []
+    clock.now += 101
+    expired = ReferenceCache(ttl=100, db_path=db_path, clock=clock)
+    assert expired.get_or_load("airline:EK", loader("new", calls)) == "new"
+
+def test_concurrent_misses_share_one_load(clock):
+    cache, calls = ReferenceCache(ttl=100, clock=clock), []
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        calls.append("EK")
+        started.set()
+        release.wait(5)
+        return "Emirates"
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.get_or_load("airline:EK", slow)))
+    first.start()
+    started.wait(5)
+    others = [threading.Thread(target=lambda: results.append(cache.get_or_load("airline:EK", slow)))
+              for _ in range(4)]
+    for thread in others:
+        thread.start()
+    # Let the load finish only once every other caller is waiting on it
+    deadline = time.monotonic() + 5
+    while cache.stats()["hits"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in [first, *others]:
+        thread.join()
+    assert calls == ["EK"]
+    assert results == ["Emirates"] * 5
+    assert cache.stats()["misses"] == 1
+
+def test_failed_loads_are_not_cached(clock):
+    cache = ReferenceCache(ttl=100, clock=clock)
+
+    def fail():
+        raise RuntimeError("timeout")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("airline:EK", fail)
+    assert cache.get_or_load("airline:EK", lambda: "Emirates") == "Emirates"
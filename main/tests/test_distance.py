@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+import pytest
+
+from flightsight import distance
+from flightsight.distance import AirportPairTable, distance_km
+
+def dms(degrees, minutes, seconds):
+    return math.copysign(abs(degrees) + minutes / 60 + seconds / 3600, degrees)
+
+# Vincenty's own test line (Flinders Peak to Buninyong), a WGS-84 meridian quadrant and a quarter of the equator;
+# the spherical distances use the mean Earth radius
+FLINDERS_PEAK = (dms(-37, 57, 3.72030), dms(144, 25, 29.52440))
+BUNINYONG = (dms(-37, 39, 10.15610), dms(143, 55, 35.38390))
+
+@pytest.mark.parametrize("start, end, ellipsoidal, haversine", [
+    (FLINDERS_PEAK, BUNINYONG, 54.972271, 54.925508),
+    ((0, 0), (90, 0), 10001.965729, 10007.557221),
+    ((0, 0), (0, 90), 10018.754171, 10007.557221),
+])
+def test_known_distances(start, end, ellipsoidal, haversine):
+    lat1, lon1, lat2, lon2 = ([value] for value in (*start, *end))
+    assert distance_km(lat1, lon1, lat2, lon2, model="ellipsoidal")[0] == pytest.approx(ellipsoidal, abs=1e-5)
+    assert distance_km(lat1, lon1, lat2, lon2, model="haversine")[0] == pytest.approx(haversine, abs=1e-5)
+
+def test_nearly_antipodal_pairs_fall_back_to_the_sphere():
+    result = distance_km([0.0], [0.0], [0.5], [179.7], model="ellipsoidal")[0]
+    assert result == pytest.approx(distance_km([0.0], [0.0], [0.5], [179.7], model="haversine")[0])
+
+@pytest.fixture
+def caches(monkeypatch):
+    counts = {"hits": 0, "misses": 0}
+
+    def record_cache(cache, hits=0, misses=0):
+        counts["hits"] += hits
+        counts["misses"] += misses
+
+    monkeypatch.setattr(distance, "record_cache", record_cache)
+    return counts
+
+def test_missing_coordinates_give_nan(caches):
+    table = AirportPairTable(model="haversine")
+    result = table.lookup(["HYD", "XXX"], ["CDG", "CDG"], [17.24, np.nan], [78.43, np.nan], [49.01, 49.01],
+                          [2.55, 2.55])
+    assert not math.isnan(result[0]) and math.isnan(result[1])
+    assert caches == {"hits": 0, "misses": 1}
+    assert len(table) == 1
+
+def test_repeat_pairs_are_hits(caches):
+    table = AirportPairTable(model="haversine")
+    first = table.lookup(["HYD", "HYD"], ["CDG", "CDG"], [17.24] * 2, [78.43] * 2, [49.01] * 2, [2.55] * 2)
+    assert caches == {"hits": 1, "misses": 1}
+    # Known pairs need no coordinates
+    again = table.lookup(["HYD"], ["CDG"], [np.nan], [np.nan], [np.nan], [np.nan])
+    assert caches == {"hits": 2, "misses": 1}
+    assert again[0] == first[0] == first[1]
+
+def test_least_recently_used_pairs_are_evicted():
+    table = AirportPairTable(model="haversine", max_pairs=2)
+    for origin in ("AAA", "BBB"):
+        table.lookup([origin], ["CDG"], [1.0], [1.0], [2.0], [2.0])
+    table.lookup(["AAA"], ["CDG"], [np.nan], [np.nan], [np.nan], [np.nan])
+    table.lookup(["CCC"], ["CDG"], [1.0], [1.0], [2.0], [2.0])
+    assert len(table) == 2
+    assert math.isnan(table.lookup(["BBB"], ["CDG"], [np.nan], [np.nan], [np.nan], [np.nan])[0])
+    assert not math.isnan(table.lookup(["AAA"], ["CDG"], [np.nan], [np.nan], [np.nan], [np.nan])[0])
@@ -0,0 +1,66 @@
+from datetime import date
+
+import pandas as pd
+
+from flightsight.fill import fill_missing_dates, fill_missing_flights, fill_missing_weather
+from flightsight.schema import SYNTHESIZED_COLUMN
+
+START = date(2025, 6, 13)
+
+# Two offers of two segments each per real day
+OFFERS = {"prices": (100, 200), "segments": 2}
+
+def test_missing_days_copy_the_latest_earlier_day(make_flights):
+    filled = fill_missing_flights(make_flights(days=("2025-06-13", "2025-06-15"), **OFFERS), START, days=5)
+    by_date = filled.groupby("DEPARTURE_DATE")
+    assert by_date.size().to_dict() == {day: 4 for day in
+                                        ("2025-06-13", "2025-06-14", "2025-06-15", "2025-06-16", "2025-06-17")}
+    synthesized = by_date[SYNTHESIZED_COLUMN].all().to_dict()
+    assert synthesized == {"2025-06-13": False, "2025-06-14": True, "2025-06-15": False, "2025-06-16": True,
+                           "2025-06-17": True}
+    # The 14th is a copy of the 13th, the 16th and 17th of the 15th
+    assert filled.loc[filled["DEPARTURE_DATE"] == "2025-06-14", "FLIGHT_NO"].tolist() == ["A1", "A2", "B1", "B2"]
+
+def test_copied_offers_get_new_ids_shared_by_their_segments(make_flights):
+    filled = fill_missing_flights(make_flights(days=("2025-06-13",), **OFFERS), START, days=3)
+    real = filled[~filled[SYNTHESIZED_COLUMN]]
+    assert real["TRIP_ID"].tolist() == ["EUR-A-2025-06-13", "EUR-A-2025-06-13", "EUR-B-2025-06-13", "EUR-B-2025-06-13"]
+    copies = filled[filled[SYNTHESIZED_COLUMN]]
+    assert copies.groupby("DEPARTURE_DATE")["TRIP_ID"].nunique().tolist() == [2, 2]
+    # Segments of one copied offer share its new ID, and no ID is reused across days or from the source
+    per_offer = copies.groupby("TRIP_ID")["FLIGHT_NO"].apply(list)
+    assert sorted(per_offer.tolist()) == [["A1", "A2"]] * 2 + [["B1", "B2"]] * 2
+    assert not set(copies["TRIP_ID"]) & set(real["TRIP_ID"])
+
+def test_days_before_any_data_are_left_empty(make_flights):
+    filled = fill_missing_flights(make_flights(days=("2025-06-15",), **OFFERS), START, days=4)
+    assert sorted(filled["DEPARTURE_DATE"].unique()) == ["2025-06-15", "2025-06-16"]
+
+def test_rows_outside_the_horizon_are_dropped(make_flights):
+    filled = fill_missing_flights(make_flights(days=("2025-06-12", "2025-06-13"), **OFFERS), START, days=2)
+    assert sorted(filled["DEPARTURE_DATE"].unique()) == ["2025-06-13", "2025-06-14"]
+
+def test_weather_fills_each_airport_on_its_own():
+    weather = pd.DataFrame([
+        {"LOCATION_ID": "h1", "IATA_CODE": "HYD", "EVENT_TIME": "2025-06-13T09:00:00", "TEMPERATURE": 30,
+         "DEPARTURE_DATE": "2025-06-13"},
+        {"LOCATION_ID": "c1", "IATA_CODE": "CDG", "EVENT_TIME": "2025-06-13T09:00:00", "TEMPERATURE": 18,
+         "DEPARTURE_DATE": "2025-06-13"},
+        {"LOCATION_ID": "c2", "IATA_CODE": "CDG", "EVENT_TIME": "2025-06-14T09:00:00", "TEMPERATURE": 20,
+         "DEPARTURE_DATE": "2025-06-14"},
+    ])
+    filled = fill_missing_weather(weather, START, ["HYD", "CDG", "DXB"], days=2)
+    cells = filled.set_index(["IATA_CODE", "DEPARTURE_DATE"])
+    assert sorted(cells.index) == [("CDG", "2025-06-13"), ("CDG", "2025-06-14"), ("HYD", "2025-06-13"),
+                                   ("HYD", "2025-06-14")]
+    hyd = cells.loc[("HYD", "2025-06-14")]
+    assert bool(hyd[SYNTHESIZED_COLUMN]) and hyd["TEMPERATURE"] == 30
+    # Timestamps of copied rows move to the day they fill
+    assert hyd["EVENT_TIME"] == "2025-06-14T00:00:00"
+    assert not bool(cells.loc[("CDG", "2025-06-14")][SYNTHESIZED_COLUMN])
+
+def test_nothing_to_fill_keeps_the_frame_and_flags_it_real():
+    df = pd.DataFrame({"TRIP_ID": ["x"], "DEPARTURE_DATE": ["2025-07-01"]})
+    filled = fill_missing_dates(df, START, "TRIP_ID", days=2)
+    assert filled["TRIP_ID"].tolist() == ["x"]
+    assert filled[SYNTHESIZED_COLUMN].tolist() == [False]
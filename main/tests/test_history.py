@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import time
+
+from flightsight import history
+from flightsight.history import COMPACT_LOCK, HistoryStore, single_snapshot_files
+
+DIRECTORY = os.path.join("route=HYD-CDG", "departure_date=2025-06-13")
+
+def fill(path, runs, flights):
+    store = HistoryStore(str(path), compact_files=0)
+    for run in range(runs):
+        store.append(flights, snapshot_at=1000.0 + run)
+    return os.path.join(str(path), DIRECTORY)
+
+def compact_partition(directory):
+    HistoryStore(os.path.dirname(os.path.dirname(directory))).compact(directory)
+
+def test_compaction_merges_every_run(tmp_path, make_flights):
+    directory = fill(tmp_path, 5, make_flights())
+    HistoryStore(str(tmp_path)).compact(directory)
+    assert single_snapshot_files(directory) == []
+    assert len(HistoryStore(str(tmp_path)).query("HYD", "CDG")) == 15
+    assert not os.path.exists(os.path.join(directory, COMPACT_LOCK))
+
+def test_held_lock_skips_compaction(tmp_path, make_flights):
+    directory = fill(tmp_path, 5, make_flights())
+    open(os.path.join(directory, COMPACT_LOCK), "w").close()
+    HistoryStore(str(tmp_path)).compact(directory)
+    assert len(single_snapshot_files(directory)) == 5
+
+def test_stale_lock_is_taken_over(tmp_path, make_flights):
+    directory = fill(tmp_path, 5, make_flights())
+    lock_path = os.path.join(directory, COMPACT_LOCK)
+    open(lock_path, "w").close()
+    stale = time.time() - history.COMPACT_LOCK_STALE_SECONDS - 60
+    os.utime(lock_path, (stale, stale))
+    HistoryStore(str(tmp_path)).compact(directory)
+    assert single_snapshot_files(directory) == []
+    assert not os.path.exists(lock_path)
+
+def test_late_takeover_leaves_the_new_lock(tmp_path):
+    # A second process saw the same stale lock, but only gets to take it over after the first one replaced it
+    lock_path = str(tmp_path / COMPACT_LOCK)
+    open(lock_path, "w").close()
+    stale = time.time() - history.COMPACT_LOCK_STALE_SECONDS - 60
+    os.utime(lock_path, (stale, stale))
+    seen = os.stat(lock_path)
+    with history.compaction_lock(str(tmp_path)) as acquired:
+        assert acquired
+        held = os.stat(lock_path)
+        assert not history.take_over_stale_lock(lock_path, seen)
+        assert (os.stat(lock_path).st_ino, os.stat(lock_path).st_mtime_ns) == (held.st_ino, held.st_mtime_ns)
+    assert os.listdir(tmp_path) == []
+
+def test_concurrent_compactions_keep_each_row_once(tmp_path, make_flights):
+    directory = fill(tmp_path, 40, make_flights())
+    workers = [multiprocessing.get_context("spawn").Process(target=compact_partition, args=(directory,))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+    # A skipped worker leaves its sources to the next append, so finish the partition here
+    HistoryStore(str(tmp_path)).compact(directory)
+    assert len(HistoryStore(str(tmp_path)).query("HYD", "CDG")) == 40 * 3
+
+def test_query_survives_a_compaction_after_listing(tmp_path, monkeypatch, make_flights):
+    directory = fill(tmp_path, 5, make_flights())
+    store = HistoryStore(str(tmp_path))
+    listed = store._files
+
+    def files_then_compact(*args):
+        files = listed(*args)
+        if single_snapshot_files(directory):
+            store.compact(directory)
+        return files
+
+    monkeypatch.setattr(store, "_files", files_then_compact)
+    assert len(store.query("HYD", "CDG")) == 15
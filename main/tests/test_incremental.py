@@ -0,0 +1,126 @@
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from flightsight import incremental
+from flightsight.incremental import Manifest, content_hash, contiguous_runs, manifest_key, refresh_route
+from flightsight.schema import SYNTHESIZED_COLUMN
+
+START = date(2025, 6, 13)
+ORIGIN, DESTINATION = {"iata": "HYD"}, {"iata": "CDG"}
+
+def day(offset):
+    return START + timedelta(days=offset)
+
+def key(offset):
+    return manifest_key("HYD", "CDG", day(offset))
+
+class FakeSearch:
+    # Stands in for run_search: every day gets the same offers and weather unless its search is set to fail or
+    # its offers to be copies from the day before
+    def __init__(self, make_flights):
+        self.make_flights = make_flights
+        self.calls, self.failed, self.synthesized = [], set(), set()
+
+    def frames(self, current_date):
+        date_str = current_date.strftime("%Y-%m-%d")
+        flights = self.make_flights(days=(date_str,)).assign(TRIP_ID=f"trip-{date_str}")
+        flights[SYNTHESIZED_COLUMN] = current_date in self.synthesized
+        return flights, pd.DataFrame({"IATA_CODE": ["HYD"], "TEMPERATURE": [31.5], "DEPARTURE_DATE": [date_str]})
+
+    def __call__(self, origin, destination, departure_date, days, output_format):
+        self.calls.append((departure_date, days))
+        run = [departure_date + timedelta(days=offset) for offset in range(days)]
+        kept = [current_date for current_date in run if current_date not in self.failed]
+        frames = [self.frames(current_date) for current_date in kept]
+        flights = pd.concat([flights for flights, _ in frames], ignore_index=True)
+        weather = pd.concat([weather for _, weather in frames], ignore_index=True)
+        results = [(current_date, 0 if current_date in self.failed else 3,
+                    RuntimeError("500") if current_date in self.failed else None) for current_date in run]
+        return flights, weather, results
+
+@pytest.fixture
+def search(monkeypatch, make_flights):
+    fake = FakeSearch(make_flights)
+    monkeypatch.setattr(incremental, "run_search", fake)
+    return fake
+
+@pytest.fixture
+def stored(monkeypatch):
+    # Records what refresh_route writes; keys listed in failing come back with an error
+    stored = {"results": [], "failing": set()}
+
+    def store_datasets(results, output_dir=None):
+        for result in results:
+            result["error"] = "AccessDenied" if result["manifest_key"] in stored["failing"] else None
+        stored["results"].extend(results)
+        return results
+
+    monkeypatch.setattr(incremental, "store_datasets", store_datasets)
+    return stored
+
+def refresh(entries, days=5):
+    return refresh_route(ORIGIN, DESTINATION, START, entries, days=days, compression="none", output_format="csv")
+
+def written(stored):
+    return sorted((result["manifest_key"], result["table"]) for result in stored["results"])
+
+def test_contiguous_runs():
+    days = [day(offset) for offset in (0, 1, 3, 5, 6, 7)]
+    assert contiguous_runs(days) == [days[:2], days[2:3], days[3:]]
+    assert contiguous_runs([]) == []
+
+def test_only_stale_runs_are_searched(search, stored):
+    # The middle three of five days were fetched just now
+    fresh = {key(offset): {"fetched_at": time.time(), "hashes": {}} for offset in (1, 2, 3)}
+    results, updates, day_results = refresh(fresh)
+    assert search.calls == [(day(0), 1), (day(4), 1)]
+    assert [current_date for current_date, _, _ in day_results] == [day(0), day(4)]
+    assert sorted(updates) == [key(0), key(4)]
+    assert written(stored) == [(key(0), "flights"), (key(0), "weather"), (key(4), "flights"), (key(4), "weather")]
+
+def test_unchanged_tables_are_not_written_again(search, stored):
+    flights, weather = search.frames(day(0))
+    # Stale by age, but the flights come back identical (TRIP_ID aside) and only the weather changed
+    entries = {key(0): {"fetched_at": 0, "hashes": {"flights": content_hash(flights.assign(TRIP_ID="old")),
+                                                     "weather": "different"}}}
+    _, updates, _ = refresh(entries, days=1)
+    assert written(stored) == [(key(0), "weather")]
+    assert updates[key(0)]["hashes"] == {"flights": content_hash(flights), "weather": content_hash(weather)}
+
+def test_failed_writes_keep_the_day_stale(search, stored):
+    stored["failing"] = {key(1)}
+    results, updates, _ = refresh({}, days=3)
+    assert [result["manifest_key"] for result in results if result["error"]] == [key(1), key(1)]
+    assert sorted(updates) == [key(0), key(2)]
+
+def test_failed_searches_are_left_out(search, stored):
+    search.failed = {day(1)}
+    _, updates, day_results = refresh({}, days=3)
+    assert [error is not None for _, _, error in day_results] == [False, True, False]
+    assert sorted(updates) == [key(0), key(2)]
+    assert key(1) not in {result["manifest_key"] for result in stored["results"]}
+
+def test_copied_days_are_written_but_stay_stale(search, stored):
+    search.synthesized = {day(1)}
+    _, updates, _ = refresh({}, days=3)
+    assert (key(1), "flights") in written(stored)
+    assert sorted(updates) == [key(0), key(2)]
+
+def test_manifest_round_trips(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = Manifest(path)
+    assert manifest.entries == {}
+    manifest.update({key(0): {"fetched_at": 1000.0, "hashes": {"flights": "abc"}},
+                     manifest_key("HYD", "DXB", START): {"fetched_at": 2000.0, "hashes": {}}})
+    manifest.save()
+    reopened = Manifest(path)
+    assert reopened.entries == manifest.entries
+    assert list(reopened.route_entries("HYD", "CDG")) == [key(0)]
+
+def test_unreadable_manifest_starts_empty(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text("{not json")
+    assert Manifest(str(path)).entries == {}
@@ -0,0 +1,85 @@
+import copy
+import json
+import os
+from datetime import date
+
+import pytest
+
+from flightsight.distance import AirportPairTable
+from flightsight.offers import flatten_offers
+from flightsight.schema import FLIGHT_COLUMNS, SYNTHESIZED_COLUMN
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+DAY = date(2025, 6, 13)
+
+AIRPORTS = {
+    "HYD": {"name": "RAJIV GANDHI INTL", "address": {"cityName": "HYDERABAD"},
+            "geoCode": {"latitude": 17.2403, "longitude": 78.4294}},
+    "DXB": {"name": "DUBAI INTL", "address": {"cityName": "DUBAI"},
+            "geoCode": {"latitude": 25.2528, "longitude": 55.3644}},
+    "CDG": {"name": "CHARLES DE GAULLE", "address": {"cityName": "PARIS"},
+            "geoCode": {"latitude": 49.0097, "longitude": 2.5479}}
+}
+
+@pytest.fixture(scope="module")
+def offers():
+    # The recorded Amadeus response the benchmarks replay: four one-stop HYD-DXB-CDG offers
+    with open(os.path.join(FIXTURES_DIR, "flight_offers.json")) as f:
+        return json.load(f)["data"]
+
+def flatten(day_offers, lookups=None):
+    def airport_lookup(code):
+        if lookups is not None:
+            lookups.append(code)
+        return AIRPORTS.get(code)
+    return flatten_offers(day_offers, airport_lookup=airport_lookup, airline_lookup=lambda code: f"{code} AIRLINE",
+                          distance_table=AirportPairTable())
+
+def test_one_row_per_segment_in_flight_columns(offers):
+    flights, locations = flatten([(DAY, offers)])
+    assert list(flights.columns) == FLIGHT_COLUMNS
+    assert len(flights) == sum(len(itinerary["segments"]) for offer in offers for itinerary in offer["itineraries"])
+    assert flights["TRIP_ID"].nunique() == len(offers)
+    assert flights.groupby("TRIP_ID", sort=False).size().tolist() == [2] * len(offers)
+    assert flights["ORIGIN"].tolist()[:2] == ["HYD", "DXB"] and flights["DESTINATION"].tolist()[:2] == ["DXB", "CDG"]
+    assert set(flights["STOPS"]) == {"1"}
+    assert set(flights["DEPARTURE_DATE"]) == {"2025-06-13"}
+    assert not flights[SYNTHESIZED_COLUMN].any()
+    assert {location[0] for location in locations} == {"HYD", "DXB", "CDG"}
+
+def test_offer_values_repeat_on_each_segment(offers):
+    flights, _ = flatten([(DAY, offers)])
+    first = flights[flights["TRIP_ID"] == flights["TRIP_ID"].iloc[0]]
+    assert first["TOTAL_PRICE"].tolist() == [offers[0]["price"]["grandTotal"]] * 2
+    assert first["BASE_PRICE"].tolist() == [offers[0]["price"]["base"]] * 2
+    assert first["OPERATING_AIRLINE_NAME"].tolist() == ["EK AIRLINE"] * 2
+    assert first["ORIGIN_CITY_NAME"].tolist() == ["HYDERABAD", "DUBAI"]
+    # HYD-DXB is about 2,600 km great-circle
+    assert 2500 < first["FLIGHT_DISTANCE_KM"].iloc[0] < 2700
+
+def test_fare_details_are_matched_by_segment_id(offers):
+    offer = copy.deepcopy(offers[0])
+    details = offer["travelerPricings"][0]["fareDetailsBySegment"]
+    details[0].update(cabin="BUSINESS", fareBasis="FIRSTLEG", **{"class": "J"})
+    details[1].update(cabin="ECONOMY", fareBasis="SECONDLEG", **{"class": "Y"})
+    # Listed out of segment order, as Amadeus is free to do
+    details.reverse()
+    flights, _ = flatten([(DAY, [offer])])
+    assert flights["FARE_BASIS"].tolist() == ["FIRSTLEG", "SECONDLEG"]
+    assert flights["CABIN"].tolist() == ["BUSINESS", "ECONOMY"]
+    assert flights["BOOKING_CLASS"].tolist() == ["J", "Y"]
+
+def test_each_airport_is_looked_up_once_per_batch(offers):
+    lookups = []
+    flatten([(DAY, offers), (date(2025, 6, 14), offers)], lookups)
+    assert sorted(lookups) == ["CDG", "DXB", "HYD"]
+
+def test_days_get_their_own_trip_ids(offers):
+    flights, _ = flatten([(DAY, offers), (date(2025, 6, 14), offers)])
+    by_day = flights.groupby("DEPARTURE_DATE")["TRIP_ID"].apply(set)
+    assert len(by_day) == 2 and not by_day.iloc[0] & by_day.iloc[1]
+
+def test_no_offers_gives_an_empty_frame_with_all_columns():
+    flights, locations = flatten([(DAY, [])])
+    assert flights.empty and list(flights.columns) == FLIGHT_COLUMNS
+    assert locations == set()
@@ -0,0 +1,93 @@
+import types
+
+import pytest
+
+from flightsight import reference
+from flightsight.cache import ReferenceCache
+from flightsight.clients import get_reference_index
+
+class FakeLocations:
+    def __init__(self, data):
+        self.data = data
+        self.keywords = []
+
+    def get(self, keyword, subType, page):
+        self.keywords.append(keyword)
+        return types.SimpleNamespace(data=self.data)
+
+def api_location(iata, city, country):
+    return {"iataCode": iata, "name": f"{city} Airport", "subType": "AIRPORT",
+            "address": {"cityName": city, "countryName": country}, "geoCode": {"latitude": 1.0, "longitude": 2.0}}
+
+@pytest.fixture
+def locations(monkeypatch):
+    fake = FakeLocations([])
+    client = types.SimpleNamespace(reference_data=types.SimpleNamespace(locations=fake))
+    monkeypatch.setattr(reference, "get_amadeus_client", lambda: client)
+    return fake
+
+@pytest.mark.parametrize("query, wrong", [("Malta", "MAA"), ("Cork", "COK"), ("Bari", "HAN")])
+def test_no_close_match_on_codes_or_short_words(query, wrong):
+    index = get_reference_index()
+    assert index.search(query) == []
+    assert wrong not in [location["iata"] for location in index.suggest(query)]
+
+@pytest.mark.parametrize("query, expected", [("hyderbad", "HYD"), ("frankfrut", "FRA"), ("Dubia", "DXB")])
+def test_suggest_whole_names(query, expected):
+    assert expected in [location["iata"] for location in get_reference_index().suggest(query)]
+
+@pytest.mark.parametrize("query, iata, city, country", [("Malta", "MLA", "Luqa", "Malta"),
+                                                         ("Cork", "ORK", "Cork", "Ireland"),
+                                                         ("Bari", "BRI", "Bari", "Italy")])
+def test_index_miss_asks_the_api(locations, query, iata, city, country):
+    locations.data = [api_location(iata, city, country)]
+    results = reference.search_locations(query)
+    assert locations.keywords == [query]
+    assert [location["iata"] for location in results] == [iata]
+
+def test_suggestions_follow_api_results(locations):
+    locations.data = [api_location("HDD", "Hyderabad", "Pakistan")]
+    results = [location["iata"] for location in reference.search_locations("hyderbad")]
+    assert locations.keywords == ["hyderbad"]
+    assert results == ["HDD", "HYD"]
+
+def test_iata_code_hit_skips_the_api(locations):
+    results = reference.search_locations("hyd")
+    assert locations.keywords == []
+    assert results[0]["iata"] == "HYD"
+
+@pytest.mark.parametrize("query, expected", [("Hyder", [("HYD", "AIRPORT")]),
+                                             ("Par", [("PAR", "CITY"), ("CDG", "AIRPORT"), ("ORY", "AIRPORT")])])
+def test_city_prefix_hit_skips_the_api(locations, query, expected):
+    results = reference.search_locations(query)
+    assert locations.keywords == []
+    assert [(location["iata"], location["type"]) for location in results] == expected
+
+def test_api_error_is_reported(monkeypatch, locations):
+    from amadeus import ResponseError
+
+    def fail(keyword, subType, page):
+        raise ResponseError(types.SimpleNamespace(status_code=500, parsed=False, result=None, data=None))
+    monkeypatch.setattr(locations, "get", fail)
+    errors = []
+    assert reference.search_locations("Cork", on_error=errors.append) == []
+    assert len(errors) == 1
+
+def test_suggest_skips_keys_of_distant_length():
+    assert get_reference_index().suggest("hyderabadxxxxxxxx") == []
+
+@pytest.mark.parametrize("data, name, cached", [
+    ([{"iataCode": "ZZ", "businessName": "Zed Air", "commonName": "ZED"}], "Zed Air", "Zed Air"),
+    ([{"iataCode": "ZZ", "commonName": "ZED"}], "ZED", "ZED"),
+    ([{"iataCode": "ZZ"}], "ZZ", "ZZ"),
+    ([], "ZZ", None),
+])
+def test_airline_names_fall_back_to_the_common_name(monkeypatch, data, name, cached):
+    airlines = types.SimpleNamespace(get=lambda airlineCodes: types.SimpleNamespace(data=data))
+    client = types.SimpleNamespace(reference_data=types.SimpleNamespace(airlines=airlines))
+    cache = ReferenceCache()
+    monkeypatch.setattr(reference, "get_amadeus_client", lambda: client)
+    monkeypatch.setattr(reference, "get_reference_cache", lambda: cache)
+    assert reference.get_airline_name("ZZ") == name
+    # Only a code the API returned nothing for is cached as unknown
+    assert cache._entries["airline:ZZ"][1] == cached
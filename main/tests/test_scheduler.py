@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from amadeus import Client, ResponseError
+
+from flightsight import scheduler
+from flightsight.scheduler import BATCH, INTERACTIVE, AmadeusScheduler, request_priority
+
+class FakeAmadeusServer(ThreadingHTTPServer):
+    # Answers the token and flight-offer endpoints; offer searches get the queued (status, headers) replies in
+    # turn, then 200s, and every search is logged with the time it arrived
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeAmadeusHandler)
+        self.replies = []
+        self.searches = []
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+class FakeAmadeusHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/vnd.amadeus+json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.reply(200, {"access_token": "token", "expires_in": 1799})
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.searches.append((time.monotonic(), self.path))
+            status, headers = server.replies.pop(0) if server.replies else (200, {})
+        time.sleep(server.delay)
+        if status == 200:
+            self.reply(200, {"data": [{"id": "1", "price": {"grandTotal": "100.00"}}]})
+        else:
+            self.reply(status, {"errors": [{"status": status, "code": 38194, "title": "Too many requests"}]},
+                       headers)
+
+class FakeClock:
+    # Time only moves when the scheduler sleeps; every sleep is recorded
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def server():
+    fake = FakeAmadeusServer()
+    thread = threading.Thread(target=fake.serve_forever, daemon=True)
+    thread.start()
+    yield fake
+    fake.shutdown()
+    fake.server_close()
+
+@pytest.fixture
+def client(server):
+    return Client(client_id="id", client_secret="secret", host="127.0.0.1", port=server.server_address[1],
+                  ssl=False, log_level="silent")
+
+def search(client, destination="CDG"):
+    return lambda: client.shopping.flight_offers_search.get(
+        originLocationCode="HYD", destinationLocationCode=destination, departureDate="2025-06-13", adults=1, max=1
+    )
+
+def test_retry_after_is_honoured(server, client):
+    server.replies = [(429, {"Retry-After": "0.3"}), (429, {"Retry-After": "0.3"})]
+    response = AmadeusScheduler(rate=100, burst=10, max_retries=4).call("search", search(client))
+    assert response.data[0]["id"] == "1"
+    times = [arrived for arrived, _ in server.searches]
+    assert len(times) == 3
+    assert all(later - earlier >= 0.3 for earlier, later in zip(times, times[1:]))
+
+def test_backoff_is_capped_jitter_without_retry_after(server, client, monkeypatch):
+    # Full jitter draws from [0, min(backoff_max, base * 2 ** attempt)]; taking the top of the range pins it
+    bounds = []
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: bounds.append((low, high)) or high)
+    server.replies = [(429, {})] * 3
+    clock = FakeClock()
+    AmadeusScheduler(rate=100, burst=10, max_retries=4, backoff_base=0.05, backoff_max=0.15, clock=clock,
+                     sleep=clock.sleep).call("search", search(client))
+    assert bounds == [(0, 0.05), (0, 0.1), (0, 0.15)]
+    # The 429 empties the bucket, but at 100 per second the pause has refilled it, so backoffs are the only sleeps
+    assert clock.sleeps == [0.05, 0.1, 0.15]
+    assert len(server.searches) == 4
+
+def test_persistent_429_raises_the_response_error(server, client):
+    server.replies = [(429, {"Retry-After": "0"})] * 10
+    with pytest.raises(ResponseError) as error:
+        AmadeusScheduler(rate=100, burst=10, max_retries=2).call("search", search(client))
+    assert error.value.response.status_code == 429
+    assert len(server.searches) == 3
+
+def test_client_errors_are_not_retried(server, client):
+    server.replies = [(400, {})]
+    with pytest.raises(ResponseError):
+        AmadeusScheduler(rate=100, burst=10, max_retries=4).call("search", search(client))
+    assert len(server.searches) == 1
+
+def test_429_pauses_every_caller(server, client):
+    # A throttled call holds back other, unrelated calls until its Retry-After has passed
+    server.replies = [(429, {"Retry-After": "0.5"})]
+    amadeus = AmadeusScheduler(rate=100, burst=10, max_retries=2)
+    first = threading.Thread(target=amadeus.call, args=("CDG", search(client, "CDG")))
+    first.start()
+    while not server.searches:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    amadeus.call("LHR", search(client, "LHR"))
+    first.join()
+    throttled_at = server.searches[0][0]
+    other_at = next(arrived for arrived, path in server.searches if "LHR" in path)
+    assert other_at - throttled_at >= 0.5
+
+def test_identical_concurrent_calls_share_one_request(server, client):
+    server.delay = 0.3
+    amadeus = AmadeusScheduler(rate=100, burst=20, max_concurrency=20)
+    results = [None] * 20
+
+    def run(i):
+        results[i] = amadeus.call("search", search(client))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(server.searches) == 1
+    assert all(result is results[0] for result in results)
+
+def test_interactive_calls_go_before_queued_batch_calls():
+    amadeus = AmadeusScheduler(rate=1000, burst=100, max_concurrency=1)
+    release, started, order = threading.Event(), threading.Event(), []
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    def queued(name, priority):
+        with request_priority(priority):
+            amadeus.call(name, lambda: order.append(name))
+
+    holder = threading.Thread(target=amadeus.call, args=("hold", hold))
+    holder.start()
+    started.wait(5)
+    threads = []
+    for name, priority in [("batch-1", BATCH), ("batch-2", BATCH), ("interactive", INTERACTIVE)]:
+        threads.append(threading.Thread(target=queued, args=(name, priority)))
+        threads[-1].start()
+        # Let each one reach the queue, so arrival order is fixed
+        while len(amadeus._waiting) < len(threads):
+            time.sleep(0.01)
+    release.set()
+    for thread in [holder, *threads]:
+        thread.join()
+    assert order == ["interactive", "batch-1", "batch-2"]
+
+def test_token_bucket_limits_the_rate():
+    clock = FakeClock()
+    amadeus = AmadeusScheduler(rate=10, burst=5, max_concurrency=10, clock=clock, sleep=clock.sleep)
+    for i in range(15):
+        amadeus.call(i, lambda: None)
+    # The burst goes at once; the other 10 calls wait for tokens at 10 per second
+    assert clock.sleeps == pytest.approx([0.1] * 10)
+    assert clock.now == pytest.approx(1.0)
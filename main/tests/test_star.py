@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from flightsight.star import (DIMENSION_KEYS, build_star, changed_rows, flight_datasets, surrogate_key, surrogate_keys,
+                              written_updates)
+
+@pytest.fixture
+def connecting(make_flights):
+    # Two HYD-DXB-CDG offers over two days, on one airline and aircraft type
+    flights = make_flights(prices=(100, 200), days=("2025-06-13", "2025-06-14"), segments=2)
+    first_leg = flights["FLIGHT_NO"].str.endswith("1")
+    flights.loc[first_leg, "DESTINATION"] = "DXB"
+    flights.loc[~first_leg, "ORIGIN"] = "DXB"
+    flights["OPERATING_AIRLINE"], flights["OPERATING_AIRLINE_NAME"] = "AF", "Air France"
+    flights["AIRCRAFT_CODE"], flights["AIRCRAFT_NAME"] = "320", "Airbus A320"
+    return flights
+
+def test_iata_codes_get_positive_keys():
+    assert surrogate_key("airport", "hyd") == surrogate_key("airport", "HYD") > 0
+    assert surrogate_key("airline", "EK") != surrogate_key("airline", "AF")
+
+def test_blank_codes_share_the_unknown_key():
+    assert surrogate_key("airport", "") == surrogate_key("airport", None) == surrogate_key("aircraft", " ") == 0
+
+def test_malformed_codes_get_distinct_negative_keys():
+    keys = [surrogate_key("airport", code) for code in ("HY", "H-D", "HYDX", "XXXX")]
+    assert all(key < 0 for key in keys)
+    assert len(set(keys)) == len(keys)
+    hyd = surrogate_key("airport", "HYD")
+    assert surrogate_keys("airport", pd.Series(["HY", "HYD", "HY"])).tolist() == [keys[0], hyd, keys[0]]
+
+def test_malformed_codes_keep_their_own_dimension_rows():
+    airports = pd.DataFrame({"AIRPORT_KEY": [surrogate_key("airport", code) for code in ("H-D", "C-G")],
+                             "AIRPORT_CODE": ["H-D", "C-G"]})
+    rows, updates = changed_rows(airports, "airports", "AIRPORT_KEY", {})
+    assert len(rows) == 2 and len(updates) == 2
+    # Written once, neither row flips the other's registry hash on the next run
+    assert changed_rows(airports, "airports", "AIRPORT_KEY", updates)[0].empty
+
+def test_build_star_splits_facts_and_dimensions(connecting):
+    tables = build_star(connecting)
+    assert {table: len(df) for table, df in tables.items()} == {
+        "segments": 8, "pricing": 4, "itineraries": 4, "airports": 3, "airlines": 1, "aircraft": 1
+    }
+    segments, pricing, itineraries = tables["segments"], tables["pricing"], tables["itineraries"]
+    assert segments.groupby("OFFER_KEY", sort=False)["SEGMENT_NO"].apply(list).tolist() == [[1, 2]] * 4
+    assert segments.loc[segments["SEGMENT_NO"] == 1, "FLIGHT_NO"].tolist() == ["A1", "B1"] * 2
+    # Every fact table joins on the same offer keys, one pricing and itinerary row per offer
+    assert set(segments["OFFER_KEY"]) == set(pricing["OFFER_KEY"]) == set(itineraries["OFFER_KEY"])
+    assert pricing["OFFER_KEY"].is_unique and itineraries["OFFER_KEY"].is_unique
+    assert itineraries.set_index("OFFER_ID")["OFFER_KEY"].to_dict() == \
+        dict(zip(connecting["TRIP_ID"], segments["OFFER_KEY"]))
+    # Itineraries run from the first segment's origin to the last segment's destination
+    assert set(itineraries["DEPARTURE_AIRPORT_KEY"]) == {surrogate_key("airport", "HYD")}
+    assert set(itineraries["ARRIVAL_AIRPORT_KEY"]) == {surrogate_key("airport", "CDG")}
+    # One dimension row per distinct code, keyed like the facts
+    assert sorted(tables["airports"]["AIRPORT_CODE"]) == ["CDG", "DXB", "HYD"]
+    assert set(tables["airports"]["AIRPORT_KEY"]) == set(segments["ORIGIN_AIRPORT_KEY"]) | \
+        set(segments["DESTINATION_AIRPORT_KEY"])
+    assert tables["airlines"].iloc[0].tolist() == [surrogate_key("airline", "AF"), "AF", "Air France"]
+    assert tables["aircraft"].iloc[0].tolist() == [surrogate_key("aircraft", "320"), "320", "Airbus A320"]
+
+def test_dimensions_are_only_written_when_new(connecting):
+    datasets, updates = flight_datasets(connecting, layout="star", known={})
+    assert [name for _, name in datasets] == ["segments.csv", "pricing.csv", "itineraries.csv", "airports.csv",
+                                              "airlines.csv", "aircraft.csv"]
+    assert len(updates) == 5 and {entry.split("/")[0] for entry in updates} == set(DIMENSION_KEYS)
+    # A second run against the same registry writes the facts only
+    datasets, again = flight_datasets(connecting, layout="star", known=updates)
+    assert [name for _, name in datasets] == ["segments.csv", "pricing.csv", "itineraries.csv"]
+    assert again == {}
+
+def test_failed_dimension_writes_are_retried(connecting):
+    _, updates = flight_datasets(connecting, layout="star", known={})
+    results = [{"name": "airports.csv", "error": "AccessDenied"}, {"name": "airlines.csv", "error": None},
+               {"name": "aircraft.csv", "error": None}]
+    recorded = written_updates(results, updates)
+    assert {entry.split("/")[0] for entry in recorded} == {"airlines", "aircraft"}
+    datasets, _ = flight_datasets(connecting, layout="star", known=recorded)
+    assert [name for _, name in datasets][3:] == ["airports.csv"]
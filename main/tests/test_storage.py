@@ -0,0 +1,83 @@
+import gzip
+import io
+from datetime import date
+
+import boto3
+import pandas as pd
+import pytest
+import zstandard
+from moto import mock_aws
+
+from flightsight import storage
+from flightsight.storage import prepare_dataset, s3_partition, save_datasets, serialize_frame
+
+BUCKET = "flightsight-test"
+# Non-ASCII text has to survive every serialization
+ZURICH = {"destination": "ZRH", "destination_city": "Zürich"}
+
+def expected_csv(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+def test_serialize_plain_csv(make_flights):
+    df = make_flights(**ZURICH)
+    assert serialize_frame(df, "none") == expected_csv(df)
+
+def test_serialize_gzip_round_trips(make_flights):
+    df = make_flights(prices=range(1000), **ZURICH)
+    body = serialize_frame(df, "gzip")
+    assert body[:2] == b"\x1f\x8b"
+    assert gzip.decompress(body) == expected_csv(df)
+    assert len(body) < len(expected_csv(df))
+
+def test_serialize_zstd_round_trips(make_flights):
+    df = make_flights(prices=range(1000), **ZURICH)
+    body = serialize_frame(df, "zstd")
+    assert zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)).read() == expected_csv(df)
+    assert len(body) < len(expected_csv(df))
+
+@pytest.mark.parametrize("compression, name, content_type", [
+    ("none", "flights.csv", "text/csv"),
+    ("gzip", "flights.csv.gz", "application/gzip"),
+    ("zstd", "flights.csv.zst", "application/zstd"),
+])
+def test_keys_are_partitioned_by_route_and_date(compression, name, content_type, make_flights):
+    partition = s3_partition("HYD", "CDG", date(2025, 6, 13), run_id="20250601T000000Z")
+    result = prepare_dataset(make_flights(**ZURICH), "flights.csv", partition, compression, "csv")
+    assert result["key"] == f"flight_data/route=HYD-CDG/departure_date=2025-06-13/run=20250601T000000Z/{name}"
+    assert result["content_type"] == content_type
+
+@pytest.fixture
+def s3(monkeypatch):
+    # moto stands in for S3 (it is in requirements-dev.txt, so these tests run rather than skip)
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test",
+                              aws_secret_access_key="test")
+        client.create_bucket(Bucket=BUCKET)
+        monkeypatch.setattr(storage, "get_s3_client", lambda: client)
+        monkeypatch.setattr(storage, "S3_BUCKET", BUCKET)
+        yield client
+
+def test_save_datasets_uploads_both_tables(s3, make_flights):
+    flights, weather = make_flights(**ZURICH), pd.DataFrame({"IATA_CODE": ["HYD"], "TEMPERATURE": [31.5]})
+    results = save_datasets([(flights, "flights.csv"), (weather, "weather.csv")], partition="run=1",
+                            compression="gzip", output_format="csv")
+    assert [result["error"] for result in results] == [None, None]
+    for result, df in zip(results, (flights, weather)):
+        stored = s3.get_object(Bucket=BUCKET, Key=result["key"])
+        assert stored["ContentType"] == "application/gzip"
+        assert gzip.decompress(stored["Body"].read()) == expected_csv(df)
+
+def test_large_objects_use_multipart_upload(s3, monkeypatch, make_flights):
+    monkeypatch.setattr(storage, "S3_MULTIPART_THRESHOLD", 1024)
+    result = save_datasets([(make_flights(prices=range(5000), **ZURICH), "flights.csv")], compression="none",
+                           output_format="csv")[0]
+    # Multipart uploads get an ETag of "<md5>-<parts>"; a single PUT has none
+    assert "-" in s3.head_object(Bucket=BUCKET, Key=result["key"])["ETag"]
+    small = save_datasets([(make_flights(prices=range(2), **ZURICH), "weather.csv")], compression="none",
+                          output_format="csv")[0]
+    assert "-" not in s3.head_object(Bucket=BUCKET, Key=small["key"])["ETag"]
+
+def test_upload_failures_are_reported_per_object(s3, monkeypatch, make_flights):
+    monkeypatch.setattr(storage, "S3_BUCKET", "no-such-bucket")
+    results = save_datasets([(make_flights(**ZURICH), "flights.csv")], compression="none", output_format="csv")
+    assert results[0]["error"]
@@ -0,0 +1,68 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from flightsight.trends import SKETCH_BINS, TrendStore, sketch_bins, sketch_quantiles
+
+@pytest.fixture
+def store(tmp_path):
+    return TrendStore(str(tmp_path / "trends.sqlite"))
+
+def test_quantiles_hold_for_large_fares():
+    # Yen and won fares run well past 100,000
+    prices = np.linspace(80_000, 900_000, 501)
+    counts = np.bincount(sketch_bins(prices), minlength=SKETCH_BINS)
+    p10, p50, p90 = sketch_quantiles(counts, low=prices.min(), high=prices.max())
+    for estimate, exact in zip((p10, p50, p90), np.quantile(prices, [0.1, 0.5, 0.9])):
+        assert abs(estimate - exact) / exact < 0.015
+
+def test_overflow_reads_as_the_exact_max():
+    prices = np.array([5e9, 6e9, 7.5e9])
+    counts = np.bincount(sketch_bins(prices), minlength=SKETCH_BINS)
+    assert sketch_quantiles(counts, (0.5, 0.9), low=5e9, high=7.5e9) == [7.5e9, 7.5e9]
+
+def test_route_snapshots_keep_currencies_apart(store, make_flights):
+    store.record(pd.concat([make_flights(prices=[500, 600, 700], currency="EUR"),
+                            make_flights(prices=[90_000, 120_000, 150_000], currency="JPY")]),
+                 snapshot_at=1000.0)
+    snapshots = store.route_snapshots("HYD", "CDG").set_index("currency")
+    assert sorted(snapshots.index) == ["EUR", "JPY"]
+    assert 590 <= snapshots.loc["EUR", "median_fare"] <= 610
+    assert 118_000 <= snapshots.loc["JPY", "median_fare"] <= 122_000
+    assert snapshots.loc["JPY", "max_fare"] == 150_000
+
+def test_changes_compare_the_same_currency(store, make_flights):
+    store.record(make_flights(prices=[500, 600, 700], currency="EUR"), snapshot_at=1000.0)
+    store.record(make_flights(prices=[90_000, 120_000, 150_000], currency="JPY"), snapshot_at=2000.0)
+    store.record(make_flights(prices=[400, 500, 600], currency="EUR"), snapshot_at=3000.0)
+    snapshots = store.route_snapshots("HYD", "CDG")
+    eur = snapshots[snapshots["currency"] == "EUR"].sort_values("snapshot_at")
+    assert eur["median_change"].iloc[-1] == pytest.approx(-100, abs=15)
+    assert snapshots.loc[snapshots["currency"] == "JPY", "median_change"].isna().all()
+
+def test_route_distribution_merges_snapshots_per_currency(store, make_flights):
+    store.record(make_flights(prices=[100, 200], currency="EUR"), snapshot_at=1000.0)
+    store.record(make_flights(prices=[300, 400], currency="EUR"), snapshot_at=2000.0)
+    store.record(make_flights(prices=[30_000], currency="JPY"), snapshot_at=2000.0)
+    distribution = store.route_distribution("HYD", "CDG").set_index("currency")
+    assert distribution.loc["EUR", "offers"] == 4 and distribution.loc["EUR", "snapshots"] == 2
+    assert distribution.loc["EUR", "max_fare"] == 400
+    assert distribution.loc["JPY", "offers"] == 1
+
+def test_tables_from_the_old_layout_are_set_aside(tmp_path, make_flights):
+    db_path = str(tmp_path / "trends.sqlite")
+    db = sqlite3.connect(db_path)
+    db.execute("CREATE TABLE fare_snapshots (route TEXT, carrier TEXT, cabin TEXT, departure_date TEXT, "
+               "snapshot_at REAL, offers INTEGER, min_fare REAL, max_fare REAL, sum_fare REAL, median_fare REAL, "
+               "min_change REAL, median_change REAL, sketch BLOB)")
+    db.execute("INSERT INTO fare_snapshots (route) VALUES ('HYD-CDG')")
+    db.commit()
+    db.close()
+    store = TrendStore(db_path)
+    assert store.route_snapshots("HYD", "CDG").empty
+    store.record(make_flights(prices=[500]), snapshot_at=1000.0)
+    assert len(store.route_snapshots("HYD", "CDG")) == 1
+    tables = {row[0] for row in sqlite3.connect(db_path).execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"fare_snapshots", "fare_totals", "fare_snapshots_v1"} <= tables